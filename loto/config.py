@@ -25,8 +25,33 @@ IMAGES_DIR = os.path.join(ROOT_DIR, 'data/images/')
 # Database
 DB_NAME = 'numbers.db'
 TEST_DB_NAME = 'numbers_test.db'
+# Random draws, numbers in range: test_load_db_clean loads numbers up to 99 in the test DB
+TEST_VALID_DB_NAME = 'numbers_valid_test.db'
 DB_PATH = os.path.join(ROOT_DIR, 'data/db/')
 TEST_DB_PATH = os.path.join(ROOT_DIR, '../tests/fake_data/db/')
+
+# Store: results, indexes, caches... Unlike the DB folder, it is not wiped by a refresh
+STORE_NAME = 'store.db'
+TEST_STORE_NAME = 'store_test.db'
+STORE_PATH = os.path.join(ROOT_DIR, 'data/store/')
+TEST_STORE_PATH = os.path.join(ROOT_DIR, '../tests/fake_data/store/')
+COOCCURRENCES_NAME = 'cooccurrences.npz'
+# Trained python CPT+ models (x4), one per kind of numbers
+CPT_PLUS_MODEL_NAME = 'cpt_plus_{}.npz'
+# Fitted Prophet models (x5), one JSON file per field and draws history. The least recently used
+# ones are removed when the folder grows larger than the limit
+PROPHET_MODELS_DIR = 'prophet_models/'
+PROPHET_CACHE_MAX_BYTES = 50 * 1024 ** 2
+# Unix socket of the x4 prediction server (x4 --serve)
+X4_SOCKET_NAME = 'x4.sock'
+# JVM started by x4 for SPMF: heap size and JIT options (stopping at the C1 compiler starts faster,
+# and x4 doesn't run long enough to benefit from C2). Unknown options are ignored by older JVMs.
+JVM_OPTIONS = ['-Xms256m', '-Xmx1g', '-XX:+TieredCompilation', '-XX:TieredStopAtLevel=1',
+               '-XX:+IgnoreUnrecognizedVMOptions']
+# Class data sharing archive (AppCDS, Java 13+) of the classes loaded by x4, created by the first
+# run with --cds and reused by the next ones
+JVM_CDS_ARCHIVE_NAME = 'spmf.jsa'
+
 TABLE_INFO = {
     'tablename': 'numbers',
     'fields': {
@@ -50,6 +75,15 @@ LOTO_DAYS = 'Tue Fri'
 
 # OEIS base URL (not really an API)
 OEIS_URL = 'https://oeis.org/search?fmt=json&q='
+# OEIS dump of all the sequences (terms only), and its local index (in the store)
+OEIS_STRIPPED_URL = 'https://oeis.org/stripped.gz'
+OEIS_INDEX_NAME = 'oeis_index/'
+# OEIS queries: responses are cached (in the store DB) for 30 days, at most 3 queries are sent at
+# once and 3 are waiting for a response
+OEIS_CACHE_TTL = 30 * 24 * 3600
+OEIS_BURST = 3
+OEIS_MAX_IN_FLIGHT = 3
+TEST_OEIS_DUMP = os.path.join(ROOT_DIR, '../tests/fake_data/oeis/stripped')
 
 # NIST beacon last pulse
 BEACON_LP_URL = 'https://beacon.nist.gov/beacon/2.0/pulse/last'
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Joint statistics: how often numbers are drawn together.
+
+The following structures are built from the balls (N, 5) and stars (N, 2) matrices:
+
+- pairs: 50x50 matrix, how many times two balls were drawn together (the diagonal holds the number
+  of times each ball was drawn).
+- triples: sparse counts of the triples of balls drawn together. A triple (a < b < c) is encoded as
+  a single integer key, only the triples which were actually drawn are kept.
+- ball_star: 50x12 matrix, how many times a ball and a star were drawn together.
+- frequencies: 7x51 matrix, how many times each number was drawn at each position (ball_1 to
+  star_2), the number is the column index (column 0 is always empty).
+
+The structures are stored in the store folder (they survive a DB refresh), and are updated with the
+new draws only when the history grows.
+"""
+import hashlib
+import itertools
+import os
+
+import numpy as np
+
+
+NB_BALLS = 50
+NB_STARS = 12
+# The 10 ways to pick 3 balls out of 5
+TRIPLES_INDEXES = np.array(list(itertools.combinations(range(5), 3)))
+
+
+def one_hot(numbers, nb_values):
+    """Turns a matrix of numbers (N, k) into a matrix of indicators (N, nb_values).
+
+    Raises:
+        ValueError: if a number is not between 1 and nb_values.
+    """
+    if numbers.size and (numbers.min() < 1 or numbers.max() > nb_values):
+        raise ValueError(f"Numbers must be between 1 and {nb_values}")
+    indicators = np.zeros((numbers.shape[0], nb_values), dtype=np.int64)
+    np.put_along_axis(indicators, numbers - 1, 1, axis=1)
+    return indicators
+
+
+def encode_triples(balls):
+    """Encodes every triple of balls drawn together as an integer key.
+
+    Args:
+        balls(numpy array): balls drawn, shape (N, 5).
+
+    Returns:
+        numpy array: keys, shape (N * 10,).
+    """
+    triples = np.sort(balls, axis=1)[:, TRIPLES_INDEXES] - 1        # (N, 10, 3), 0 based
+    return (triples[..., 0] * NB_BALLS + triples[..., 1]) * NB_BALLS + triples[..., 2]
+
+
+def decode_triples(keys):
+    """Turns integer keys back into triples of balls.
+
+    Returns:
+        numpy array: triples, shape (len(keys), 3), 1 based.
+    """
+    return np.stack([keys // NB_BALLS ** 2, keys // NB_BALLS % NB_BALLS, keys % NB_BALLS],
+                    axis=1) + 1
+
+
+def frequency_counts(numbers, nb_values=None):
+    """Counts how many times each number was drawn at each position, in a single bincount pass.
+
+    Args:
+        numbers(numpy array): numbers drawn, shape (N, P), e.g. balls and stars side by side.
+        nb_values(int): number of columns of the counts, by default enough for the largest number
+            (and at least 51).
+
+    Returns:
+        numpy array: counts, shape (P, nb_values), counts[p, n] = times n was drawn at position p.
+    """
+    numbers = np.asarray(numbers, dtype=np.int64)
+    nb_positions = numbers.shape[1]
+    if nb_values is None:
+        nb_values = max(NB_BALLS + 1, int(numbers.max(initial=0)) + 1)
+    flat = numbers + nb_values * np.arange(nb_positions)
+    return np.bincount(flat.ravel(), minlength=nb_positions * nb_values).reshape(nb_positions,
+                                                                                 nb_values)
+
+
+def hash_history(balls, stars):
+    """Returns the hash of a draws history, used to check a stored history is still valid."""
+    return hashlib.sha256(np.ascontiguousarray(balls, dtype=np.int64).tobytes()
+                          + np.ascontiguousarray(stars, dtype=np.int64).tobytes()).hexdigest()
+
+
+def build_cooccurrences(balls, stars):
+    """Builds all the co-occurrence structures from scratch.
+
+    Args:
+        balls(numpy array): balls drawn, shape (N, 5).
+        stars(numpy array): stars drawn, shape (N, 2).
+
+    Returns:
+        dict: {'nb_draws', 'history_hash', 'pairs', 'triples_keys', 'triples_counts',
+            'ball_star', 'frequencies'}.
+    """
+    balls_indicators = one_hot(balls, NB_BALLS)
+    stars_indicators = one_hot(stars, NB_STARS)
+    triples_keys, triples_counts = np.unique(encode_triples(balls), return_counts=True)
+    return {
+        'nb_draws': balls.shape[0],
+        'history_hash': hash_history(balls, stars),
+        'pairs': balls_indicators.T @ balls_indicators,
+        'triples_keys': triples_keys,
+        'triples_counts': triples_counts,
+        'ball_star': balls_indicators.T @ stars_indicators,
+        'frequencies': frequency_counts(np.hstack((balls, stars)), NB_BALLS + 1)
+    }
+
+
+def update_cooccurrences(cooccurrences, balls, stars):
+    """Adds the draws which are not yet counted to existing co-occurrence structures.
+
+    Args:
+        cooccurrences(dict): structures built from the first draws of the history.
+        balls(numpy array): the whole history of balls drawn, shape (N, 5).
+        stars(numpy array): the whole history of stars drawn, shape (N, 2).
+
+    Returns:
+        dict: updated structures.
+    """
+    start = cooccurrences['nb_draws']
+    new = build_cooccurrences(balls[start:], stars[start:])
+    keys, inverse = np.unique(
+        np.concatenate((cooccurrences['triples_keys'], new['triples_keys'])), return_inverse=True)
+    counts = np.zeros(keys.size, dtype=np.int64)
+    np.add.at(counts, inverse,
+              np.concatenate((cooccurrences['triples_counts'], new['triples_counts'])))
+    return {
+        'nb_draws': balls.shape[0],
+        'history_hash': hash_history(balls, stars),
+        'pairs': cooccurrences['pairs'] + new['pairs'],
+        'triples_keys': keys,
+        'triples_counts': counts,
+        'ball_star': cooccurrences['ball_star'] + new['ball_star'],
+        'frequencies': cooccurrences['frequencies'] + new['frequencies']
+    }
+
+
+def save_cooccurrences(cooccurrences, path):
+    """Writes the co-occurrence structures to a compressed numpy file."""
+    np.savez_compressed(path, **cooccurrences)
+
+
+def load_cooccurrences(path):
+    """Reads the co-occurrence structures from a numpy file.
+
+    Returns:
+        dict: the structures, None if the file does not exist.
+    """
+    if not os.path.isfile(path):
+        return None
+    with np.load(path) as data:
+        cooccurrences = {k: data[k] for k in data.files}
+    cooccurrences['nb_draws'] = int(cooccurrences['nb_draws'])
+    cooccurrences['history_hash'] = str(cooccurrences['history_hash'])
+    return cooccurrences
+
+
+def get_cooccurrences(balls, stars, path):
+    """Returns up to date co-occurrence structures, computing as little as possible.
+
+    Stored structures are reused as is if the history did not change. If draws were added at the
+    end of the history, only those draws are counted. Otherwise everything is rebuilt.
+
+    Args:
+        balls(numpy array): balls drawn, shape (N, 5).
+        stars(numpy array): stars drawn, shape (N, 2).
+        path(str): path to the numpy file where the structures are stored.
+
+    Returns:
+        dict: the co-occurrence structures.
+    """
+    cooccurrences = load_cooccurrences(path)
+    nb_draws = balls.shape[0]
+    # Structures stored by an older version may lack some of the current ones
+    complete = cooccurrences is not None and 'frequencies' in cooccurrences
+    if complete and cooccurrences['nb_draws'] <= nb_draws:
+        start = cooccurrences['nb_draws']
+        if cooccurrences['history_hash'] == hash_history(balls[:start], stars[:start]):
+            if start == nb_draws:
+                return cooccurrences
+            cooccurrences = update_cooccurrences(cooccurrences, balls, stars)
+            save_cooccurrences(cooccurrences, path)
+            return cooccurrences
+    cooccurrences = build_cooccurrences(balls, stars)
+    save_cooccurrences(cooccurrences, path)
+    return cooccurrences
+
+
+def top_pairs(cooccurrences, nb_pairs=10):
+    """Returns the pairs of balls most often drawn together.
+
+    Returns:
+        list: list of tuples (ball, ball, count), most frequent first.
+    """
+    pairs = np.triu(cooccurrences['pairs'], k=1)
+    flat = np.argsort(pairs, axis=None)[::-1][:nb_pairs]
+    rows, cols = np.unravel_index(flat, pairs.shape)
+    return [(int(r) + 1, int(c) + 1, int(pairs[r, c])) for r, c in zip(rows, cols)]
+
+
+def top_triples(cooccurrences, nb_triples=10):
+    """Returns the triples of balls most often drawn together.
+
+    Returns:
+        list: list of tuples (ball, ball, ball, count), most frequent first.
+    """
+    order = np.argsort(cooccurrences['triples_counts'], kind='stable')[::-1][:nb_triples]
+    triples = decode_triples(cooccurrences['triples_keys'][order])
+    counts = cooccurrences['triples_counts'][order]
+    return [(*map(int, t), int(c)) for t, c in zip(triples, counts)]
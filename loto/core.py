@@ -28,6 +28,8 @@ def lazy_load(slow_module):
     except KeyError:
         spec = importlib.util.find_spec(slow_module)
         module = importlib.util.module_from_spec(spec)
+        # Registered so that functions of the module can be pickled (multiprocessing pools)
+        sys.modules[slow_module] = module
         loader = importlib.util.LazyLoader(spec.loader)
         loader.exec_module(module)
         return module
@@ -60,40 +62,88 @@ def rf(ctx):
 
 
 @cli.command()
-def x1():
-    """Statistics with Dieharder & Ent"""
+@click.option('-f', '--force', is_flag=True, help='Re-run the tests on unchanged series')
+@click.option('-w', '--weak', type=click.IntRange(min=1), metavar='N',
+              help='Only list WEAK/FAILED results from the N latest runs')
+@click.option('-n', '--nist-only', is_flag=True,
+              help='Only run the built-in NIST style battery (no Dieharder & Ent)')
+@click.option('-W', '--window', type=click.IntRange(min=1), metavar='N',
+              help='Only run uniformity tests over rolling windows of N draws')
+@click.option('-e', '--expanding', is_flag=True,
+              help='Only run uniformity tests over expanding windows of draws')
+@click.option('-m', '--null-model',
+              type=click.Choice(['chi2_balls', 'chi2_stars', 'max_ball_count', 'max_pair_count']),
+              help='Only compute the p-value of a statistic with simulated fair lotteries')
+@click.option('-H', '--histories', type=click.IntRange(min=1), default=100000, show_default=True,
+              help='Number of fair lotteries to simulate (with --null-model)')
+def x1(force, weak, nist_only, window, expanding, null_model, histories):
+    """Statistics with Dieharder, Ent & a NIST style battery"""
     x1 = lazy_load('x1_statistics')
-    x1.main()
+    x1.main(force, weak, nist_only, window, expanding, null_model, histories)
 
 
 @cli.command()
-def x2():
+@click.option('-f', '--force', is_flag=True, help='Render all images, even the up to date ones')
+@click.option('-t', '--tiles', is_flag=True,
+              help='Also render the line and area plots as tiles (decades, years, months)')
+def x2(force, tiles):
     """Plots with Matplotlib"""
     x2 = lazy_load('x2_plots')
-    x2.main()
+    x2.main(force, tiles)
 
 
 @cli.command()
-def x3():
+@click.option('-b', '--build-index', is_flag=True,
+              help='Download the OEIS sequences and build a local index of them first')
+@click.option('-d', '--dump', type=click.Path(exists=True, dir_okay=False),
+              help='Build the local index from this OEIS stripped dump first')
+@click.option('-o', '--online', is_flag=True,
+              help='Query the OEIS website with the latest draws, even if there is a local index')
+@click.option('-B', '--batch', is_flag=True,
+              help='Search every window of k numbers of the history in the local index')
+@click.option('-k', '--lengths', nargs=2, type=int, default=(3, 7), show_default=True,
+              help='Smallest and largest k of the batch mode')
+def x3(build_index, dump, online, batch, lengths):
     """Checking "previous art" from OEIS (On-Line Encyclopedia of Integer Sequences)"""
     x3 = lazy_load('x3_oeis')
-    x3.main()
+    x3.main(build_index, dump, online, batch, lengths)
 
 
 @cli.command()
-def x4():
-    """Predictions made with a Compact Prediction Tree + (SPMF/Java)"""
+@click.option('-e', '--engine', type=click.Choice(['python', 'spmf']), default='python',
+              show_default=True, help='CPT+ implementation: python, or SPMF in a JVM')
+@click.option('-s', '--serve', is_flag=True,
+              help='Keep the models in memory and answer predictions over a Unix socket')
+@click.option('-c', '--cds', is_flag=True,
+              help='Start the JVM from a class data sharing archive (created on the first run)')
+@click.option('-b', '--backtest', type=int, metavar='K',
+              help='Predict each of the last K draws from the earlier ones and score the hits')
+@click.option('-C', '--compare', is_flag=True,
+              help='Compare SPMF predictors (CPT+, CPT, DG, AKOM, TDAG, LZ78) in a single JVM')
+@click.option('-S', '--sweep', is_flag=True,
+              help='Score CPT+ options by backtests of the last K draws (100 by default)')
+@click.option('-g', '--grid', metavar='GRID',
+              help="Options tried by the sweep, e.g. 'CCFmax:3,5 noiseRatio:0.5,1'")
+@click.option('-R', '--random-search', type=int, metavar='N',
+              help='Only score N configurations of the grid, picked at random')
+def x4(engine, serve, cds, backtest, compare, sweep, grid, random_search):
+    """Predictions made with a Compact Prediction Tree + (python or SPMF/Java)"""
     x4 = lazy_load('x4_cpt_plus')
-    x4.main()
+    x4.main(engine, serve, cds, backtest, compare, sweep, grid, random_search)
 
 
 @cli.command()
-def x5():
+@click.option('-H', '--horizon', type=int, default=0, show_default=True, metavar='N',
+              help='Also forecast the N draws after the next one')
+@click.option('-p', '--plots', is_flag=True, help='Plot the forecasts (history and year to come)')
+@click.option('-f', '--force', is_flag=True,
+              help='Fit the models from scratch, ignoring the cached ones')
+def x5(horizon, plots, force):
     """Predictions made with the Prophet library (FB)"""
     with warnings.catch_warnings():
         warnings.simplefilter('ignore')
         x5 = lazy_load('x5_prophet')
-        x5.main()
+        x5.main(horizon, plots, force)
 
 
 @cli.command()
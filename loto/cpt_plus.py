@@ -0,0 +1,503 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Compact Prediction Tree + (CPT+), written in python with numpy: no JVM needed.
+
+The model of `Gueniche et al., CPT+: Decreasing the time/space complexity of the Compact
+Prediction Tree <https://doi.org/10.1007/978-3-319-18032-8_49>`_, with the options of SPMF's
+CPTPlusPredictor. It is written from the paper, not ported from SPMF: both predict the same items
+when what follows a query is unambiguous (checked by test_cpt_plus_spmf), ties and scores are not
+guaranteed to be the same.
+
+- prediction tree: the training sequences, as a trie. Nodes are not objects: each node is an
+  index in python lists (parent, start and length of the node's label in a list of labels put end
+  to end).
+- inverted index: for every item, a bitset of the sequences which contain it (numpy array of
+  bytes, one bit per sequence). The sequences containing all the items of a query are found by
+  ANDing bitsets.
+- lookup table: for every sequence, the node of the tree where it ends.
+- CCF (frequent subsequences compression): the subsequences of CCFmin to CCFmax items found in at
+  least CCFsup sequences are stored in the tree as a single symbol.
+- CBS (simple branches compression): chains of nodes with a single child are stored as a single
+  node, whose label is the whole chain.
+- splitMethod/splitLength: only the last splitLength items of the training sequences are kept
+  (splitMethod > 0).
+- minPredictionRatio/noiseRatio: prediction with noise reduction. If the query itself is not
+  enough, the items of the query are removed one by one (up to noiseRatio of them), until
+  minPredictionRatio * query length subsequences were used to predict.
+
+Both compressions are lossless: they make the tree smaller, they don't change the predictions.
+
+Training is incremental: new sequences are inserted in the existing tree and inverted index (the
+frequent subsequences are those found by the first training). Models can be saved to and loaded
+from numpy files.
+"""
+import collections
+import hashlib
+import os
+
+import numpy as np
+
+
+# Options used by x4, as passed to SPMF
+DEFAULT_OPTIONS = 'CCF:true CBS:true CCFmin:1 CCFmax:5 CCFsup:2 splitMethod:0 splitLength:5 ' \
+                  'minPredictionRatio:1.0 noiseRatio:1'
+OPTIONS_TYPES = {
+    'CCF': lambda v: v.lower() == 'true',
+    'CBS': lambda v: v.lower() == 'true',
+    'CCFmin': int,
+    'CCFmax': int,
+    'CCFsup': int,
+    'splitMethod': int,
+    'splitLength': int,
+    'minPredictionRatio': float,
+    'noiseRatio': float
+}
+
+
+def parse_options(options):
+    """Parses options written as SPMF expects them, e.g. 'CCF:true CCFmin:1'.
+
+    Missing options get the value they have in DEFAULT_OPTIONS.
+
+    Args:
+        options(str): space separated name:value pairs.
+
+    Returns:
+        dict: {name: typed value}.
+    """
+    parsed = {}
+    for option in (DEFAULT_OPTIONS + ' ' + options).split():
+        name, _, value = option.partition(':')
+        if name not in OPTIONS_TYPES:
+            raise ValueError(f"Unknown CPT+ option :: {name}")
+        parsed[name] = OPTIONS_TYPES[name](value)
+    return parsed
+
+
+def format_options(options):
+    """Writes parsed options back as SPMF expects them, in a canonical form.
+
+    Args:
+        options(dict): {name: typed value}, as returned by parse_options.
+
+    Returns:
+        str: space separated name:value pairs, in the order of DEFAULT_OPTIONS.
+    """
+    values = {name: str(value).lower() if isinstance(value, bool) else value
+              for name, value in options.items()}
+    return ' '.join(f"{name}:{values[name]}" for name in OPTIONS_TYPES)
+
+
+def extend_hash(history_hash, sequences):
+    """Extends the hash of a list of sequences with more sequences (hash chain).
+
+    Args:
+        history_hash(str): hash of the first sequences, '' if there are none.
+        sequences(list): the next sequences.
+
+    Returns:
+        str: hash of all the sequences.
+    """
+    for sequence in sequences:
+        history_hash = hashlib.sha256(
+            (history_hash + repr([int(item) for item in sequence])).encode()).hexdigest()
+    return history_hash
+
+
+class CPTPlus:
+    """Compact Prediction Tree + predictor.
+
+    Args:
+        options(str): options, as passed to SPMF (see DEFAULT_OPTIONS).
+    """
+
+    def __init__(self, options=DEFAULT_OPTIONS):
+        self.options = parse_options(options)
+        self.reset()
+
+    def reset(self):
+        """Forgets everything learned."""
+        # Prediction tree, one entry per node in each list, node 0 is the root
+        self.parents = [-1]
+        self.label_starts = [0]
+        self.label_lengths = [0]
+        self.labels = []                    # Labels of all the nodes, end to end
+        self.children = {}                  # (node, first symbol of the child label): child
+        # Lookup table and inverted index
+        self.leaves = []                    # Sequence id: node where the sequence ends
+        self.item_rows = {}                 # Item: row of the item in the bitsets
+        self.bitsets = np.zeros((0, 0), dtype=np.uint8)
+        self.supports = np.zeros(0, dtype=np.int64)
+        # CCF: frequent subsequence <-> symbol (symbols are negative, items are not)
+        self.patterns = {}
+        self.symbols = {}
+        # Hash of the training sequences (as given, before splitting)
+        self.history_hash = ''
+
+    @property
+    def nb_nodes(self):
+        """Number of nodes of the prediction tree (root included)."""
+        return len(self.parents)
+
+    def train(self, sequences):
+        """Trains the model from scratch.
+
+        Args:
+            sequences(list): training sequences, lists or tuples of ints (>= 0).
+        """
+        self.reset()
+        self.history_hash = extend_hash('', sequences)
+        sequences = [self.split(sequence) for sequence in sequences]
+        if self.options['CCF']:
+            self.find_patterns(sequences)
+        self.insert(sequences)
+
+    def update(self, sequences):
+        """Trains the model with more sequences: they are inserted, nothing is rebuilt.
+
+        Args:
+            sequences(list): new training sequences, lists or tuples of ints (>= 0).
+        """
+        self.history_hash = extend_hash(self.history_hash, sequences)
+        self.insert([self.split(sequence) for sequence in sequences])
+
+    def fit(self, sequences):
+        """Trains the model, incrementally if the model was trained on the first sequences.
+
+        Args:
+            sequences(list): all the training sequences, lists or tuples of ints (>= 0).
+
+        Returns:
+            bool: True if the model changed.
+        """
+        nb_trained = len(self.leaves)
+        if 0 < nb_trained <= len(sequences) \
+                and extend_hash('', sequences[:nb_trained]) == self.history_hash:
+            if nb_trained == len(sequences):
+                return False
+            self.update(sequences[nb_trained:])
+        else:
+            self.train(sequences)
+        return True
+
+    def split(self, sequence):
+        """Keeps the last items of a sequence, if asked to (splitMethod option)."""
+        sequence = tuple(int(item) for item in sequence)
+        if self.options['splitMethod'] > 0:
+            return sequence[-self.options['splitLength']:]
+        return sequence
+
+    def find_patterns(self, sequences):
+        """Finds the frequent subsequences (CCF), and gives each of them a symbol."""
+        supports = collections.Counter()
+        lengths = range(max(2, self.options['CCFmin']), self.options['CCFmax'] + 1)
+        for sequence in sequences:
+            supports.update({sequence[i:i + n] for n in lengths
+                             for i in range(len(sequence) - n + 1)})
+        frequent = sorted(p for p, s in supports.items() if s >= self.options['CCFsup'])
+        self.patterns = {pattern: -(i + 1) for i, pattern in enumerate(frequent)}
+        self.symbols = {symbol: pattern for pattern, symbol in self.patterns.items()}
+
+    def encode(self, sequence):
+        """Replaces the frequent subsequences by their symbols, longest first."""
+        if not self.patterns:
+            return list(sequence)
+        encoded = []
+        i = 0
+        longest = self.options['CCFmax']
+        while i < len(sequence):
+            for n in range(min(longest, len(sequence) - i), 1, -1):
+                symbol = self.patterns.get(sequence[i:i + n])
+                if symbol is not None:
+                    encoded.append(symbol)
+                    i += n
+                    break
+            else:
+                encoded.append(sequence[i])
+                i += 1
+        return encoded
+
+    def decode(self, symbols):
+        """Replaces the symbols of frequent subsequences by their items."""
+        items = []
+        for symbol in symbols:
+            if symbol < 0:
+                items.extend(self.symbols[symbol])
+            else:
+                items.append(symbol)
+        return items
+
+    def add_node(self, parent, start, length):
+        """Adds a node to the tree, its label is labels[start:start + length]."""
+        self.parents.append(parent)
+        self.label_starts.append(start)
+        self.label_lengths.append(length)
+        self.children[(parent, self.labels[start])] = len(self.parents) - 1
+        return len(self.parents) - 1
+
+    def insert_branch(self, symbols):
+        """Inserts an encoded sequence in the tree.
+
+        Returns:
+            int: the node where the sequence ends.
+        """
+        node = 0
+        i = 0
+        while i < len(symbols):
+            child = self.children.get((node, symbols[i]))
+            if child is None:
+                # New branch: a single node with CBS, one node per symbol otherwise
+                start = len(self.labels)
+                self.labels.extend(symbols[i:])
+                if self.options['CBS']:
+                    return self.add_node(node, start, len(symbols) - i)
+                for j in range(len(symbols) - i):
+                    node = self.add_node(node, start + j, 1)
+                return node
+            # Length of the common part of the child label and the sequence
+            start, length = self.label_starts[child], self.label_lengths[child]
+            common = 1
+            while (common < length and i + common < len(symbols)
+                   and self.labels[start + common] == symbols[i + common]):
+                common += 1
+            if common < length:
+                # The sequence leaves (or ends) within the label: the node is split in two
+                middle = self.add_node(node, start, common)
+                self.parents[child] = middle
+                self.label_starts[child] = start + common
+                self.label_lengths[child] = length - common
+                self.children[(middle, self.labels[start + common])] = child
+                child = middle
+            node = child
+            i += common
+        return node
+
+    def insert(self, sequences):
+        """Inserts sequences in the tree, the lookup table and the inverted index."""
+        if not sequences:
+            return
+        first_id = len(self.leaves)
+        rows, ids = [], []
+        for sequence_id, sequence in enumerate(sequences, first_id):
+            self.leaves.append(self.insert_branch(self.encode(sequence)))
+            for item in set(sequence):
+                rows.append(self.item_rows.setdefault(item, len(self.item_rows)))
+                ids.append(sequence_id)
+
+        # Room for the new items and sequences in the bitsets, then one bit per (item, sequence)
+        nb_bytes = (len(self.leaves) + 7) // 8
+        bitsets = np.zeros((len(self.item_rows), nb_bytes), dtype=np.uint8)
+        bitsets[:self.bitsets.shape[0], :self.bitsets.shape[1]] = self.bitsets
+        rows, ids = np.array(rows, dtype=np.int64), np.array(ids, dtype=np.int64)
+        np.bitwise_or.at(bitsets, (rows, ids >> 3), (1 << (ids & 7)).astype(np.uint8))
+        self.bitsets = bitsets
+        self.supports = np.unpackbits(bitsets, axis=1).sum(axis=1, dtype=np.int64)
+
+    def branch(self, sequence_id):
+        """Reads a training sequence back from the tree."""
+        parts = []
+        node = self.leaves[sequence_id]
+        while node > 0:
+            start = self.label_starts[node]
+            parts.append(self.labels[start:start + self.label_lengths[node]])
+            node = self.parents[node]
+        return self.decode(symbol for part in reversed(parts) for symbol in part)
+
+    def similar_sequences(self, items):
+        """Returns the ids of the training sequences which contain all the items."""
+        rows = [self.item_rows.get(item) for item in set(items)]
+        if not rows or None in rows:
+            return np.zeros(0, dtype=np.int64)
+        bits = np.bitwise_and.reduce(self.bitsets[rows], axis=0)
+        return np.flatnonzero(np.unpackbits(bits, bitorder='little'))
+
+    def update_counts(self, counts, items, weight, used, branches):
+        """Adds the items following the given ones in the training sequences to the counts.
+
+        The consequent of a training sequence is what comes after the point where all the items
+        have been seen. A training sequence is only used once per prediction.
+
+        Args:
+            branches(dict): training sequences already read from the tree, by id (filled here).
+
+        Returns:
+            bool: True if some counts were updated.
+        """
+        updated = False
+        for sequence_id in self.similar_sequences(items):
+            if sequence_id in used:
+                continue
+            used.add(sequence_id)
+            sequence = branches.get(sequence_id)
+            if sequence is None:
+                sequence = branches[sequence_id] = self.branch(sequence_id)
+            to_see = set(items)
+            i = 0
+            while to_see:
+                to_see.discard(sequence[i])
+                i += 1
+            for item in sequence[i:]:
+                counts[item] = counts.get(item, 0.) + weight
+                updated = True
+        return updated
+
+    def scores(self, target, branches=None):
+        """Computes the score of every item which could follow a sequence.
+
+        Subsequences of the target with fewer items (noise reduction) weigh less: their weight is
+        their length relative to the target length. The score of an item is the sum of the
+        weights of the training sequences where it follows (a subsequence of) the target.
+
+        Args:
+            target(list): the sequence of items to predict from.
+            branches(dict): training sequences already read from the tree, by id, shared by the
+                predictions of a batch.
+
+        Returns:
+            dict: {item: score}.
+        """
+        branches = {} if branches is None else branches
+        target = tuple(int(item) for item in target if int(item) in self.item_rows)
+        counts = {}
+        if not target:
+            return counts
+        nb_required = max(1, int(len(target) * self.options['minPredictionRatio']))
+        min_length = max(1, len(target) - int(len(target) * self.options['noiseRatio']))
+
+        # Breadth first: the target first, then its subsequences with one item less, etc.
+        queue = collections.deque([target])
+        seen = {target}
+        used = set()
+        nb_updates = 0
+        while queue and nb_updates < nb_required:
+            items = queue.popleft()
+            if self.update_counts(counts, items, len(items) / len(target), used, branches):
+                nb_updates += 1
+            if len(items) > min_length:
+                for j in range(len(items)):
+                    subsequence = items[:j] + items[j + 1:]
+                    if subsequence not in seen:
+                        seen.add(subsequence)
+                        queue.append(subsequence)
+        return counts
+
+    def rank(self, counts, k):
+        """Ranks scored items: best score first, then by support (items found in more training
+        sequences first), then by item.
+
+        Returns:
+            list: at most k tuples (item, score).
+        """
+        ranked = sorted(counts, key=lambda item: (-counts[item],
+                                                  -self.supports[self.item_rows[item]], item))
+        return [(item, counts[item]) for item in ranked[:k]]
+
+    def predict_scores(self, target, k=1):
+        """Predicts the items most likely to follow a sequence, with their scores.
+
+        Args:
+            target(list): the sequence of items to predict from.
+            k(int): number of items to return.
+
+        Returns:
+            list: at most k tuples (item, score), most likely first. Empty if nothing can be
+            predicted.
+        """
+        return self.rank(self.scores(target), k)
+
+    def predict_batch(self, targets, k=1):
+        """Predicts the items most likely to follow each of several sequences, with their scores.
+
+        The training sequences read from the tree for a target are reused for the next ones.
+
+        Args:
+            targets(list): the sequences of items to predict from.
+            k(int): number of items to return per sequence.
+
+        Returns:
+            list: one list of at most k tuples (item, score) per target, see predict_scores.
+        """
+        branches = {}
+        return [self.rank(self.scores(target, branches), k) for target in targets]
+
+    def predict(self, target, k=1):
+        """Predicts the items most likely to follow a sequence.
+
+        Args:
+            target(list): the sequence of items to predict from.
+            k(int): number of items to return.
+
+        Returns:
+            list: at most k items, most likely first. Empty if nothing can be predicted.
+        """
+        return [item for item, _ in self.predict_scores(target, k)]
+
+
+def save_model(model, path):
+    """Writes a model to a compressed numpy file."""
+    patterns = [model.symbols[-(i + 1)] for i in range(len(model.symbols))]
+    np.savez_compressed(
+        path,
+        options=format_options(model.options),
+        history_hash=model.history_hash,
+        parents=np.array(model.parents, dtype=np.int64),
+        label_starts=np.array(model.label_starts, dtype=np.int64),
+        label_lengths=np.array(model.label_lengths, dtype=np.int64),
+        labels=np.array(model.labels, dtype=np.int64),
+        leaves=np.array(model.leaves, dtype=np.int64),
+        items=np.array(sorted(model.item_rows, key=model.item_rows.get), dtype=np.int64),
+        bitsets=model.bitsets,
+        pattern_lengths=np.array([len(p) for p in patterns], dtype=np.int64),
+        pattern_items=np.array([i for p in patterns for i in p], dtype=np.int64)
+    )
+
+
+def load_model(path):
+    """Reads a model from a numpy file written by save_model.
+
+    Returns:
+        CPTPlus: the model, None if the file does not exist.
+    """
+    if not os.path.isfile(path):
+        return None
+    with np.load(path) as data:
+        model = CPTPlus(str(data['options']))
+        model.history_hash = str(data['history_hash'])
+        model.parents = data['parents'].tolist()
+        model.label_starts = data['label_starts'].tolist()
+        model.label_lengths = data['label_lengths'].tolist()
+        model.labels = data['labels'].tolist()
+        model.leaves = data['leaves'].tolist()
+        model.item_rows = {item: row for row, item in enumerate(data['items'].tolist())}
+        model.bitsets = data['bitsets']
+        ends = np.cumsum(data['pattern_lengths']).tolist()
+        items = data['pattern_items'].tolist()
+        patterns = [tuple(items[end - n:end]) for n, end in zip(data['pattern_lengths'], ends)]
+    model.patterns = {pattern: -(i + 1) for i, pattern in enumerate(patterns)}
+    model.symbols = {symbol: pattern for pattern, symbol in model.patterns.items()}
+    model.children = {(model.parents[node], model.labels[model.label_starts[node]]): node
+                      for node in range(1, len(model.parents))}
+    model.supports = np.unpackbits(model.bitsets, axis=1).sum(axis=1, dtype=np.int64)
+    return model
+
+
+def get_model(sequences, path, options=DEFAULT_OPTIONS):
+    """Returns a model trained on the sequences, training as little as possible.
+
+    A stored model is reused as is if the sequences did not change. If sequences were added at the
+    end, only those are inserted. Otherwise (or if the options changed) the model is retrained.
+
+    Args:
+        sequences(list): all the training sequences.
+        path(str): path to the numpy file where the model is stored.
+        options(str): options of the model.
+
+    Returns:
+        CPTPlus: the trained model.
+    """
+    model = load_model(path)
+    if model is None or model.options != parse_options(options):
+        model = CPTPlus(options)
+    if model.fit(sequences):
+        save_model(model, path)
+    return model
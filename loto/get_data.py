@@ -9,6 +9,7 @@ Ideally this is run as an option of the CLI "-r" that you would use like so, for
 """
 import helpers as hp
 import config as cf
+import cooccurrence as co
 
 
 def main():
@@ -18,6 +19,12 @@ def main():
     numbers = hp.prepare_data(cf.TMP_DL_DIR)
     hp.load_db(numbers, cf.DB_PATH, cf.DB_NAME)
 
+    # Joint statistics are kept up to date with the new draws only
+    hp.create_necessary_directories(cf.STORE_PATH)  # First run
+    arrays = hp.get_numbers_as_arrays(cf.DB_PATH, cf.DB_NAME)
+    co.get_cooccurrences(arrays['balls'], arrays['stars'], cf.STORE_PATH + cf.COOCCURRENCES_NAME)
+    print(f"Co-occurrences updated :: {cf.COOCCURRENCES_NAME}")
+
 
 if __name__ == '__main__':
 
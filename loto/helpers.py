@@ -7,16 +7,15 @@ reshaping data from a csv file, so it can be loaded in a sqlite3 DB.
 """
 import csv
 import datetime as dt
-import itertools
 import os
 import sys
 import shutil
 import sqlite3
-import time
 import zipfile
 
 import colorama
 import dateutil.parser
+import numpy as np
 import pandas as pd
 import requests
 from requests.exceptions import RequestException
@@ -298,12 +297,43 @@ def get_numbers_as_sequences(db_path, db_name):
         sys.exit(1)
 
 
-def spinning_cursor(seconds):
-    """Shows a spinning cursor for a number of seconds."""
-    spinner = itertools.cycle(['-', '\\', '|', '/'])
-    t_end = time.time() + seconds
-    while time.time() < t_end:
-        sys.stdout.write(next(spinner))
-        sys.stdout.flush()
-        time.sleep(0.2)
-        sys.stdout.write('\b')
+def get_numbers_as_dataframe(db_path, db_name):
+    """Selects all the rows & columns of the numbers table, as a pandas dataframe.
+
+    Args:
+        db_name(str): name of the DB.
+        db_path(str): path to the directory where the DB is stored.
+
+    Returns:
+        pandas dataframe: one to one extraction of the table, sorted by draw date.
+    """
+    try:
+        con = sqlite3.connect(db_path + db_name)
+        sql = '''SELECT draw_date,
+                        ball_1, ball_2, ball_3, ball_4, ball_5,
+                        star_1, star_2
+                 FROM numbers
+                 ORDER BY draw_date ASC;'''
+        return pd.read_sql(sql, con, parse_dates=['draw_date'])
+    except sqlite3.OperationalError as e:
+        print(f"Sqlite error :: {e}")
+        print(f"{colorama.Fore.RED}Is this your first run? Try running 'python loto/core.py rf'\
+                {colorama.Style.RESET_ALL}")
+        sys.exit(1)
+
+
+def get_numbers_as_arrays(db_path, db_name):
+    """Selects lottery numbers as numpy arrays, one row per draw (in the order drawn).
+
+    Args:
+        db_name(str): name of the DB.
+        db_path(str): path to the directory where the DB is stored.
+
+    Returns:
+        dict: dictionary of numpy arrays {'balls': array (N, 5), 'stars': array (N, 2)}.
+    """
+    numbers_as_sequences = get_numbers_as_sequences(db_path, db_name)
+    return {
+        'balls': np.array(numbers_as_sequences['balls'], dtype=np.int64).reshape(-1, 5),
+        'stars': np.array(numbers_as_sequences['stars'], dtype=np.int64).reshape(-1, 2)
+    }
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""NIST SP 800-22 style randomness tests, written with numpy/scipy only.
+
+A quick alternative to dieharder (no external binary, seconds instead of hours). The tests are the
+ones described in `NIST's SP 800-22 <https://csrc.nist.gov/publications/detail/sp/800-22/rev-1a/
+final>`_: frequency (monobit), block frequency, runs, longest run of ones, cumulative sums,
+approximate entropy and serial.
+
+Lottery numbers are not bits, so they are first turned into a stream of unbiased bits (see
+`extract_bits`).
+"""
+import math
+
+import numpy as np
+from scipy.special import erfc, gammaincc
+from scipy.stats import norm
+
+
+# Longest run of ones: (block length, classes lower/upper bounds, classes probabilities)
+LONGEST_RUN_PARAMS = [
+    (750000, 10000, 10, 16, [0.0882, 0.2092, 0.2483, 0.1933, 0.1208, 0.0675, 0.0727]),
+    (6272, 128, 4, 9, [0.1174, 0.2430, 0.2493, 0.1752, 0.1027, 0.1124]),
+    (128, 8, 1, 4, [0.2148, 0.3672, 0.2305, 0.1875])
+]
+
+
+def extract_bits(values, nb_values):
+    """Turns numbers drawn uniformly in [1, nb_values] into a stream of unbiased bits.
+
+    The range is split into power-of-two sized blocks (50 = 32 + 16 + 2, 12 = 8 + 4). A number
+    falling in a block of size 2^k gives the k bits of its offset within that block: if the numbers
+    are uniform, so are the bits. Done for all numbers at once with lookup tables.
+
+    Args:
+        values(array like): the numbers, between 1 and nb_values.
+        nb_values(int): how many different numbers can be drawn (50 for balls, 12 for stars).
+
+    Returns:
+        numpy array: array of 0 and 1 (uint8).
+
+    Raises:
+        ValueError: if a number is not between 1 and nb_values.
+    """
+    values = np.asarray(values, dtype=np.int64).ravel() - 1
+    if values.size and (values.min() < 0 or values.max() >= nb_values):
+        raise ValueError(f"Numbers must be between 1 and {nb_values}")
+
+    # Lookup tables: number of bits and block offset for each possible (0 based) value
+    nb_bits = np.zeros(nb_values, dtype=np.int64)
+    offsets = np.zeros(nb_values, dtype=np.int64)
+    start = 0
+    for k in reversed(range(nb_values.bit_length())):
+        if nb_values & (1 << k):
+            nb_bits[start:start + (1 << k)] = k
+            offsets[start:start + (1 << k)] = start
+            start += 1 << k
+
+    width = int(nb_bits.max())
+    shifts = np.arange(width - 1, -1, -1)
+    # Right aligned bits of each offset, one row per number, then keep only the meaningful ones
+    bits = ((values - offsets[values])[:, None] >> shifts) & 1
+    mask = shifts < nb_bits[values][:, None]
+    return bits[mask].astype(np.uint8)
+
+
+def frequency(bits):
+    """Frequency (monobit) test.
+
+    Returns:
+        tuple: (p-value, statistic).
+    """
+    n = bits.size
+    s_obs = abs(int(np.sum(2 * bits.astype(np.int64) - 1))) / math.sqrt(n)
+    return erfc(s_obs / math.sqrt(2)), s_obs
+
+
+def block_frequency(bits, block_length):
+    """Frequency test within a block.
+
+    Returns:
+        tuple: (p-value, statistic). None if the sequence is shorter than a block.
+    """
+    nb_blocks = bits.size // block_length
+    if nb_blocks == 0:
+        return None
+    blocks = bits[:nb_blocks * block_length].reshape(nb_blocks, block_length)
+    proportions = blocks.mean(axis=1)
+    chi_square = 4 * block_length * np.sum((proportions - 0.5) ** 2)
+    return gammaincc(nb_blocks / 2, chi_square / 2), chi_square
+
+
+def runs(bits):
+    """Runs test.
+
+    Returns:
+        tuple: (p-value, statistic). The p-value is 0 if the frequency prerequisite is not met.
+    """
+    n = bits.size
+    pi = bits.mean()
+    if abs(pi - 0.5) >= 2 / math.sqrt(n):
+        return 0.0, 0.0
+    v_obs = 1 + int(np.count_nonzero(bits[1:] != bits[:-1]))
+    p_value = erfc(abs(v_obs - 2 * n * pi * (1 - pi)) / (2 * math.sqrt(2 * n) * pi * (1 - pi)))
+    return p_value, float(v_obs)
+
+
+def longest_runs_of_ones(blocks):
+    """Returns the longest run of ones of every row of a 2D array of bits."""
+    nb_blocks, block_length = blocks.shape
+    # A zero on both sides of every row: runs can't span two rows and always start/end somewhere
+    padded = np.zeros((nb_blocks, block_length + 2), dtype=np.int8)
+    padded[:, 1:-1] = blocks
+    edges = np.diff(padded.ravel())
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    longest = np.zeros(nb_blocks, dtype=np.int64)
+    np.maximum.at(longest, starts // (block_length + 2), ends - starts)
+    return longest
+
+
+def longest_run(bits):
+    """Test for the longest run of ones in a block.
+
+    Returns:
+        tuple: (p-value, statistic, block length). None if the sequence is too short (< 128 bits).
+    """
+    for min_n, block_length, low, high, probabilities in LONGEST_RUN_PARAMS:
+        if bits.size >= min_n:
+            break
+    else:
+        return None
+    nb_blocks = bits.size // block_length
+    blocks = bits[:nb_blocks * block_length].reshape(nb_blocks, block_length)
+    longest = np.clip(longest_runs_of_ones(blocks), low, high)
+    observed = np.bincount(longest - low, minlength=high - low + 1)
+    expected = nb_blocks * np.asarray(probabilities)
+    chi_square = np.sum((observed - expected) ** 2 / expected)
+    return gammaincc((high - low) / 2, chi_square / 2), chi_square, block_length
+
+
+def cumulative_sums(bits, reverse=False):
+    """Cumulative sums (cusum) test, forward or backward.
+
+    Returns:
+        tuple: (p-value, statistic).
+    """
+    n = bits.size
+    steps = 2 * bits.astype(np.int64) - 1
+    if reverse:
+        steps = steps[::-1]
+    z = int(np.max(np.abs(np.cumsum(steps))))
+    if z == 0:
+        return 0.0, 0.0
+    sqrt_n = math.sqrt(n)
+    k = np.arange(int((-n / z + 1) // 4), int((n / z - 1) // 4) + 1)
+    sum_1 = np.sum(norm.cdf((4 * k + 1) * z / sqrt_n) - norm.cdf((4 * k - 1) * z / sqrt_n))
+    k = np.arange(int((-n / z - 3) // 4), int((n / z - 1) // 4) + 1)
+    sum_2 = np.sum(norm.cdf((4 * k + 3) * z / sqrt_n) - norm.cdf((4 * k + 1) * z / sqrt_n))
+    return float(min(max(1 - sum_1 + sum_2, 0.0), 1.0)), float(z)
+
+
+def pattern_counts(bits, m):
+    """Counts the overlapping m-bit patterns of a sequence (wrapped around its end).
+
+    Returns:
+        numpy array: 2^m counts, the pattern value is the index.
+    """
+    if m == 0:
+        return np.array([bits.size])
+    n = bits.size
+    extended = np.concatenate((bits, bits[:m - 1])).astype(np.int64)
+    patterns = np.zeros(n, dtype=np.int64)
+    for j in range(m):
+        patterns = (patterns << 1) | extended[j:j + n]
+    return np.bincount(patterns, minlength=2 ** m)
+
+
+def approximate_entropy(bits, m):
+    """Approximate entropy test.
+
+    Returns:
+        tuple: (p-value, statistic).
+    """
+    n = bits.size
+
+    def phi(length):
+        counts = pattern_counts(bits, length)
+        counts = counts[counts > 0] / n
+        return np.sum(counts * np.log(counts))
+
+    ap_en = phi(m) - phi(m + 1)
+    chi_square = 2 * n * (math.log(2) - ap_en)
+    return gammaincc(2 ** (m - 1), chi_square / 2), chi_square
+
+
+def serial(bits, m):
+    """Serial test.
+
+    Returns:
+        tuple: (p-value 1, p-value 2, statistic 1, statistic 2).
+    """
+    n = bits.size
+
+    def psi_square(length):
+        if length <= 0:
+            return 0.0
+        return (2 ** length / n) * np.sum(pattern_counts(bits, length) ** 2) - n
+
+    psi_m, psi_m1, psi_m2 = psi_square(m), psi_square(m - 1), psi_square(m - 2)
+    delta_1 = psi_m - psi_m1
+    delta_2 = psi_m - 2 * psi_m1 + psi_m2
+    return (gammaincc(2 ** (m - 2), delta_1 / 2), gammaincc(2 ** (m - 3), delta_2 / 2),
+            delta_1, delta_2)
+
+
+def assess(p_value, alpha=0.01):
+    """NIST's decision rule: a p-value under the significance level alpha is a failure."""
+    return 'FAILED' if p_value < alpha else 'PASSED'
+
+
+def run_battery(bits):
+    """Runs every test of the battery on a stream of bits.
+
+    Parameters (block length, m) are picked from the sequence length following NIST's
+    recommendations. They are returned in the 'ntup' field, as dieharder does.
+
+    Args:
+        bits(numpy array): array of 0 and 1.
+
+    Returns:
+        list: list of dicts {'tool', 'test_name', 'ntup', 'p_value', 'assessment', 'value'}. Empty
+        if there are no bits.
+    """
+    n = bits.size
+    if n == 0:
+        return []
+    block_length = max(20, n // 99 + 1)
+    log_n = int(math.log2(n))
+    m_apen = max(2, min(10, log_n - 6))
+    m_serial = max(3, min(16, log_n - 3))
+
+    results = [
+        ('frequency', None, frequency(bits)),
+        ('runs', None, runs(bits)),
+        ('cumulative_sums_forward', None, cumulative_sums(bits)),
+        ('cumulative_sums_backward', None, cumulative_sums(bits, reverse=True)),
+        ('approximate_entropy', m_apen, approximate_entropy(bits, m_apen)),
+    ]
+    block_frequencies = block_frequency(bits, block_length)
+    if block_frequencies is not None:
+        results.insert(1, ('block_frequency', block_length, block_frequencies))
+    longest = longest_run(bits)
+    if longest is not None:
+        results.append(('longest_run', longest[2], longest[:2]))
+    p_value_1, p_value_2, delta_1, delta_2 = serial(bits, m_serial)
+    results.append(('serial_1', m_serial, (p_value_1, delta_1)))
+    results.append(('serial_2', m_serial, (p_value_2, delta_2)))
+
+    return [{'tool': 'nist', 'test_name': test_name, 'ntup': ntup, 'p_value': float(p_value),
+             'assessment': assess(p_value), 'value': float(statistic)}
+            for test_name, ntup, (p_value, statistic) in results]
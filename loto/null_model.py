@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Monte Carlo simulations of a fair lottery, to tell if a statistic of the history is unusual.
+
+Synthetic EuroMillions histories (same number of draws as the real one) are generated in batches
+with numpy's random Generator. Batches are spread across processes, each batch with its own
+independent seed (spawned from a single SeedSequence, so a run can be reproduced). A statistic is
+computed for every synthetic history, which gives its distribution under the null hypothesis: the
+empirical p-value of the real history's statistic follows.
+"""
+import multiprocessing
+import time
+
+import numpy as np
+
+import cooccurrence as co
+
+
+def draw_numbers(rng, shape, nb_values, nb_drawn):
+    """Draws numbers without replacement, for many draws at once.
+
+    Every possible number gets a random key, the numbers with the smallest keys are drawn, in the
+    order of their keys (so positions are random too, like ball_1 is the first ball drawn).
+
+    Args:
+        rng(numpy Generator): random generator.
+        shape(tuple): shape of the draws, e.g. (histories, draws).
+        nb_values(int): how many different numbers can be drawn (50 for balls, 12 for stars).
+        nb_drawn(int): how many numbers per draw (5 for balls, 2 for stars).
+
+    Returns:
+        numpy array: numbers drawn, shape (*shape, nb_drawn), between 1 and nb_values.
+    """
+    keys = rng.random((*shape, nb_values), dtype=np.float32)
+    smallest = np.argpartition(keys, nb_drawn, axis=-1)[..., :nb_drawn]
+    order = np.argsort(np.take_along_axis(keys, smallest, axis=-1), axis=-1)
+    return np.take_along_axis(smallest, order, axis=-1) + 1
+
+
+def check_range(numbers, nb_values):
+    """Raises ValueError if a number is not between 1 and nb_values.
+
+    Out of range numbers would be counted in the wrong history (see counts), or not at all.
+    """
+    if numbers.size and (numbers.min() < 1 or numbers.max() > nb_values):
+        raise ValueError(f"Numbers must be between 1 and {nb_values}")
+
+
+def counts(numbers, nb_values):
+    """Occurrences of each number in each history, shape (histories, nb_values)."""
+    check_range(numbers, nb_values)
+    nb_histories = numbers.shape[0]
+    flat = numbers.reshape(nb_histories, -1) - 1 + nb_values * np.arange(nb_histories)[:, None]
+    return np.bincount(flat.ravel(), minlength=nb_histories * nb_values).reshape(-1, nb_values)
+
+
+def chi_square(numbers, nb_values):
+    """Chi square of the numbers counts against a uniform distribution, one per history."""
+    observed = counts(numbers, nb_values)
+    expected = observed.sum(axis=1, keepdims=True) / nb_values
+    return np.sum((observed - expected) ** 2 / expected, axis=1)
+
+
+def chi2_balls(balls, stars):
+    """Chi square of the balls counts."""
+    return chi_square(balls, co.NB_BALLS)
+
+
+def chi2_stars(balls, stars):
+    """Chi square of the stars counts."""
+    return chi_square(stars, co.NB_STARS)
+
+
+def max_ball_count(balls, stars):
+    """Number of times the most drawn ball was drawn."""
+    return counts(balls, co.NB_BALLS).max(axis=1)
+
+
+def max_pair_count(balls, stars):
+    """Number of times the pair of balls most often drawn together was drawn."""
+    indicators = np.zeros((*balls.shape[:2], co.NB_BALLS), dtype=np.float32)
+    np.put_along_axis(indicators, balls - 1, 1, axis=-1)
+    pairs = np.matmul(indicators.transpose(0, 2, 1), indicators)
+    pairs[:, range(co.NB_BALLS), range(co.NB_BALLS)] = 0
+    return pairs.max(axis=(1, 2))
+
+
+# Statistics the user can choose from. They all take the balls (H, N, 5) and stars (H, N, 2) of
+# H histories and return H values.
+STATISTICS = {
+    'chi2_balls': chi2_balls,
+    'chi2_stars': chi2_stars,
+    'max_ball_count': max_ball_count,
+    'max_pair_count': max_pair_count
+}
+
+
+def simulate_batch(args):
+    """Generates a batch of synthetic histories and computes the statistic for each of them.
+
+    Args:
+        args(tuple): (seed sequence, statistic name, number of histories, number of draws), as a
+            tuple so it can be mapped on a pool of processes.
+
+    Returns:
+        numpy array: the statistic of every history of the batch.
+    """
+    seed_sequence, statistic, nb_histories, nb_draws = args
+    rng = np.random.default_rng(seed_sequence)
+    balls = draw_numbers(rng, (nb_histories, nb_draws), co.NB_BALLS, 5)
+    stars = draw_numbers(rng, (nb_histories, nb_draws), co.NB_STARS, 2)
+    return STATISTICS[statistic](balls, stars)
+
+
+def empirical_p_value(observed, simulated):
+    """Share of simulated values at least as extreme (as large) as the observed one.
+
+    One is added on both sides so a p-value is never zero (see `Davison & Hinkley
+    <https://doi.org/10.1017/CBO9780511802843>`_).
+    """
+    return (1 + np.count_nonzero(simulated >= observed)) / (1 + simulated.size)
+
+
+def run_null_model(balls, stars, statistic, nb_histories, batch_size=100, processes=None,
+                   seed=None):
+    """Compares a statistic of the real history to its distribution under a fair lottery.
+
+    Args:
+        balls(numpy array): real balls drawn, shape (N, 5).
+        stars(numpy array): real stars drawn, shape (N, 2).
+        statistic(str): name of the statistic, one of STATISTICS.
+        nb_histories(int): number of synthetic histories to generate.
+        batch_size(int): number of histories generated at once by a process.
+        processes(int): number of processes, defaults to the number of CPUs.
+        seed(int): seed of the root SeedSequence, random if None.
+
+    Returns:
+        dict: {'observed': float, 'simulated': numpy array, 'p_value': float,
+            'histories_per_second': float, 'seed': int}.
+
+    Raises:
+        ValueError: if a ball is not between 1 and 50, or a star between 1 and 12, or if there
+            is no history to generate.
+    """
+    if nb_histories < 1:
+        raise ValueError(f"At least one history must be generated, not {nb_histories}")
+    check_range(balls, co.NB_BALLS)
+    check_range(stars, co.NB_STARS)
+    nb_draws = balls.shape[0]
+    observed = float(STATISTICS[statistic](balls[None], stars[None])[0])
+
+    root = np.random.SeedSequence(seed)
+    sizes = [batch_size] * (nb_histories // batch_size)
+    if nb_histories % batch_size:
+        sizes.append(nb_histories % batch_size)
+    tasks = [(child, statistic, size, nb_draws)
+             for child, size in zip(root.spawn(len(sizes)), sizes)]
+
+    start_time = time.perf_counter()
+    with multiprocessing.Pool(processes) as pool:
+        simulated = np.concatenate(list(pool.imap_unordered(simulate_batch, tasks)))
+    elapsed = time.perf_counter() - start_time
+
+    return {
+        'observed': observed,
+        'simulated': simulated,
+        'p_value': empirical_p_value(observed, simulated),
+        'histories_per_second': nb_histories / elapsed,
+        'seed': root.entropy
+    }
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Polite, concurrent and cached queries to the OEIS website.
+
+Queries run concurrently with asyncio: each one is sent with requests from a small thread pool, a
+semaphore bounds how many are in flight, and a token bucket limits how many are sent per second
+(short bursts are allowed, the average rate is not exceeded).
+
+Responses are cached in the store DB, keyed by the query string of the URL, for a limited time
+(TTL): a query already answered is not sent again until its response expires. Failed queries are
+not cached.
+"""
+import asyncio
+import concurrent.futures
+import functools
+import sqlite3
+import time
+from urllib.parse import urlsplit
+
+import requests
+
+import helpers as hp
+
+
+class TokenBucket:
+    """Token bucket rate limiter for asyncio tasks.
+
+    The bucket holds up to `capacity` tokens and is refilled with `rate` tokens per second. Each
+    request takes a token, waiting for one if the bucket is empty.
+
+    Args:
+        rate(float): tokens added per second, no limit if None.
+        capacity(int): maximum number of tokens, i.e. the largest burst of requests.
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        """Takes a token, waits until one is available if needed."""
+        if self.rate is None:
+            return
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def connect_cache(store_path, store_name):
+    """Connects to the store DB, creating the OEIS cache table if needed.
+
+    Args:
+        store_path(str): path to the directory where the store DB is kept.
+        store_name(str): name of the store DB.
+
+    Returns:
+        sqlite3 connection: connection to the store DB.
+    """
+    hp.create_necessary_directories(store_path)  # First run
+    con = sqlite3.connect(store_path + store_name)
+    con.execute(
+        '''CREATE TABLE IF NOT EXISTS oeis_cache
+           (query text PRIMARY KEY, response text, fetched_at real);''')
+    return con
+
+
+def cache_key(url):
+    """Returns the key of a URL in the cache: its query string."""
+    return urlsplit(url).query
+
+
+def get_cached(con, url, ttl):
+    """Returns the cached response to a URL, None if there is none or it expired.
+
+    Args:
+        con(sqlite3 connection): connection to the store DB.
+        url(str): queried URL.
+        ttl(float): time to live of the responses, in seconds.
+
+    Returns:
+        str: the response text.
+    """
+    c = con.cursor()
+    c.execute('''SELECT response FROM oeis_cache WHERE query = ? AND fetched_at >= ?''',
+              (cache_key(url), time.time() - ttl))
+    row = c.fetchone()
+    return None if row is None else row[0]
+
+
+def cache_response(con, url, response):
+    """Stores the response to a URL in the cache."""
+    con.execute('''INSERT OR REPLACE INTO oeis_cache (query, response, fetched_at)
+                   VALUES (?, ?, ?);''', (cache_key(url), response, time.time()))
+    con.commit()
+
+
+async def fetch_all(urls, bucket, max_in_flight, timeout):
+    """Sends GET requests to all the URLs, concurrently.
+
+    Args:
+        urls(list): URLs to query.
+        bucket(TokenBucket): rate limiter.
+        max_in_flight(int): maximum number of requests waiting for a response.
+        timeout(float): timeout of each request, in seconds.
+
+    Returns:
+        list: response texts, or exceptions for the failed requests, in the order of the URLs.
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(max_in_flight)
+
+    with concurrent.futures.ThreadPoolExecutor(max_in_flight) as executor:
+        async def fetch(url):
+            async with semaphore:
+                await bucket.acquire()
+                response = await loop.run_in_executor(
+                    executor, functools.partial(requests.get, url, timeout=timeout))
+                response.raise_for_status()
+                return response.text
+
+        return await asyncio.gather(*[fetch(url) for url in urls], return_exceptions=True)
+
+
+def get_responses(urls, con=None, ttl=0, rate=None, capacity=1, max_in_flight=4, timeout=10):
+    """Returns the responses to all the URLs, from the cache or from the network.
+
+    Args:
+        urls(list): URLs to query.
+        con(sqlite3 connection): connection to the store DB, no cache if None.
+        ttl(float): time to live of the cached responses, in seconds.
+        rate(float): maximum number of requests per second, no limit if None.
+        capacity(int): maximum number of requests sent at once, after some time without any.
+        max_in_flight(int): maximum number of requests waiting for a response.
+        timeout(float): timeout of each request, in seconds.
+
+    Returns:
+        tuple: (dict {url: response text, or the exception raised}, number of cached responses).
+    """
+    responses = {}
+    if con is not None:
+        for url in urls:
+            cached = get_cached(con, url, ttl)
+            if cached is not None:
+                responses[url] = cached
+    nb_cached = len(responses)
+
+    missing = [url for url in dict.fromkeys(urls) if url not in responses]
+    if missing:
+        bucket = TokenBucket(rate, capacity)
+        results = asyncio.run(fetch_all(missing, bucket, max_in_flight, timeout))
+        for url, result in zip(missing, results):
+            responses[url] = result
+            if con is not None and not isinstance(result, BaseException):
+                cache_response(con, url, result)
+    return responses, nb_cached
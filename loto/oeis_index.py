@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Local index of the OEIS sequences, to search for draws without querying the OEIS website.
+
+The index is built from the OEIS `stripped` dump (https://oeis.org/stripped.gz), one line per
+sequence::
+
+    A000045 ,0,1,1,2,3,5,8,13,21,34,55,89,144,233,377,610,987,1597,2584,4181,6765,
+
+Draw numbers are small, so only the terms between 0 and 254 are kept, as single bytes. The other
+terms (and the end of every sequence) become a separator, which no draw can match. All the terms
+are stored end to end in a single array, along with an inverted index of their n-grams (n
+consecutive terms): for every n-gram, the positions where it starts.
+
+To check if a draw appears in a sequence, the least frequent n-gram of the draw is looked up, and
+only the positions where it starts are compared with the whole draw.
+
+The index is a folder of numpy files, memory mapped when loaded (nothing is read until needed).
+"""
+import gzip
+import os
+
+import numpy as np
+
+
+NGRAM = 3
+SEPARATOR = 255
+INDEX_FILES = ('terms', 'offsets', 'anumbers', 'keys', 'starts', 'positions')
+
+
+def read_stripped(path):
+    """Reads the sequences of an OEIS stripped dump (gzipped or not).
+
+    Args:
+        path(str): path to the dump.
+
+    Yields:
+        tuple: (A-number as an int, list of terms as strings).
+    """
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as file:
+        for line in file:
+            if not line.startswith('A'):
+                continue  # Comments
+            anumber, _, terms = line.partition(' ')
+            yield int(anumber[1:]), terms.strip().strip(',').split(',')
+
+
+def encode_terms(terms):
+    """Turns the terms of a sequence into bytes, the terms which don't fit become separators.
+
+    Args:
+        terms(list): terms as strings.
+
+    Returns:
+        bytes: one byte per term, followed by a separator.
+    """
+    return bytes([int(t) if len(t) <= 3 and t.isdigit() and int(t) < SEPARATOR else SEPARATOR
+                  for t in terms] + [SEPARATOR])
+
+
+def ngram_keys(terms):
+    """Encodes the n-grams of an array of bytes as integers.
+
+    Returns:
+        numpy array: key of the n-gram starting at each position, shape (len(terms) - NGRAM + 1,).
+    """
+    terms = np.asarray(terms, dtype=np.int64)
+    keys = np.zeros(terms.size - NGRAM + 1, dtype=np.int64)
+    for j in range(NGRAM):
+        keys = (keys << 8) | terms[j:terms.size - NGRAM + 1 + j]
+    return keys
+
+
+def build_index(dump_path, index_path):
+    """Builds the index of an OEIS stripped dump and writes it to a folder.
+
+    Args:
+        dump_path(str): path to the dump.
+        index_path(str): path to the folder of the index.
+
+    Returns:
+        int: number of sequences indexed.
+    """
+    chunks, offsets, anumbers = [], [], []
+    offset = 0
+    for anumber, terms in read_stripped(dump_path):
+        encoded = encode_terms(terms)
+        chunks.append(encoded)
+        offsets.append(offset)
+        anumbers.append(anumber)
+        offset += len(encoded)
+    terms = np.frombuffer(b''.join(chunks), dtype=np.uint8)
+
+    # Inverted index: the n-grams without separators, sorted, with the positions where they start
+    keys = ngram_keys(terms)
+    valid = np.ones(keys.size, dtype=bool)
+    for j in range(NGRAM):
+        valid &= terms[j:terms.size - NGRAM + 1 + j] != SEPARATOR
+    positions = np.flatnonzero(valid)
+    order = np.argsort(keys[positions], kind='stable')
+    unique_keys, starts = np.unique(keys[positions][order], return_index=True)
+
+    index = {
+        'terms': terms,
+        'offsets': np.array(offsets, dtype=np.int64),
+        'anumbers': np.array(anumbers, dtype=np.int32),
+        'keys': unique_keys.astype(np.uint32),
+        'starts': np.append(starts, positions.size).astype(np.int64),
+        'positions': positions[order].astype(np.uint32)
+    }
+    os.makedirs(index_path, exist_ok=True)
+    for name in INDEX_FILES:
+        np.save(os.path.join(index_path, name + '.npy'), index[name])
+    return len(anumbers)
+
+
+def load_index(index_path):
+    """Loads (memory maps) an index written by build_index.
+
+    Returns:
+        dict: the arrays of the index, None if there is no index in the folder.
+    """
+    if not all(os.path.isfile(os.path.join(index_path, name + '.npy')) for name in INDEX_FILES):
+        return None
+    return {name: np.load(os.path.join(index_path, name + '.npy'), mmap_mode='r')
+            for name in INDEX_FILES}
+
+
+def find_sequences(index, numbers):
+    """Finds the sequences in which some numbers appear, as consecutive terms.
+
+    Args:
+        index(dict): index loaded by load_index.
+        numbers(list): the numbers, at least NGRAM of them.
+
+    Returns:
+        list: A-numbers (as ints) of the sequences, sorted.
+    """
+    if len(numbers) < NGRAM:
+        raise ValueError(f"At least {NGRAM} numbers are needed, got {len(numbers)}")
+    query = np.asarray(numbers, dtype=np.int64)
+    if query.min() < 0 or query.max() >= SEPARATOR:
+        return []
+
+    # Positions of each n-gram of the query, the shortest list of positions is checked
+    keys = ngram_keys(query)
+    found = np.searchsorted(index['keys'], keys)
+    if (found >= index['keys'].size).any() or (index['keys'][np.minimum(
+            found, index['keys'].size - 1)] != keys).any():
+        return []
+    sizes = index['starts'][found + 1] - index['starts'][found]
+    shift = int(np.argmin(sizes))
+    begin, end = index['starts'][found[shift]], index['starts'][found[shift] + 1]
+    candidates = index['positions'][begin:end].astype(np.int64) - shift
+    candidates = candidates[(candidates >= 0) & (candidates + query.size <= index['terms'].size)]
+
+    windows = index['terms'][candidates[:, None] + np.arange(query.size)]
+    matches = candidates[(windows == query).all(axis=1)]
+    sequences = np.searchsorted(index['offsets'], matches, side='right') - 1
+    return sorted(set(int(a) for a in index['anumbers'][sequences]))
+
+
+def format_anumber(anumber):
+    """Returns an A-number as written by the OEIS, e.g. 45 -> 'A000045'."""
+    return f"A{anumber:06d}"
@@ -1,6 +1,9 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-"""Run statistical tests suites Dieharder & ENT
+"""Run statistical tests suites Dieharder & ENT, and a built-in NIST SP 800-22 style battery
+
+The output of the tools is parsed and stored in the store DB, keyed by the hash of the tested
+series: a series which did not change since its last run is not tested again.
 
 Should be run from the CLI (depending on how you installed it), e.g.::
 
@@ -10,13 +13,23 @@ But can also be run as a script::
 
     $ python loto/x1_statistics.py
 """
+import datetime as dt
+import hashlib
+import os
+import re
 import shutil
+import sqlite3
 import subprocess
 
+import numpy as np
+import pandas as pd
 from pyfiglet import Figlet
+from scipy import stats
 
 import helpers as hp
 import config as cf
+import nist_battery as nb
+import null_model as nm
 
 
 def build_stats_tests_sets(db_path, db_name):
@@ -82,38 +95,492 @@ def check_installed_tools(desired_tools):
     return installed_tools
 
 
-def run_tools(installed_tools, list_paths):
-    """Starts a subprocess to run each requested tool, sequentially.
+def hash_series(path):
+    """Returns the hash of a test set file, used as the key of its results in the store.
+
+    Args:
+        path(str): path to the test set file.
+
+    Returns:
+        str: sha256 hex digest of the file content.
+    """
+    with open(path, 'rb') as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def run_tool(tool, path):
+    """Starts a subprocess to run a tool on a test set file and captures its output.
+
+    Args:
+        tool(str): the tool to run, 'ent' or 'dieharder'.
+        path(str): path to the test set file.
+
+    Returns:
+        str: what the tool printed on stdout.
+    """
+    if tool == 'ent':
+        # '-c' = print occurrence counts
+        cmd = ['ent', '-c', path]
+    else:
+        # '-f' = filename | '-a' = run all tests with std/default options, (very) long
+        cmd = ['dieharder', '-a', '-f', path]
+    completed = subprocess.run(cmd, capture_output=True, text=True)
+    return completed.stdout
+
+
+def assess_ent_chi_square(exceed_percent):
+    """Turns ENT's chi square percentage into a dieharder like assessment.
+
+    Thresholds are the ones given by `ENT's docs <https://www.fourmilab.ch/random/>`_: more than
+    99% or less than 1% is non random, between 95% and 99% or between 1% and 5% is suspect.
+
+    Args:
+        exceed_percent(float): how often a truly random sequence would exceed the chi square value.
+
+    Returns:
+        str: 'PASSED', 'WEAK' or 'FAILED'.
+    """
+    if exceed_percent < 1 or exceed_percent > 99:
+        return 'FAILED'
+    if exceed_percent < 5 or exceed_percent > 95:
+        return 'WEAK'
+    return 'PASSED'
+
+
+def parse_ent_output(output):
+    """Parses the output of ENT into records.
+
+    One record per metric: entropy, compression, chi square, mean, monte carlo pi and serial
+    correlation. Only the chi square record carries a p-value and an assessment.
+
+    Args:
+        output(str): what ENT printed on stdout.
+
+    Returns:
+        list: list of dicts {'tool', 'test_name', 'ntup', 'p_value', 'assessment', 'value'}.
+    """
+    patterns = {
+        'entropy': r'Entropy = ([\d.]+) bits per',
+        'compression': r'would reduce the size\s+of this \d+ byte file by ([\d.]+) percent',
+        'chi_square': r'Chi square distribution for \d+ samples is ([\d.]+)',
+        'mean': r'Arithmetic mean value of data bytes is ([\d.]+)',
+        'monte_carlo_pi': r'Monte Carlo value for Pi is ([\d.]+)',
+        'serial_correlation': r'Serial correlation coefficient is (-?[\d.]+)',
+    }
+    records = []
+    for test_name, pattern in patterns.items():
+        match = re.search(pattern, output)
+        if match is None:
+            continue
+        record = {'tool': 'ent', 'test_name': test_name, 'ntup': None,
+                  'p_value': None, 'assessment': None, 'value': float(match.group(1))}
+        if test_name == 'chi_square':
+            exceed = re.search(r'would exceed this value (?:less than |more than )?'
+                               r'([\d.]+) percent', output)
+            if exceed is not None:
+                exceed_percent = float(exceed.group(1))
+                record['p_value'] = exceed_percent / 100
+                record['assessment'] = assess_ent_chi_square(exceed_percent)
+        records.append(record)
+    return records
+
+
+def parse_dieharder_output(output):
+    """Parses the output of dieharder into records.
+
+    Result lines look like this (header lines start with a '#')::
+
+        diehard_birthdays|   0|       100|     100|0.43215623|  PASSED
+
+    Args:
+        output(str): what dieharder printed on stdout.
+
+    Returns:
+        list: list of dicts {'tool', 'test_name', 'ntup', 'p_value', 'assessment', 'value'}.
+    """
+    records = []
+    for line in output.splitlines():
+        fields = [field.strip() for field in line.split('|')]
+        if line.startswith('#') or len(fields) != 6:
+            continue
+        try:
+            records.append({'tool': 'dieharder', 'test_name': fields[0], 'ntup': int(fields[1]),
+                            'p_value': float(fields[4]), 'assessment': fields[5], 'value': None})
+        except ValueError:
+            continue  # Column titles
+    return records
+
+
+def connect_results_store(store_path, store_name):
+    """Connects to the store DB, creating the results tables and their indexes if needed.
+
+    Args:
+        store_path(str): path to the directory where the store DB is kept.
+        store_name(str): name of the store DB.
+
+    Returns:
+        sqlite3 connection: connection to the store DB.
+    """
+    hp.create_necessary_directories(store_path)  # First run
+    con = sqlite3.connect(store_path + store_name)
+    con.executescript(
+        '''CREATE TABLE IF NOT EXISTS x1_runs
+           (run_id integer PRIMARY KEY AUTOINCREMENT, series_hash text, series_name text,
+            tool text, run_date datetime);
+           CREATE TABLE IF NOT EXISTS x1_results
+           (run_id int, tool text, test_name text, ntup int, p_value real, assessment text,
+            value real);
+           CREATE INDEX IF NOT EXISTS idx_x1_runs_series ON x1_runs (series_hash, tool);
+           CREATE INDEX IF NOT EXISTS idx_x1_results_run ON x1_results (run_id);
+           CREATE INDEX IF NOT EXISTS idx_x1_results_assessment
+           ON x1_results (assessment, run_id);''')
+    return con
+
+
+def get_stored_results(con, series_hash, tool):
+    """Returns the results of the latest run of a tool on a series, if any.
+
+    Args:
+        con(sqlite3 connection): connection to the store DB.
+        series_hash(str): hash of the tested series.
+        tool(str): name of the tool.
+
+    Returns:
+        list: list of dicts, empty if the series was never tested with this tool.
+    """
+    c = con.cursor()
+    c.execute('''SELECT MAX(run_id) FROM x1_runs WHERE series_hash = ? AND tool = ?''',
+              (series_hash, tool))
+    run_id = c.fetchone()[0]
+    if run_id is None:
+        return []
+    c.execute('''SELECT tool, test_name, ntup, p_value, assessment, value
+                 FROM x1_results WHERE run_id = ?''', (run_id,))
+    keys = ['tool', 'test_name', 'ntup', 'p_value', 'assessment', 'value']
+    return [dict(zip(keys, row)) for row in c.fetchall()]
+
+
+def store_results(con, series_hash, series_name, tool, records):
+    """Stores the records parsed from a run of a tool on a series.
+
+    Args:
+        con(sqlite3 connection): connection to the store DB.
+        series_hash(str): hash of the tested series.
+        series_name(str): name of the tested series (its file name).
+        tool(str): name of the tool.
+        records(list): records as returned by the parse functions.
+    """
+    c = con.cursor()
+    c.execute('''INSERT INTO x1_runs (series_hash, series_name, tool, run_date)
+                 VALUES (?, ?, ?, ?);''', (series_hash, series_name, tool, dt.datetime.now()))
+    run_id = c.lastrowid
+    c.executemany(
+        '''INSERT INTO x1_results (run_id, tool, test_name, ntup, p_value, assessment, value)
+           VALUES (?, ?, ?, ?, ?, ?, ?);''',
+        [(run_id, r['tool'], r['test_name'], r['ntup'], r['p_value'], r['assessment'], r['value'])
+         for r in records])
+    con.commit()
+
+
+def query_results(store_path, store_name, assessments=('WEAK', 'FAILED'), nb_runs=50):
+    """Selects the results with the given assessments across the latest runs.
+
+    Args:
+        store_path(str): path to the directory where the store DB is kept.
+        store_name(str): name of the store DB.
+        assessments(tuple): assessments to select.
+        nb_runs(int): number of latest runs to look into.
+
+    Returns:
+        list: list of tuples (run_date, series_name, tool, test_name, ntup, p_value, assessment).
+    """
+    con = connect_results_store(store_path, store_name)
+    c = con.cursor()
+    c.execute(
+        '''SELECT ru.run_date, ru.series_name, re.tool, re.test_name, re.ntup, re.p_value,
+                  re.assessment
+           FROM x1_results re
+           JOIN (SELECT * FROM x1_runs ORDER BY run_id DESC LIMIT ?) ru ON ru.run_id = re.run_id
+           WHERE re.assessment IN (%s)
+           ORDER BY ru.run_id DESC''' % ', '.join('?' * len(assessments)),
+        (nb_runs, *assessments))
+    results = c.fetchall()
+    con.close()
+    return results
+
+
+def print_records(records):
+    """Prints stored records as a table, in lieu of the tool's original output."""
+    for r in records:
+        ntup = '' if r['ntup'] is None else r['ntup']
+        p_value = '' if r['p_value'] is None else f"{r['p_value']:.8f}"
+        value = '' if r['value'] is None else r['value']
+        assessment = r['assessment'] or ''
+        print(f"{r['test_name']:>24}|{ntup:>4}|{p_value:>11}|{assessment:>8}|{value}")
+
+
+def run_tools(installed_tools, list_paths, store_path, store_name, force=False):
+    """Runs each requested tool on each test set file, sequentially.
 
-    Each tool is ran with sensible defaults.
+    Each tool is ran with sensible defaults. Its output is parsed and stored, a series which has
+    already been tested (same hash) is not tested again unless forced to.
 
     Args:
         installed_tools(list): list of the tools to be run, e.g. ['ent', 'dieharder'].
+        list_paths(list): paths to the test set files.
+        store_path(str): path to the directory where the store DB is kept.
+        store_name(str): name of the store DB.
+        force(bool): run the tools even on series already tested.
     """
+    con = connect_results_store(store_path, store_name)
     for tool in installed_tools:
+        if tool not in ('ent', 'dieharder'):
+            continue
         print(f"{80 * '#'}\n# {tool.upper()} \n{80 * '#'}")
         for path in list_paths:
             print(f"\n{80 * '-'}\n{path}\n")
+            series_hash = hash_series(path)
+            records = [] if force else get_stored_results(con, series_hash, tool)
+            if records:
+                print("Unchanged series, results from the store:\n")
+                print_records(records)
+                continue
+            output = run_tool(tool, path)
+            print(output)
             if tool == 'ent':
-                # '-c' = print occurrence counts
-                subprocess.run(['ent', '-c', path])
-            elif tool == 'dieharder':
-                # '-f' = filename | '-a' = run all tests with std/default options, (very) long
-                subprocess.run(['dieharder', '-a', '-f', path])
+                records = parse_ent_output(output)
+            else:
+                records = parse_dieharder_output(output)
+            if records:
+                store_results(con, series_hash, os.path.basename(path), tool, records)
         print("\n\n")
+    con.close()
 
 
-def main():
+def build_nist_series(db_path, db_name):
+    """Turns every test set (7 columns + 2 concatenated sequences) into a stream of bits.
+
+    Same sets as the ones written to files for ENT & dieharder, but kept in memory.
+
+    Args:
+        db_path(str): path to the directory where the DB is stored.
+        db_name(str): name of the DB.
+
+    Returns:
+        dict: dictionary of numpy arrays of bits {'series_name': array}.
+    """
+    arrays = hp.get_numbers_as_arrays(db_path, db_name)
+    nb_values = {'balls': 50, 'stars': 12}
+    series = {}
+    for k, v in arrays.items():
+        for i, field in enumerate(cf.TABLE_INFO['fields'][k]):
+            series[field] = nb.extract_bits(v[:, i], nb_values[k])
+    for k, v in arrays.items():
+        series[k] = nb.extract_bits(v, nb_values[k])            # Row by row concatenation
+    return series
+
+
+def run_nist_battery(db_path, db_name, store_path, store_name, force=False):
+    """Runs the built-in NIST style battery on every series, results are stored like other tools.
+
+    Args:
+        db_path(str): path to the directory where the DB is stored.
+        db_name(str): name of the DB.
+        store_path(str): path to the directory where the store DB is kept.
+        store_name(str): name of the store DB.
+        force(bool): run the battery even on series already tested.
+    """
+    con = connect_results_store(store_path, store_name)
+    print(f"{80 * '#'}\n# NIST \n{80 * '#'}")
+    for series_name, bits in build_nist_series(db_path, db_name).items():
+        print(f"\n{80 * '-'}\n{series_name} ({bits.size} bits)\n")
+        # Not packed: packbits pads to whole bytes, [1, 0, 1] and [1, 0, 1, 0, 0] would collide
+        series_hash = hashlib.sha256(f"{bits.size}:".encode() + bits.tobytes()).hexdigest()
+        records = [] if force else get_stored_results(con, series_hash, 'nist')
+        if not records:
+            records = nb.run_battery(bits)
+            store_results(con, series_hash, series_name, 'nist', records)
+        print_records(records)
+    print("\n\n")
+    con.close()
+
+
+def window_counts(values, nb_values, window=None):
+    """Counts the occurrences of each number, for each position, in every window of draws.
+
+    Sliding the window by one draw adds the counts of the draw entering the window and removes
+    the counts of the draw leaving it. These +1/-1 updates are accumulated for all the windows at
+    once with a cumulative sum.
+
+    Args:
+        values(numpy array): numbers drawn, shape (N draws, P positions), between 1 and nb_values.
+        nb_values(int): how many different numbers can be drawn (50 for balls, 12 for stars).
+        window(int): number of draws in a window, None for an expanding window.
+
+    Returns:
+        numpy array: counts, shape (N - window + 1, P, nb_values), one row per window.
+
+    Raises:
+        ValueError: if a number is not between 1 and nb_values.
+    """
+    if values.size and (values.min() < 1 or values.max() > nb_values):
+        raise ValueError(f"Numbers must be between 1 and {nb_values}")
+    nb_draws, nb_positions = values.shape
+    updates = np.zeros((nb_draws, nb_positions, nb_values), dtype=np.int32)
+    draws = np.arange(nb_draws)[:, None]
+    positions = np.arange(nb_positions)[None, :]
+    np.add.at(updates, (draws, positions, values - 1), 1)               # Draw entering
+    if window is None:
+        return np.cumsum(updates, axis=0)
+    np.add.at(updates, (draws[window:], positions, values[:-window] - 1), -1)  # Draw leaving
+    return np.cumsum(updates, axis=0)[window - 1:]
+
+
+def uniformity_statistics(counts):
+    """Chi square, Kolmogorov-Smirnov and entropy of counts, compared to a uniform distribution.
+
+    Args:
+        counts(numpy array): counts, shape (windows, positions, nb_values).
+
+    Returns:
+        dict: dictionary of numpy arrays of shape (windows, positions), one per statistic.
+    """
+    nb_values = counts.shape[-1]
+    size = counts.sum(axis=-1, keepdims=True).astype(np.float64)
+    expected = size / nb_values
+    chi_square = np.sum((counts - expected) ** 2 / expected, axis=-1)
+
+    # Distance between the empirical and the uniform cumulative distribution functions
+    ecdf = np.cumsum(counts, axis=-1) / size
+    ks = np.max(np.abs(ecdf - np.arange(1, nb_values + 1) / nb_values), axis=-1)
+
+    frequencies = counts / size
+    with np.errstate(divide='ignore', invalid='ignore'):
+        entropy = -np.sum(np.where(counts > 0, frequencies * np.log2(frequencies), 0), axis=-1)
+
+    return {
+        'chi2': chi_square,
+        'chi2_p': stats.chi2.sf(chi_square, nb_values - 1),
+        'ks': ks,
+        'ks_p': stats.kstwobign.sf(ks * np.sqrt(size[..., 0])),
+        'entropy': entropy
+    }
+
+
+def rolling_uniformity(df, window=None):
+    """Uniformity tests over rolling (or expanding) windows of draws, for every ball & star.
+
+    Args:
+        df(dataframe): draws indexed by draw date, one column per ball/star.
+        window(int): number of draws in a window, None for an expanding window.
+
+    Returns:
+        dataframe: one row per window (indexed by the date of its latest draw), one column per
+            (field, statistic), e.g. ('ball_1', 'chi2_p').
+
+    Raises:
+        ValueError: if the window is not between 1 and the number of draws.
+    """
+    if window is not None and not 1 <= window <= len(df):
+        raise ValueError(f"Window must be between 1 and {len(df)} draws :: {window}")
+    tables = []
+    for kind, nb_values in (('balls', 50), ('stars', 12)):
+        fields = list(cf.TABLE_INFO['fields'][kind])
+        counts = window_counts(df[fields].to_numpy(dtype=np.int64), nb_values, window)
+        for statistic, values in uniformity_statistics(counts).items():
+            tables.append(pd.DataFrame(
+                values,
+                index=df.index[len(df) - len(values):],
+                columns=pd.MultiIndex.from_product([fields, [statistic]])
+            ))
+    return pd.concat(tables, axis=1).sort_index(axis=1, level=0, sort_remaining=False)
+
+
+def run_rolling_uniformity(db_path, db_name, window=None):
+    """Computes the rolling uniformity table, writes it to a csv file and prints a summary.
+
+    Args:
+        db_path(str): path to the directory where the DB is stored.
+        db_name(str): name of the DB.
+        window(int): number of draws in a window, None for an expanding window.
+
+    Returns:
+        str: path to the csv file.
+    """
+    hp.create_necessary_directories(cf.FILES_DIR)  # First run
+    df = hp.get_numbers_as_dataframe(db_path, db_name).set_index('draw_date')
+    table = rolling_uniformity(df, window)
+    name = 'expanding' if window is None else f"rolling_{window}"
+    file_path = cf.FILES_DIR + 'x1_uniformity_' + name + '.csv'
+    table.to_csv(file_path)
+
+    print(f"{80 * '#'}\n# UNIFORMITY ({name.upper()}) \n{80 * '#'}\n")
+    print(f"Windows tested         :: {len(table)}")
+    p_values = table.xs('chi2_p', axis=1, level=1)
+    for field in p_values.columns:
+        rejected = p_values.index[p_values[field] < 0.01]
+        print(f"{field:<8}chi2 p < 0.01 :: {len(rejected)} windows"
+              + (f", latest ending {rejected[-1].date()}" if len(rejected) else ''))
+    print(f"\nTable saved to         :: {file_path}\n")
+    return file_path
+
+
+def run_null_model(db_path, db_name, statistic, nb_histories):
+    """Prints how unusual a statistic of the history is, compared to simulated fair lotteries.
+
+    Args:
+        db_path(str): path to the directory where the DB is stored.
+        db_name(str): name of the DB.
+        statistic(str): name of the statistic, one of null_model.STATISTICS.
+        nb_histories(int): number of synthetic histories to generate.
+
+    Returns:
+        dict: the results of the simulation, see null_model.run_null_model.
+    """
+    arrays = hp.get_numbers_as_arrays(db_path, db_name)
+    print(f"{80 * '#'}\n# NULL MODEL \n{80 * '#'}\n")
+    print(f"Simulating {nb_histories} fair histories of {len(arrays['balls'])} draws...")
+    results = nm.run_null_model(arrays['balls'], arrays['stars'], statistic, nb_histories)
+    print(f"Statistic              :: {statistic}")
+    print(f"Observed value         :: {results['observed']:.4f}")
+    print(f"Simulated mean         :: {results['simulated'].mean():.4f}")
+    print(f"Empirical p-value      :: {results['p_value']:.6f}")
+    print(f"Throughput             :: {results['histories_per_second']:.0f} histories/s")
+    print(f"Seed                   :: {results['seed']}\n")
+    return results
+
+
+def main(force=False, weak=None, nist_only=False, window=None, expanding=False, null_model=None,
+         histories=100000):
     """"""
     print(f"{Figlet(font='slant').renderText('X1 Statistics')}")
 
-    # Let's check if the tools we would love to use are installed
-    desired_tools = ['ent', 'dieharder']
-    installed_tools = check_installed_tools(desired_tools)
-    # Build the files we need for the statistical tests
-    list_paths = build_stats_tests_sets(cf.DB_PATH, cf.DB_NAME)
-    # For every file, run all the tests from all the tools present on the user's machine
-    run_tools(installed_tools, list_paths)
+    # Only query the store for the WEAK/FAILED results of the latest runs
+    if weak is not None:
+        for row in query_results(cf.STORE_PATH, cf.STORE_NAME, nb_runs=weak):
+            print(' | '.join(map(str, row)))
+        return
+
+    # Only compare a statistic of the history to its distribution under a fair lottery
+    if null_model:
+        run_null_model(cf.DB_PATH, cf.DB_NAME, null_model, histories)
+        return
+
+    # Only run the uniformity tests over windows of draws
+    if window or expanding:
+        run_rolling_uniformity(cf.DB_PATH, cf.DB_NAME, None if expanding else window)
+        return
+
+    if not nist_only:
+        # Let's check if the tools we would love to use are installed
+        desired_tools = ['ent', 'dieharder']
+        installed_tools = check_installed_tools(desired_tools)
+        # Build the files we need for the statistical tests
+        list_paths = build_stats_tests_sets(cf.DB_PATH, cf.DB_NAME)
+        # For every file, run all the tests from all the tools present on the user's machine
+        run_tools(installed_tools, list_paths, cf.STORE_PATH, cf.STORE_NAME, force)
+    # No external tool needed for this one, and it only takes seconds
+    run_nist_battery(cf.DB_PATH, cf.DB_NAME, cf.STORE_PATH, cf.STORE_NAME, force)
 
 
 if __name__ == '__main__':
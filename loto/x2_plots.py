@@ -5,6 +5,17 @@
 Many different combinations of parameters can be tried here. Most graphs generated here are trying
 to be visually pleasing if not very helpful :-)
 
+Each plot is rendered in its own process (Agg backend). The draws are written once to a memory
+mapped numpy file, which every process reads: the dataframe is not pickled to each of them.
+
+A manifest keeps track of what each image was rendered from (data hash, plot parameters, style):
+an image is only rendered again when one of those changed, or when forced to.
+
+With the tiles option, the line and area plots are also rendered as a pyramid of tiles, one tile
+per decade, year and month (zoom levels), so a viewer can pan and zoom over long histories. Each
+tile is pre-aggregated to its own resolution, and only the tiles covering new draws are rendered
+again on refresh (they have their own manifest).
+
 Should be run from the CLI (depending on how you installed it), e.g.::
 
     $ python loto/core.py x2
@@ -13,17 +24,53 @@ But can also be run as a script::
 
     $ python loto/x2_plots.py
 """
-import sqlite3
-import sys
+import functools
+import hashlib
+import json
+import multiprocessing
+import os
 
-import colorama
+import matplotlib
 import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
 from pyfiglet import Figlet
 from tqdm import tqdm
 
 import helpers as hp
 import config as cf
+import cooccurrence as co
+
+
+# Parameters of each image: changing any of them here triggers a new rendering of the image
+PLOTS_PARAMS = {
+    'x2_heatmap.png': {'style': 'default', 'figsize': (6, 9), 'dpi': 150, 'pad_inches': -0.03},
+    'x2_line.png': {'style': 'dark_background', 'figsize': (14, 3), 'dpi': 150,
+                    'cmap': 'gist_rainbow'},
+    'x2_area.png': {'style': 'dark_background', 'figsize': (14, 3), 'dpi': 150},
+    'x2_pie.png': {'style': 'dark_background', 'figsize': (20, 7), 'dpi': 150,
+                   'fontsizes': (4.5, 8)},
+    'x2_bar.png': {'style': 'dark_background', 'figsize': (14, 10), 'dpi': 150,
+                   'cmap': 'gist_rainbow'},
+    'x2_cooccurrences.png': {'style': 'dark_background', 'figsize': (12, 7), 'dpi': 150,
+                             'cmap': 'inferno'}
+}
+
+# Tiles pyramid: folder (in the images folder), parameters of each kind of tile, and zoom levels
+# as (datetime unit, number of units per tile)
+TILES_DIR = 'tiles/'
+TILES_PARAMS = {
+    'line': {'style': 'dark_background', 'figsize': (4, 2), 'dpi': 128, 'cmap': 'gist_rainbow',
+             'linewidth': 0.6},
+    'area': {'style': 'dark_background', 'figsize': (4, 2), 'dpi': 128, 'cmap': 'gist_rainbow'}
+}
+TILES_LEVELS = {
+    'decades': ('Y', 10),
+    'years': ('Y', 1),
+    'months': ('M', 1)
+}
+# Largest number of each column (balls then stars), the tiles of a kind all share the same scale
+TILES_SCALES = np.array([co.NB_BALLS] * 5 + [co.NB_STARS] * 2)
 
 
 def load_plots_dataframe(db_path, db_name):
@@ -36,19 +83,28 @@ def load_plots_dataframe(db_path, db_name):
     Returns:
         pandas dataframe: one to one extraction of the table.
     """
-    try:
-        con = sqlite3.connect(db_path + db_name)
-        sql = '''SELECT draw_date,
-                        ball_1, ball_2, ball_3, ball_4, ball_5,
-                        star_1, star_2
-                 FROM numbers
-                 ORDER BY draw_date ASC;'''
-        return pd.read_sql(sql, con, parse_dates=['draw_date'])
-    except sqlite3.OperationalError as e:
-        print(f"Sqlite error :: {e}")
-        print(f"{colorama.Fore.RED}Is this your first run? Try running 'python loto/core.py rf'\
-                {colorama.Style.RESET_ALL}")
-        sys.exit(1)
+    return hp.get_numbers_as_dataframe(db_path, db_name)
+
+
+def aggregate_rows(values, nb_bins):
+    """Reduces a matrix to at most nb_bins rows, by averaging consecutive rows.
+
+    The rows are split into nb_bins bins of (almost) equal sizes, all bins are reduced at once.
+
+    Args:
+        values(numpy array): matrix to reduce, shape (N, k).
+        nb_bins(int): maximum number of rows of the reduced matrix.
+
+    Returns:
+        numpy array: reduced matrix, shape (min(N, nb_bins), k).
+    """
+    nb_rows = values.shape[0]
+    if nb_rows <= nb_bins:
+        return values.astype(np.float64)
+    starts = np.linspace(0, nb_rows, nb_bins + 1).astype(np.int64)[:-1]
+    sums = np.add.reduceat(values.astype(np.float64), starts, axis=0)
+    sizes = np.diff(np.append(starts, nb_rows))
+    return sums / sizes[:, None]
 
 
 def gen_heatmap(df):
@@ -57,6 +113,9 @@ def gen_heatmap(df):
     On the y-axis the draw dates, on the x-axis the balls and stars. Generates a nice image of the
     distribution of the numbers more than anything else. The image is written to the images dir.
 
+    The draws are first reduced to the vertical resolution of the image (one row per pixel), then
+    drawn as a single image: the rendering time does not depend on the number of draws.
+
     Args:
         df(dataframe): pandas dataframe containing all the draw results for the lottery
             (dates/balls/stars).
@@ -65,19 +124,23 @@ def gen_heatmap(df):
         string: a string containing either a success or failure message.
     """
     try:
-        plt.figure(figsize=(6, 9))
-        plt.xlabel('')
-        plt.ylabel('')
-        plt.pcolormesh(df)
-        plt.xticks([])
-        plt.yticks([])
-        plt.savefig(
-            cf.IMAGES_DIR + 'x2_heatmap.png',
-            dpi=150,
-            bbox_inches='tight',
-            pad_inches=-0.03
-        )
-        plt.close()
+        params = PLOTS_PARAMS['x2_heatmap.png']
+        with plt.style.context(params['style']):
+            plt.figure(figsize=params['figsize'])
+            plt.xlabel('')
+            plt.ylabel('')
+            nb_pixels = int(params['figsize'][1] * params['dpi'])
+            plt.imshow(aggregate_rows(df.to_numpy(), nb_pixels), aspect='auto',
+                       interpolation='nearest', origin='lower')
+            plt.xticks([])
+            plt.yticks([])
+            plt.savefig(
+                cf.IMAGES_DIR + 'x2_heatmap.png',
+                dpi=params['dpi'],
+                bbox_inches='tight',
+                pad_inches=params['pad_inches']
+            )
+            plt.close()
         return f"Heatmap created    ::   x2_heatmap.png"
     except BaseException as e:
         return f"Heatmap not created, error :: {e}"
@@ -94,13 +157,14 @@ def gen_line_plot(df):
         string: a string containing either a success or failure message.
     """
     try:
-        with plt.style.context('dark_background'):
-            df.plot.line(figsize=(14, 3), cmap='gist_rainbow')
+        params = PLOTS_PARAMS['x2_line.png']
+        with plt.style.context(params['style']):
+            df.plot.line(figsize=params['figsize'], cmap=params['cmap'])
             plt.legend(bbox_to_anchor=(0, 1.02, 1, 0.2), loc="lower left",
                        mode="expand", borderaxespad=0, ncol=7)
             plt.xlabel('')
             plt.ylabel('')
-            plt.savefig(cf.IMAGES_DIR + 'x2_line.png', dpi=150, bbox_inches='tight')
+            plt.savefig(cf.IMAGES_DIR + 'x2_line.png', dpi=params['dpi'], bbox_inches='tight')
             plt.close()
         return f"Line plot created  ::   x2_line.png"
     except BaseException as e:
@@ -118,19 +182,20 @@ def gen_area_plot(df):
         string: a string containing either a success or failure message.
     """
     try:
-        with plt.style.context('dark_background'):
-            df.plot.area(figsize=(14, 3), legend=False, subplots=True)
+        params = PLOTS_PARAMS['x2_area.png']
+        with plt.style.context(params['style']):
+            df.plot.area(figsize=params['figsize'], legend=False, subplots=True)
             plt.figlegend(loc='upper right', labelspacing=1.15, borderaxespad=1.65)
             plt.xlabel('')
             [ax.set_yticks([]) for ax in plt.gcf().axes]
-            plt.savefig(cf.IMAGES_DIR + 'x2_area.png', dpi=150, bbox_inches='tight')
+            plt.savefig(cf.IMAGES_DIR + 'x2_area.png', dpi=params['dpi'], bbox_inches='tight')
             plt.close()
         return f"Area plot created  ::   x2_area.png"
     except BaseException as e:
         return f"Area plot not created, error :: {e}"
 
 
-def gen_pie_plot(df):
+def gen_pie_plot(df, counts=None):
     """Generates pie plots.
 
     Shows the distribution of numbers drawn per ball (e.g. how many times the number 42 was drawn
@@ -139,28 +204,353 @@ def gen_pie_plot(df):
     Args:
         df(dataframe): pandas dataframe containing all the draw results for the lottery
             (dates/balls/stars).
+        counts(numpy array): optional, frequency counts of the numbers per position (see
+            cooccurrence.frequency_counts), computed from the dataframe if not given.
 
     Returns:
         string: a string containing either a success or failure message.
     """
     try:
-        with plt.style.context('dark_background'):
-            fig, axs = plt.subplots(1, 7, figsize=(20, 7))
+        if counts is None:
+            counts = co.frequency_counts(df.to_numpy())
+        params = PLOTS_PARAMS['x2_pie.png']
+        with plt.style.context(params['style']):
+            fig, axs = plt.subplots(1, 7, figsize=params['figsize'])
             for i, column in enumerate(df.columns.values):
-                col_df = df.groupby(column).size()
+                numbers = np.flatnonzero(counts[i])
+                col_df = pd.Series(counts[i][numbers], index=numbers)
                 if i < 5:
-                    col_df.plot.pie(ax=axs[i], fontsize=4.5)
+                    col_df.plot.pie(ax=axs[i], fontsize=params['fontsizes'][0])
                 else:
-                    col_df.plot.pie(ax=axs[i], fontsize=8)
+                    col_df.plot.pie(ax=axs[i], fontsize=params['fontsizes'][1])
                 axs[i].set_ylabel('')
-            plt.savefig(cf.IMAGES_DIR + 'x2_pie.png', dpi=150, bbox_inches='tight')
+            plt.savefig(cf.IMAGES_DIR + 'x2_pie.png', dpi=params['dpi'], bbox_inches='tight')
             plt.close()
         return f"Pie plot created   ::   x2_pie.png"
     except BaseException as e:
         return f"Pie plot not created, error :: {e}"
 
 
-def main():
+def gen_bar_plot(df, counts=None):
+    """Generates bar plots.
+
+    Same distributions as the pie plots (how many times each number was drawn for each ball and
+    star), one row per ball/star, so the numbers can be compared with each other.
+
+    Args:
+        df(dataframe): pandas dataframe containing all the draw results for the lottery
+            (dates/balls/stars).
+        counts(numpy array): optional, frequency counts of the numbers per position (see
+            cooccurrence.frequency_counts), computed from the dataframe if not given.
+
+    Returns:
+        string: a string containing either a success or failure message.
+    """
+    try:
+        if counts is None:
+            counts = co.frequency_counts(df.to_numpy())
+        params = PLOTS_PARAMS['x2_bar.png']
+        colors = plt.get_cmap(params['cmap'])(np.linspace(0, 1, len(df.columns)))
+        with plt.style.context(params['style']):
+            fig, axs = plt.subplots(len(df.columns), 1, figsize=params['figsize'], sharex=True)
+            for i, column in enumerate(df.columns.values):
+                numbers = np.flatnonzero(counts[i])
+                axs[i].bar(numbers, counts[i][numbers], color=colors[i])
+                axs[i].set_ylabel(column, rotation=0, ha='right')
+                axs[i].set_yticks([])
+            plt.savefig(cf.IMAGES_DIR + 'x2_bar.png', dpi=params['dpi'], bbox_inches='tight')
+            plt.close()
+        return f"Bar plot created   ::   x2_bar.png"
+    except BaseException as e:
+        return f"Bar plot not created, error :: {e}"
+
+
+def gen_cooccurrence_plot(df):
+    """Generates heatmaps of the co-occurrences of numbers.
+
+    On the left how many times two balls were drawn together, on the right how many times a ball
+    and a star were drawn together. The co-occurrences are read from the store (and only updated
+    with the new draws, if any).
+
+    Args:
+        df(dataframe): pandas dataframe containing all the draw results for the lottery
+            (dates/balls/stars).
+
+    Returns:
+        string: a string containing either a success or failure message.
+    """
+    try:
+        hp.create_necessary_directories(cf.STORE_PATH)  # First run
+        cooccurrences = co.get_cooccurrences(
+            df[list(cf.TABLE_INFO['fields']['balls'])].to_numpy(dtype='int64'),
+            df[list(cf.TABLE_INFO['fields']['stars'])].to_numpy(dtype='int64'),
+            cf.STORE_PATH + cf.COOCCURRENCES_NAME
+        )
+        pairs = cooccurrences['pairs'].copy()
+        pairs[range(co.NB_BALLS), range(co.NB_BALLS)] = 0  # Singles would dwarf the pairs
+        params = PLOTS_PARAMS['x2_cooccurrences.png']
+        with plt.style.context(params['style']):
+            fig, axs = plt.subplots(1, 2, figsize=params['figsize'],
+                                    gridspec_kw={'width_ratios': [co.NB_BALLS, co.NB_STARS]})
+            extent = [0.5, co.NB_BALLS + 0.5, co.NB_BALLS + 0.5, 0.5]
+            axs[0].imshow(pairs, cmap=params['cmap'], extent=extent)
+            axs[0].set_title('balls x balls')
+            extent = [0.5, co.NB_STARS + 0.5, co.NB_BALLS + 0.5, 0.5]
+            axs[1].imshow(cooccurrences['ball_star'], cmap=params['cmap'], extent=extent,
+                          aspect='auto')
+            axs[1].set_title('balls x stars')
+            plt.savefig(cf.IMAGES_DIR + 'x2_cooccurrences.png', dpi=params['dpi'],
+                        bbox_inches='tight')
+            plt.close()
+        return f"Co-occurrences created :: x2_cooccurrences.png"
+    except BaseException as e:
+        return f"Co-occurrences not created, error :: {e}"
+
+
+def share_dataframe(df, path):
+    """Writes the draws dataframe to a numpy file, to be memory mapped by the plotting processes.
+
+    The dates (as nanoseconds) are stored in the first column, the numbers in the next ones.
+
+    Args:
+        df(dataframe): draws indexed by draw date.
+        path(str): path to the numpy file.
+    """
+    data = np.empty((len(df), len(df.columns) + 1), dtype=np.int64)
+    data[:, 0] = df.index.values.astype('datetime64[ns]').astype(np.int64)
+    data[:, 1:] = df.to_numpy(dtype=np.int64)
+    np.save(path, data)
+
+
+def load_shared_dataframe(path, columns):
+    """Rebuilds the draws dataframe from a memory mapped numpy file (see share_dataframe).
+
+    Args:
+        path(str): path to the numpy file.
+        columns(list): names of the numbers columns.
+
+    Returns:
+        dataframe: draws indexed by draw date.
+    """
+    data = np.load(path, mmap_mode='r')
+    index = pd.DatetimeIndex(data[:, 0].astype('datetime64[ns]'), name='draw_date')
+    return pd.DataFrame(data[:, 1:], index=index, columns=columns)
+
+
+def hash_dataframe(df):
+    """Returns the hash of the draws dataframe (index included)."""
+    return hashlib.sha256(pd.util.hash_pandas_object(df, index=True).values.tobytes()).hexdigest()
+
+
+def image_signature(image, data_hash):
+    """Describes what an image is rendered from.
+
+    Args:
+        image(str): name of the image file.
+        data_hash(str): hash of the draws dataframe.
+
+    Returns:
+        dict: {'data_hash', 'params', 'matplotlib'}, json compatible.
+    """
+    signature = {
+        'data_hash': data_hash,
+        'params': PLOTS_PARAMS[image],
+        'matplotlib': matplotlib.__version__
+    }
+    return json.loads(json.dumps(signature))  # Tuples become lists, as they do in the manifest
+
+
+def load_manifest(path):
+    """Reads the images manifest, empty if there is none yet.
+
+    Returns:
+        dict: {'image name': signature}.
+    """
+    try:
+        with open(path, 'r') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(manifest, path):
+    """Writes the images manifest."""
+    with open(path, 'w') as file:
+        json.dump(manifest, file, indent=4, sort_keys=True)
+
+
+def is_up_to_date(manifest, image, signature):
+    """Tells if an image exists and was rendered from the same data, parameters and style."""
+    return manifest.get(image) == signature and os.path.isfile(cf.IMAGES_DIR + image)
+
+
+def tile_periods(dates, level):
+    """Returns the periods of a zoom level which contain at least one draw.
+
+    Args:
+        dates(numpy array): draw dates, as nanoseconds (int64).
+        level(str): zoom level, one of TILES_LEVELS.
+
+    Returns:
+        list: list of tuples (name, start, end), e.g. ('2004-02', start, end) for a month, bounds
+            as nanoseconds, end excluded.
+    """
+    unit, step = TILES_LEVELS[level]
+    units = np.asarray(dates).astype('datetime64[ns]').astype(f'datetime64[{unit}]')
+    units = np.unique(units.astype(np.int64) // step * step)
+    starts = units.astype(f'datetime64[{unit}]')
+    ends = (units + step).astype(f'datetime64[{unit}]')
+    return [(str(start), int(start.astype('datetime64[ns]').astype(np.int64)),
+             int(end.astype('datetime64[ns]').astype(np.int64)))
+            for start, end in zip(starts, ends)]
+
+
+def aggregate_period(dates, values, start, end, nb_bins):
+    """Averages the draws of a period in nb_bins bins of equal durations.
+
+    Unlike aggregate_rows, the bins are time based: a tile always covers its whole period, even
+    when it has only a few draws (e.g. the current month).
+
+    Args:
+        dates(numpy array): draw dates, as nanoseconds (int64), between start and end.
+        values(numpy array): numbers drawn, shape (N, k).
+        start(int): start of the period, as nanoseconds.
+        end(int): end of the period (excluded), as nanoseconds.
+        nb_bins(int): number of bins.
+
+    Returns:
+        numpy array: mean of the numbers in each bin, shape (nb_bins, k), NaN for empty bins.
+    """
+    nb_columns = values.shape[1]
+    bins = (np.asarray(dates, dtype=np.int64) - start) * nb_bins // (end - start)
+    bins = np.clip(bins, 0, nb_bins - 1)
+    sizes = np.bincount(bins, minlength=nb_bins)
+    flat = bins[:, None] * nb_columns + np.arange(nb_columns)
+    sums = np.bincount(flat.ravel(), weights=np.asarray(values, dtype=np.float64).ravel(),
+                       minlength=nb_bins * nb_columns).reshape(nb_bins, nb_columns)
+    means = np.full(sums.shape, np.nan)
+    np.divide(sums, sizes[:, None], out=means, where=sizes[:, None] > 0)
+    return means
+
+
+def tile_signature(kind, data):
+    """Describes what a tile is rendered from.
+
+    Args:
+        kind(str): kind of tile, one of TILES_PARAMS.
+        data(numpy array): rows of the shared draws file (dates and numbers) covered by the tile.
+
+    Returns:
+        dict: {'data_hash', 'params', 'matplotlib'}, json compatible.
+    """
+    signature = {
+        'data_hash': hashlib.sha256(np.ascontiguousarray(data).tobytes()).hexdigest(),
+        'params': TILES_PARAMS[kind],
+        'matplotlib': matplotlib.__version__
+    }
+    return json.loads(json.dumps(signature))
+
+
+def render_tile(args):
+    """Renders a tile of the pyramid in a worker process.
+
+    The tile has no axes nor margins, it is exactly figsize * dpi pixels wide and high, one
+    horizontal pixel per bin.
+
+    Args:
+        args(tuple): (kind of tile, start, end, path to the shared numpy file, tile name).
+
+    Returns:
+        string: a string containing either a success or failure message.
+    """
+    kind, start, end, path, tile = args
+    try:
+        params = TILES_PARAMS[kind]
+        data = np.load(path, mmap_mode='r')
+        first, last = np.searchsorted(data[:, 0], [start, end])
+        nb_bins = int(params['figsize'][0] * params['dpi'])
+        values = aggregate_period(data[first:last, 0], data[first:last, 1:], start, end, nb_bins)
+        # Empty bins are skipped: lines join the draws on each side of them
+        x = np.flatnonzero(~np.isnan(values[:, 0]))
+        values = values[x]
+        colors = plt.get_cmap(params['cmap'])(np.linspace(0, 1, values.shape[1]))
+        with plt.style.context(params['style']):
+            fig = plt.figure(figsize=params['figsize'])
+            ax = fig.add_axes([0, 0, 1, 1])
+            ax.set_axis_off()
+            ax.set_xlim(0, nb_bins - 1)
+            if kind == 'line':
+                for j in range(values.shape[1]):
+                    ax.plot(x, values[:, j], color=colors[j], linewidth=params['linewidth'])
+                ax.set_ylim(0, TILES_SCALES.max() + 1)
+            else:
+                # One band per column, as in the area plot subplots
+                for j in range(values.shape[1]):
+                    ax.fill_between(x, j, j + values[:, j] / TILES_SCALES[j], color=colors[j])
+                ax.set_ylim(0, values.shape[1])
+            plt.savefig(cf.IMAGES_DIR + tile, dpi=params['dpi'])
+            plt.close(fig)
+        return f"Tile created       ::   {tile}"
+    except BaseException as e:
+        return f"Tile not created, error :: {tile} :: {e}"
+
+
+def update_tiles(path, force=False):
+    """Renders the tiles of the pyramid which are missing or out of date, in parallel.
+
+    Args:
+        path(str): path to the shared numpy file (see share_dataframe).
+        force(bool): render all the tiles, even the up to date ones.
+    """
+    data = np.load(path, mmap_mode='r')
+    manifest_path = cf.IMAGES_DIR + TILES_DIR + 'manifest.json'
+    manifest = {} if force else load_manifest(manifest_path)
+
+    tasks, signatures = [], {}
+    for kind in TILES_PARAMS:
+        for level in TILES_LEVELS:
+            hp.create_necessary_directories(cf.IMAGES_DIR + TILES_DIR + f"{kind}/{level}/")
+            for name, start, end in tile_periods(data[:, 0], level):
+                tile = TILES_DIR + f"{kind}/{level}/{name}.png"
+                first, last = np.searchsorted(data[:, 0], [start, end])
+                signatures[tile] = tile_signature(kind, data[first:last])
+                if not is_up_to_date(manifest, tile, signatures[tile]):
+                    tasks.append((kind, start, end, path, tile))
+    print(f"Tiles up to date   ::   {len(signatures) - len(tasks)}")
+
+    if tasks:
+        nb_created = 0
+        with multiprocessing.Pool(initializer=init_worker) as pool:
+            for task, msg in zip(tasks, tqdm(pool.imap(render_tile, tasks, chunksize=4),
+                                             total=len(tasks), ncols=80)):
+                if 'not created' in msg:
+                    tqdm.write(msg)
+                else:
+                    manifest[task[4]] = signatures[task[4]]
+                    nb_created += 1
+        save_manifest(manifest, manifest_path)
+        print(f"Tiles created      ::   {nb_created}")
+
+
+def init_worker():
+    """Plotting processes don't need a display."""
+    plt.switch_backend('Agg')
+
+
+def render_plot(args):
+    """Renders a plot in a worker process.
+
+    Args:
+        args(tuple): (plot function, path to the shared numpy file, names of the columns).
+
+    Returns:
+        string: the message returned by the plot function.
+    """
+    fn, path, columns = args
+    return fn(load_shared_dataframe(path, columns))
+
+
+def main(force=False, tiles=False):
     """"""
     print(f"{Figlet(font='slant').renderText('X2 Plots')}")
 
@@ -169,11 +559,51 @@ def main():
     df = load_plots_dataframe(cf.DB_PATH, cf.DB_NAME)
     df.set_index('draw_date', inplace=True, drop=True)
 
-    functions = [gen_heatmap, gen_line_plot, gen_area_plot, gen_pie_plot]
-
-    for fn in tqdm(functions, ncols=80):
-        msg = fn(df)
-        tqdm.write(msg)
+    # Frequency counts are kept up to date in the store (only new draws are counted), and are
+    # small enough to be handed to the plotting processes as is
+    hp.create_necessary_directories(cf.STORE_PATH)  # First run
+    counts = co.get_cooccurrences(
+        df[list(cf.TABLE_INFO['fields']['balls'])].to_numpy(dtype='int64'),
+        df[list(cf.TABLE_INFO['fields']['stars'])].to_numpy(dtype='int64'),
+        cf.STORE_PATH + cf.COOCCURRENCES_NAME
+    )['frequencies']
+
+    plots = {'x2_heatmap.png': gen_heatmap,
+             'x2_line.png': gen_line_plot,
+             'x2_area.png': gen_area_plot,
+             'x2_pie.png': functools.partial(gen_pie_plot, counts=counts),
+             'x2_bar.png': functools.partial(gen_bar_plot, counts=counts),
+             'x2_cooccurrences.png': gen_cooccurrence_plot}
+
+    # Only the images whose data, parameters or style changed are rendered again
+    manifest_path = cf.IMAGES_DIR + 'x2_manifest.json'
+    manifest = {} if force else load_manifest(manifest_path)
+    data_hash = hash_dataframe(df)
+    signatures = {image: image_signature(image, data_hash) for image in plots}
+    images = [image for image in plots if not is_up_to_date(manifest, image, signatures[image])]
+    for image in plots:
+        if image not in images:
+            print(f"Up to date         ::   {image}")
+
+    path = cf.FILES_DIR + 'x2_plots_data.npy'
+    if images or tiles:
+        hp.create_necessary_directories(cf.FILES_DIR)  # First run
+        share_dataframe(df, path)
+
+    if images:
+        tasks = [(plots[image], path, list(df.columns)) for image in images]
+
+        # One process per plot, total time is about the time of the slowest plot
+        with multiprocessing.Pool(len(tasks), initializer=init_worker) as pool:
+            for image, msg in zip(images, tqdm(pool.imap(render_plot, tasks), total=len(tasks),
+                                               ncols=80)):
+                tqdm.write(msg)
+                if 'not created' not in msg:
+                    manifest[image] = signatures[image]
+        save_manifest(manifest, manifest_path)
+
+    if tiles:
+        update_tiles(path, force)
 
     print(f"\nAll images were saved to this folder:\n{cf.IMAGES_DIR}\n")
 
@@ -2,8 +2,18 @@
 # -*- coding: utf-8 -*-
 """Query the On-line Encyclopedia of Integer Sequences.
 
-For now we query with the 10 latest draws numbers (5 balls + 7 stars). But many combinations can be
-tried:longer sequences, sequences randomly picked, etc.
+With a local index of the OEIS sequences (see oeis_index), every draw of the history (5 balls + 2
+stars) is looked for in every sequence, in a fraction of a second. The index is built once from the
+OEIS dump of all the sequences, with the --build-index option.
+
+Without an index (or with the --online option), we query the website with the 10 latest draws
+numbers. But many combinations can be tried: longer sequences, sequences randomly picked, etc. The
+queries are sent concurrently, but rate limited, and their responses are cached in the store (see
+oeis_client): a draw already checked is not queried again.
+
+The batch mode (--batch) is the exhaustive version, against the local index: every window of k
+consecutive numbers, for a range of k, over the balls of the whole history put end to end and
+within each draw. Identical windows are only searched once, in parallel, and the hits are ranked.
 
 Should be run from the CLI (depending on how you installed it), e.g.::
 
@@ -15,14 +25,19 @@ But can also be run as a script::
 """
 import itertools
 import json
+import multiprocessing
 import sys
+import time
 
+import numpy as np
 from pyfiglet import Figlet
 import requests
 from requests.exceptions import RequestException
 
 import helpers as hp
 import config as cf
+import oeis_client as oc
+import oeis_index as oi
 
 
 def get_latest_draws(db_path, db_name, nb_draws):
@@ -31,17 +46,19 @@ def get_latest_draws(db_path, db_name, nb_draws):
     Args:
         db_path(str): path to the directory where the DB is stored.
         db_name(str): name of the DB.
+        nb_draws(int): number of draws, all the draws if None.
 
     Returns:
         list: list of tuples of ints [(15, 31, 40, 44, 48, 1, 12), (16, 1, 2, 7, 48, 1, 12), etc.].
     """
     list_draws = []
     dict_nbs = hp.get_numbers_as_sequences(db_path, db_name)
+    first = -nb_draws if nb_draws else 0
     for k, v in dict_nbs.items():
         if k.startswith('ball'):
-            selected_balls_numbers = v[-nb_draws:]
+            selected_balls_numbers = v[first:]
         else:
-            selected_stars_numbers = v[-nb_draws:]
+            selected_stars_numbers = v[first:]
     for ((a, b)) in zip(selected_balls_numbers, selected_stars_numbers):
         list_draws.append(tuple(itertools.chain(a, b)))
     return list_draws
@@ -67,37 +84,234 @@ def balls_by_draws(draws):
     return urls
 
 
-def check_sequences_oeis(urls, seconds):
+def check_sequences_oeis(urls, seconds, con=None):
     """Check if given sequences returns something from the OEIS.
 
+    The queries are sent concurrently, but as we're trying NOT to hammer OEIS' server, no more than
+    one every `seconds` on average.
+
     Args:
         urls(list): list of prepared urls to try.
-        seconds(float): number of seconds to wait between requests.
+        seconds(float): average number of seconds between requests, no limit if 0.
+        con(sqlite3 connection): connection to the store DB, to cache the responses (optional).
     """
+    responses, nb_cached = oc.get_responses(
+        urls, con, ttl=cf.OEIS_CACHE_TTL, rate=1 / seconds if seconds else None,
+        capacity=cf.OEIS_BURST, max_in_flight=cf.OEIS_MAX_IN_FLIGHT, timeout=10)
+    if con is not None:
+        print(f"Responses from cache    : {nb_cached}/{len(urls)}")
+    for url in urls:
+        if isinstance(responses[url], BaseException):
+            print(f"Error querying OEIS' API :: {responses[url]}")
+            sys.exit(1)
+        json_data = json.loads(responses[url])
+
+        if json_data['results'] is None:
+            print(f"No luck for query       : {url}")
+        else:
+            print(f"Results found for query : {url}")
+
+
+def download_dump(url, path):
+    """Downloads the OEIS dump of all the sequences.
+
+    Args:
+        url(str): url of the dump.
+        path(str): path of the downloaded file.
+    """
+    print(f"Downloading the OEIS sequences :: {url}")
     try:
-        for url in urls:
-            response = requests.get(url, timeout=seconds)
-            json_data = json.loads(response.text)
-            # As we're trying NOT to hammer OEIS' server, we display a spinning cursor so the user
-            # has something to look at between API queries :-)
-            hp.spinning_cursor(seconds)
-
-            if json_data['results'] is None:
-                print(f"No luck for query       : {url}")
-            else:
-                print(f"Results found for query : {url}")
+        response = requests.get(url, timeout=30, stream=True)
+        response.raise_for_status()
+        with open(path, 'wb') as file:
+            for chunk in response.iter_content(chunk_size=1 << 20):
+                file.write(chunk)
     except RequestException as e:
-        print(f"Error querying OEIS' API :: {e}")
+        print(f"Error downloading the OEIS sequences :: {e}")
         sys.exit(1)
 
 
-def main():
+def check_sequences_index(index, draws):
+    """Checks if the given draws appear in a sequence of the local OEIS index.
+
+    Args:
+        index(dict): index loaded by oeis_index.load_index.
+        draws(list): list of tuples of ints, see get_latest_draws.
+
+    Returns:
+        list: list of tuples (draw, list of A-numbers), for the draws found in a sequence.
+    """
+    start = time.perf_counter()
+    found = []
+    for draw in draws:
+        anumbers = oi.find_sequences(index, draw)
+        if anumbers:
+            found.append((draw, anumbers))
+            print(f"Results found for draw  : {','.join(map(str, draw))} :: "
+                  f"{', '.join(oi.format_anumber(a) for a in anumbers)}")
+    elapsed = time.perf_counter() - start
+    print(f"Draws checked           : {len(draws)} in {elapsed * 1000:.0f} ms, "
+          f"{len(found)} found in a sequence")
+    return found
+
+
+def sliding_windows(numbers, k):
+    """Returns every window of k consecutive numbers.
+
+    Args:
+        numbers(numpy array): the numbers, shape (N,) for a single sequence, or (M, N) for M
+            sequences (windows don't span two sequences).
+        k(int): length of the windows.
+
+    Returns:
+        numpy array: the windows, shape (nb windows, k).
+    """
+    numbers = np.ascontiguousarray(np.atleast_2d(numbers), dtype=np.int64)
+    nb_rows, length = numbers.shape
+    if length < k:
+        return np.empty((0, k), dtype=np.int64)
+    windows = np.lib.stride_tricks.as_strided(
+        numbers, shape=(nb_rows, length - k + 1, k),
+        strides=(numbers.strides[0], numbers.strides[1], numbers.strides[1]))
+    return windows.reshape(-1, k)
+
+
+def collect_windows(balls, stars, lengths):
+    """Collects the distinct windows of the history, with the number of times they occur.
+
+    Two sources of windows: the balls of all the draws put end to end ('balls'), and the 7
+    numbers of each draw ('draws'). Identical windows are kept once.
+
+    Args:
+        balls(numpy array): balls drawn, shape (N, 5).
+        stars(numpy array): stars drawn, shape (N, 2).
+        lengths(range): lengths (k) of the windows.
+
+    Returns:
+        list: list of dicts {'k', 'window' (tuple), 'balls', 'draws'} (occurrences per source).
+    """
+    draws = np.hstack((balls, stars))
+    windows = []
+    for k in lengths:
+        sources = [sliding_windows(balls.ravel(), k), sliding_windows(draws, k)]
+        all_windows = np.concatenate(sources)
+        # Compared number by number: a hash of the windows could merge two different ones
+        _, first, inverse = np.unique(all_windows, axis=0, return_index=True,
+                                      return_inverse=True)
+        inverse = inverse.ravel()
+        nb_balls = np.bincount(inverse[:len(sources[0])], minlength=first.size)
+        nb_draws = np.bincount(inverse[len(sources[0]):], minlength=first.size)
+        windows.extend({'k': k, 'window': tuple(int(n) for n in all_windows[i]),
+                        'balls': int(b), 'draws': int(d)}
+                       for i, b, d in zip(first, nb_balls, nb_draws))
+    return windows
+
+
+def match_windows(args):
+    """Searches windows in the local OEIS index, in a worker process.
+
+    Args:
+        args(tuple): (path to the index, list of windows), as a tuple so it can be mapped on a
+            pool of processes.
+
+    Returns:
+        list: A-numbers of the sequences containing each window.
+    """
+    index_path, windows = args
+    index = oi.load_index(index_path)  # Memory mapped, cheap
+    return [oi.find_sequences(index, window) for window in windows]
+
+
+def rank_hits(hits):
+    """Ranks the windows found in sequences, the least likely to be found first.
+
+    Longer windows first, then the windows found in fewer sequences, then the most frequent in the
+    history.
+
+    Args:
+        hits(list): windows (see collect_windows) with their 'anumbers'.
+
+    Returns:
+        list: the hits, ranked.
+    """
+    return sorted(hits, key=lambda h: (-h['k'], len(h['anumbers']), -(h['balls'] + h['draws']),
+                                       h['window']))
+
+
+def check_windows_index(index_path, balls, stars, lengths, processes=None, chunk_size=2000):
+    """Searches every window of the history in the local OEIS index, in parallel.
+
+    Args:
+        index_path(str): path to the folder of the index.
+        balls(numpy array): balls drawn, shape (N, 5).
+        stars(numpy array): stars drawn, shape (N, 2).
+        lengths(range): lengths (k) of the windows, at least oeis_index.NGRAM.
+        processes(int): number of processes, defaults to the number of CPUs.
+        chunk_size(int): number of windows searched by a process at once.
+
+    Returns:
+        tuple: (ranked hits (see rank_hits), number of distinct windows searched).
+    """
+    windows = collect_windows(balls, stars, lengths)
+    tasks = [(index_path, [w['window'] for w in windows[i:i + chunk_size]])
+             for i in range(0, len(windows), chunk_size)]
+    with multiprocessing.Pool(processes) as pool:
+        anumbers = list(itertools.chain.from_iterable(pool.imap(match_windows, tasks)))
+    return rank_hits([dict(w, anumbers=a) for w, a in zip(windows, anumbers) if a]), len(windows)
+
+
+def print_hits(hits, nb_windows, nb_rows=30):
+    """Prints the ranked hits as a table."""
+    print(f"{'Rank':>4}  {'k':>2}  {'Window':<32}{'Balls':>6}{'Draws':>6}{'Seqs':>6}  A-numbers")
+    print('-' * 100)
+    for rank, hit in enumerate(hits[:nb_rows], 1):
+        anumbers = ', '.join(oi.format_anumber(a) for a in hit['anumbers'][:3])
+        if len(hit['anumbers']) > 3:
+            anumbers += ', ...'
+        print(f"{rank:>4}  {hit['k']:>2}  {','.join(map(str, hit['window'])):<32}"
+              f"{hit['balls']:>6}{hit['draws']:>6}{len(hit['anumbers']):>6}  {anumbers}")
+    print('-' * 100)
+    print(f"Windows found in a sequence :: {len(hits)}/{nb_windows}")
+
+
+def main(build_index=False, dump=None, online=False, batch=False, lengths=(3, 7)):
     """"""
     print(f"{Figlet(font='slant').renderText('X3 O.E.I.S')}")
 
-    draws = get_latest_draws(cf.DB_PATH, cf.DB_NAME, 10)
-    urls = balls_by_draws(draws)
-    check_sequences_oeis(urls, 2)
+    index_path = cf.STORE_PATH + cf.OEIS_INDEX_NAME
+    if build_index or dump:
+        if dump is None:
+            hp.create_necessary_directories(cf.STORE_PATH)  # First run
+            dump = cf.STORE_PATH + 'stripped.gz'
+            download_dump(cf.OEIS_STRIPPED_URL, dump)
+        nb_sequences = oi.build_index(dump, index_path)
+        print(f"OEIS index built        : {nb_sequences} sequences\n")
+
+    if batch:
+        if oi.load_index(index_path) is None:
+            print("No local OEIS index, build one first with the --build-index option")
+            sys.exit(1)
+        start = time.perf_counter()
+        arrays = hp.get_numbers_as_arrays(cf.DB_PATH, cf.DB_NAME)
+        lengths = range(max(lengths[0], oi.NGRAM), lengths[1] + 1)
+        hits, nb_windows = check_windows_index(index_path, arrays['balls'], arrays['stars'],
+                                               lengths)
+        print_hits(hits, nb_windows)
+        print(f"Batch done in               :: {time.perf_counter() - start:.1f} s")
+        return
+
+    index = None if online else oi.load_index(index_path)
+    if index is None:
+        if not online:
+            print("No local OEIS index (see the --build-index option), querying the website\n")
+        draws = get_latest_draws(cf.DB_PATH, cf.DB_NAME, 10)
+        urls = balls_by_draws(draws)
+        con = oc.connect_cache(cf.STORE_PATH, cf.STORE_NAME)
+        check_sequences_oeis(urls, 2, con)
+        con.close()
+    else:
+        draws = get_latest_draws(cf.DB_PATH, cf.DB_NAME, None)
+        check_sequences_index(index, draws)
 
 
 if __name__ == '__main__':
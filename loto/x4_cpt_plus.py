@@ -5,6 +5,10 @@
 So many combinations are possible here. I made choices to limit the scope (what to put in and in
 what form/shape/order).
 
+Predictions are made by the python implementation of CPT+ (cpt_plus module) by default, or by the
+SPMF java library (started in a JVM) with the `--engine spmf` option. Both are trained with the
+same options (cpt_plus.DEFAULT_OPTIONS).
+
 Should be run from the CLI (depending on how you installed it), e.g.::
 
     $ python loto/core.py x4
@@ -12,25 +16,71 @@ Should be run from the CLI (depending on how you installed it), e.g.::
 But can also be run as a script::
 
     $ python loto/x4_cpt_plus.py
+
+With `--backtest K`, each of the last K draws is predicted instead, walking forward through the
+history (see run_backtest).
+
+With `--compare`, several SPMF predictors (CPT+, CPT, DG, AKOM, TDAG, LZ78) are trained and
+compared side by side instead, in a single JVM (see compare_predictors).
+
+With `--sweep`, configurations of the CPT+ options are scored by backtests instead, and the best
+ones (accuracy against training time) are printed (see run_sweep).
+
+With `--serve`, x4 runs as a server instead: the models (and the JVM with SPMF) stay in memory and
+predictions are asked for over a Unix socket (see PredictionService).
 """
-import tempfile
+import concurrent.futures
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import socket
+import socketserver
+import sqlite3
+import sys
+import time
 
 import colorama
 import jpype
+import numpy as np
 from pyfiglet import Figlet
 from tqdm import tqdm
 
 import helpers as hp
 import config as cf
+import cooccurrence as co
+import cpt_plus as cp
+
+
+# Values of the CPT+ options tried by --sweep (the others keep their default value)
+SWEEP_GRID = {
+    'CCFmin': ['1', '2'],
+    'CCFmax': ['3', '5', '7'],
+    'CCFsup': ['2', '5'],
+    'splitMethod': ['0', '1'],
+    'splitLength': ['3', '5'],
+    'minPredictionRatio': ['0.5', '1.0', '2.0'],
+    'noiseRatio': ['0.5', '1.0']
+}
+
+# SPMF sequence predictors compared by --compare: class (in the ipredict.predictor package) and
+# options (as in the SPMF examples), None for the predictors without options
+SPMF_PREDICTORS = {
+    'CPT+': ('CPT.CPTPlus.CPTPlusPredictor', cp.DEFAULT_OPTIONS),
+    'CPT': ('CPT.CPT.CPTPredictor',
+            'splitLength:6 splitMethod:0 recursiveDividerMin:1 recursiveDividerMax:5'),
+    'DG': ('DG.DGPredictor', 'lookahead:4'),
+    'AKOM': ('AKOM.AKOMPredictor', 'order:4'),
+    'TDAG': ('TDAG.TDAGPredictor', None),
+    'LZ78': ('LZ78.LZ78Predictor', None)
+}
 
 
 def build_cptp_data(db_path, db_name):
-    """Builds training sets files for the SPMF library.
+    """Builds the training sequences for the SPMF library.
 
-    Training sets files created using the DB. A training set file in the format expected by the
-    java SPMF library: ' -1 ' between each number within a sequence and ' -2' to end a sequence
-    (see `SPMF/CPT+ docs <http://www.philippe-fournier-viger.com/spmf/CPTPlus.php>`_). The files
-    are stored in the data/files folder.
+    One sequence per draw, either the 5 ball numbers or the 2 star numbers (in the order drawn).
 
     We keep the numbers from the two last lotteries out of the training sets, instead we return
     them as lists to build the prediction set (balls_draw_m2) and the verification set
@@ -42,80 +92,95 @@ def build_cptp_data(db_path, db_name):
 
     Returns:
         dict: dictionary of lists {
-            'paths'           : [strings],
+            'sequences'       : {'balls': [tuples of ints], 'stars': [tuples of ints]},
             'balls_draw_m1'   : [ints],
             'balls_draw_m2'   : [ints],
             'stars_draw_m1'   : [ints],
             'stars_draw_m2'   : [ints]}
     """
-    dict_nbs = {}
+    dict_nbs = {'sequences': {}}
     # Numbers as sequence: every sequence is a row in the database. Either a row of 5 ball numbers
-    # (1 file) or a row of 2 star numbers (another file).
+    # or a row of 2 star numbers.
     numbers_as_sequences = hp.get_numbers_as_sequences(db_path, db_name)
     for k, v in numbers_as_sequences.items():               # Inside the dict
-        # Copy last and before-last numbers then delete them from list
-        dict_nbs[k + '_draw_m1'] = v[-1:]
-        del v[-1]
-        dict_nbs[k + '_draw_m2'] = v[-1:]
-        del v[-1]
-        file_path = cf.FILES_DIR + 'x4_data_set_seq_' + k + '.txt'
-        with open(file_path, 'w') as file:
-            for iv in v:                                    # Inside the lists
-                for iiv in iv:                              # Inside the tuples
-                    file.write(str(iiv) + ' -1 ')
-                file.write('-2\n')
-        if 'paths' not in dict_nbs:
-            dict_nbs['paths'] = {k: file_path}
-        else:
-            dict_nbs['paths'].update({k: file_path})
-
-    # While sorting we remove one onion layer (the now redundant tuple layer returned by db)
-    dict_nbs['balls_draw_m2'] = sorted(dict_nbs['balls_draw_m2'][0])
-    dict_nbs['stars_draw_m2'] = sorted(dict_nbs['stars_draw_m2'][0])
-    dict_nbs['balls_draw_m1'] = sorted(dict_nbs['balls_draw_m1'][0])
-    dict_nbs['stars_draw_m1'] = sorted(dict_nbs['stars_draw_m1'][0])
+        # Copy last and before-last numbers then keep them out of the training sequences
+        dict_nbs[k + '_draw_m1'] = sorted(v[-1])
+        dict_nbs[k + '_draw_m2'] = sorted(v[-2])
+        dict_nbs['sequences'][k] = v[:-2]
     return dict_nbs
 
 
-def load_training_set(pkg, path, numbers=[]):
-    """Loads the training set file of training sequences.
+def make_sequence(pkg, sequence_id, items):
+    """Creates a java sequence from java items.
+
+    Args:
+        pkg(jpype object): common root of the java package from which we load the classes we need.
+        sequence_id(int): id of the sequence.
+        items(jpype object): java list of items (copied).
+
+    Returns:
+        jpype object: sequence of numbers in their java format.
+    """
+    array_list_class = jpype.JClass('java.util.ArrayList')
+    return pkg.database.Sequence(jpype.JInt(sequence_id), array_list_class(items))
+
+
+def build_training_set(pkg, sequences):
+    """Builds a training set (SPMF SequenceDatabase) from sequences of numbers, in memory.
 
-    Either simply load a training set file (in the tree) as is, or load a training set file
-    appended with an additional sequence.
+    Crossing from python to java is what costs the most here, so it is done as little as possible:
+    a single java item per distinct number (items are compared by value), all the items of all the
+    sequences passed to java at once as an array, then a couple of calls per sequence (not per
+    number). Nothing is written to disk.
 
     Args:
         pkg(jpype object): common root of the java package from which we load the classes we need.
-        path(str): filepath to the training file to load.
-        numbers(list): optional, number sequence(s) to append to training file.
+        sequences(list): list of tuples of ints, one per training sequence.
 
     Returns:
         jpype object: training set object.
     """
-    # Loading the java classes we need and instantiating the objects we will use
-    # Training Set: this is the file we feed to the tree
-    training_set_class = pkg.database.SequenceDatabase
-    training_set = training_set_class()
-
-    if numbers:
-        with tempfile.NamedTemporaryFile(mode='w+') as tmpf:
-            with open(path, 'r') as file:
-                tmpf.write(file.read())
-                new_line = ' -1 '.join(map(str, numbers)) + ' -1 -2\n'  # SPMF format
-                tmpf.write(new_line)
-                tmpf.seek(0)
-                training_set.loadFileSPMFFormat(
-                    jpype.JString(tmpf.name),
-                    jpype.JInt(99999), jpype.JInt(0), jpype.JInt(99999)
-                )
-    else:
-        training_set.loadFileSPMFFormat(
-            jpype.JString(path),
-            jpype.JInt(99999), jpype.JInt(0), jpype.JInt(99999)
-        )
+    item_class = pkg.database.Item
+    sequence_class = pkg.database.Sequence
+    integer_class = jpype.JClass('java.lang.Integer')
+    array_list_class = jpype.JClass('java.util.ArrayList')
+    arrays_class = jpype.JClass('java.util.Arrays')
 
+    items = {n: item_class(integer_class(jpype.JInt(n)))
+             for n in set(n for sequence in sequences for n in sequence)}
+    all_items = arrays_class.asList(
+        jpype.JArray(item_class)([items[n] for sequence in sequences for n in sequence]))
+
+    java_sequences = []
+    start = 0
+    for sequence_id, sequence in enumerate(sequences):
+        end = start + len(sequence)
+        java_sequences.append(make_sequence(pkg, sequence_id, all_items.subList(start, end)))
+        start = end
+
+    training_set = pkg.database.SequenceDatabase()
+    training_set.setSequences(
+        array_list_class(arrays_class.asList(jpype.JArray(sequence_class)(java_sequences))))
     return training_set
 
 
+def append_sequence(pkg, training_set, numbers):
+    """Appends a sequence of numbers to a training set, in memory.
+
+    Args:
+        pkg(jpype object): common root of the java package from which we load the classes we need.
+        training_set(jpype object): training set object.
+        numbers(list): the sequence of numbers to append.
+    """
+    item_class = pkg.database.Item
+    integer_class = jpype.JClass('java.lang.Integer')
+    arrays_class = jpype.JClass('java.util.Arrays')
+    items = [item_class(integer_class(jpype.JInt(n))) for n in numbers]
+    sequences = training_set.getSequences()
+    sequences.add(make_sequence(pkg, sequences.size(),
+                                arrays_class.asList(jpype.JArray(item_class)(items))))
+
+
 def prepare_prediction_request(pkg, numbers):
     """Turns a python list into a java sequence, in order to query for a prediction.
 
@@ -190,6 +255,192 @@ def make_predictions(pkg, prediction_model, previous_numbers):
     return list(numbers_set)
 
 
+def make_predictions_batch(prediction_model, queries, verbose=True):
+    """Predicts the numbers following each of several sequences, with the python CPT+ (top-k).
+
+    Unlike make_predictions, no loop: a single top-k call per query returns as many numbers as
+    there are in the query (k), ranked and scored. The queries share the training sequences
+    already read from the tree. The numbers may differ from the ones of make_predictions_python,
+    which are the ones SPMF would predict.
+
+    Args:
+        prediction_model(cpt_plus.CPTPlus): CPT+ object trained, used here to make predictions.
+        queries(list): number sequences for which we want a prediction.
+        verbose(bool): tell the user when there are not enough predictions.
+
+    Returns:
+        list: for every query, a list of tuples (number, score), best first. When CPT+ has not
+        enough predictions, the list is padded with (0, 0.0).
+    """
+    predictions = prediction_model.predict_batch(queries, k=max(map(len, queries), default=0))
+    for query, prediction in zip(queries, predictions):
+        del prediction[len(query):]
+        nbtype = 'balls' if len(query) > 2 else 'stars'
+        for i in range(len(prediction) + 1, len(query) + 1):
+            if verbose:
+                tqdm.write(colorama.Fore.RED + f"CPT+ has no more prediction for this branch, "
+                           f"prediction set to zero for {nbtype}_{str(i)}"
+                           + colorama.Style.RESET_ALL)
+            prediction.append((0, 0.0))
+    return predictions
+
+
+def make_predictions_python(prediction_model, previous_numbers, verbose=True):
+    """Iterates over predictions until we get enough of them, with the python CPT+.
+
+    Same as make_predictions: every prediction is added to the query before asking for the next.
+    For the ranked and scored numbers of a single prediction, see make_predictions_batch.
+
+    Args:
+        prediction_model(cpt_plus.CPTPlus): CPT+ object trained, used here to make predictions.
+        previous_numbers(list): number sequence for which we want a prediction.
+        verbose(bool): tell the user when there is no prediction.
+
+    Returns:
+        list: the predictions. A list of 5 numbers for the balls or a list of 2 for the stars.
+    """
+    sequence_numbers = list(previous_numbers)
+    nbtype = 'balls' if len(previous_numbers) > 2 else 'stars'
+
+    numbers_set = set()
+    for i in range(1, len(previous_numbers) + 1):
+        old_len = len(numbers_set)
+        while len(numbers_set) == old_len:
+            prediction = prediction_model.predict(sequence_numbers)
+            if not prediction:
+                if verbose:
+                    tqdm.write(colorama.Fore.RED + f"CPT+ has no more prediction for this "
+                               f"branch, prediction set to zero for {nbtype}_{str(i)}"
+                               + colorama.Style.RESET_ALL)
+                numbers_set.add(0)
+                break
+            sequence_numbers.append(prediction[0])
+            numbers_set.add(prediction[0])
+    return list(numbers_set)
+
+
+def jvm_options(cds=False, store_path=cf.STORE_PATH):
+    """Returns the options of the JVM: SPMF jar, options from the config, AppCDS archive.
+
+    With cds, the classes loaded are archived when the JVM shuts down if there is no archive yet,
+    otherwise they are loaded from the archive (much faster than from the jar). If the archive
+    can't be used (e.g. the JVM or the jar changed), the JVM silently loads the jar as usual.
+
+    Args:
+        cds(bool): use (or create) the class data sharing archive.
+        store_path(str): path to the directory where the archive is kept.
+
+    Returns:
+        list: JVM options.
+    """
+    options = ['-ea', '-Djava.class.path=' + cf.ROOT_DIR + '/lib/spmf.jar'] + cf.JVM_OPTIONS
+    if cds:
+        archive = store_path + cf.JVM_CDS_ARCHIVE_NAME
+        if os.path.isfile(archive):
+            options += ['-Xshare:auto', '-XX:SharedArchiveFile=' + archive]
+        else:
+            hp.create_necessary_directories(store_path)
+            options.append('-XX:ArchiveClassesAtExit=' + archive)
+    return options
+
+
+def start_jvm(cds=False, store_path=cf.STORE_PATH):
+    """Starts the Java Virtual Machine with the SPMF jar (lib) loaded.
+
+    Args:
+        cds(bool): use (or create) the class data sharing archive, see jvm_options.
+        store_path(str): path to the directory where the archive is kept.
+
+    Returns:
+        jpype object: common root of the java package where the CPT+ classes are.
+    """
+    jpype.startJVM(jpype.getDefaultJVMPath(), *jvm_options(cds, store_path))
+    # This is the part of the SPMF lib where the algorithm we want to use is located (CPT+)
+    return jpype.JPackage('ca').pfv.spmf.algorithms.sequenceprediction.ipredict
+
+
+def new_spmf_model(pkg, options=cp.DEFAULT_OPTIONS):
+    """Creates a SPMF CPT+ prediction model (not trained)."""
+    prediction_model_class = pkg.predictor.CPT.CPTPlus.CPTPlusPredictor
+    return prediction_model_class(
+        jpype.JString('CPT+'),
+        jpype.JString(options)
+    )
+
+
+def predict_spmf(dict_nbs, cds=False):
+    """Makes the predictions with SPMF, in a JVM.
+
+    The JVM startup (up to the first CPT+ object created) is timed apart from the predictions.
+
+    Args:
+        dict_nbs(dict): data built by build_cptp_data, the predictions and the timings are added
+            to it.
+        cds(bool): use (or create) the class data sharing archive, see jvm_options.
+    """
+    start = time.perf_counter()
+    pkg = start_jvm(cds)
+    prediction_model = new_spmf_model(pkg)
+    dict_nbs['timings'] = {'jvm_startup': time.perf_counter() - start}
+    start = time.perf_counter()
+
+    with tqdm(total=14, ncols=80) as pbar:
+        # Validation: we try to predict draw[-1] from [-2] for which we already know the actual
+        # draws
+        training_sets = {}
+        for k in ('balls', 'stars'):
+            training_sets[k] = build_training_set(pkg, dict_nbs['sequences'][k])
+            prediction_model.Train(training_sets[k].getSequences())
+            dict_nbs[k + '_predict_m1'] = sorted(
+                make_predictions(pkg, prediction_model, dict_nbs[k + '_draw_m2']))
+            pbar.update(len(dict_nbs[k + '_draw_m2']))
+
+        # Now we try to predict the future, the (-2) draw is added to the training sets
+        for k in ('balls', 'stars'):
+            append_sequence(pkg, training_sets[k], dict_nbs[k + '_draw_m2'])
+            prediction_model.Train(training_sets[k].getSequences())
+            dict_nbs[k + '_predict_next'] = sorted(
+                make_predictions(pkg, prediction_model, dict_nbs[k + '_draw_m1']))
+            pbar.update(len(dict_nbs[k + '_draw_m1']))
+    dict_nbs['timings']['predictions'] = time.perf_counter() - start
+
+    jpype.shutdownJVM()
+
+
+def predict_python(dict_nbs, store_path):
+    """Makes the predictions with the python CPT+, no JVM needed.
+
+    The models trained on the training sequences are kept in the store: only the draws added since
+    the last run are inserted in them. The (-2) draw is then inserted in memory only. The numbers
+    are predicted the same way as SPMF (make_predictions_python). The top-k of the prediction for
+    the next draw is kept too, with the scores (best first).
+
+    Args:
+        dict_nbs(dict): data built by build_cptp_data, the predictions and the timings are added
+            to it.
+        store_path(str): path to the directory where the models are stored.
+    """
+    start = time.perf_counter()
+    hp.create_necessary_directories(store_path)  # First run
+    with tqdm(total=14, ncols=80) as pbar:
+        for k in ('balls', 'stars'):
+            # Validation: predict draw[-1] from [-2], for which we already know the actual draws
+            prediction_model = cp.get_model(dict_nbs['sequences'][k],
+                                            store_path + cf.CPT_PLUS_MODEL_NAME.format(k))
+            dict_nbs[k + '_predict_m1'] = sorted(
+                make_predictions_python(prediction_model, dict_nbs[k + '_draw_m2']))
+            pbar.update(len(dict_nbs[k + '_draw_m2']))
+
+            # Now we try to predict the future, the (-2) draw is added to the training set
+            prediction_model.update([dict_nbs[k + '_draw_m2']])
+            dict_nbs[k + '_predict_next'] = sorted(
+                make_predictions_python(prediction_model, dict_nbs[k + '_draw_m1']))
+            dict_nbs[k + '_scores_next'] = make_predictions_batch(
+                prediction_model, [dict_nbs[k + '_draw_m1']], verbose=False)[0]
+            pbar.update(len(dict_nbs[k + '_draw_m1']))
+    dict_nbs['timings'] = {'predictions': time.perf_counter() - start}
+
+
 def print_report(dict_nbs):
     """Print DIY mini-table with predictions."""
     colorama.init()
@@ -229,94 +480,583 @@ def print_report(dict_nbs):
 
     print(f"{gb}{equal_line}{rs}\n")
 
+    # How sure CPT+ is of the numbers of its top-k for the next draw (python engine only)
+    for k in ('balls', 'stars'):
+        if k + '_scores_next' in dict_nbs:
+            scores = '  '.join(f"{number:02d} ({score:.2f})"
+                               for number, score in dict_nbs[k + '_scores_next'])
+            print(f"{'Top-k scores (' + k + ')':<23}:: {scores}")
+
+    # Where the time went, JVM startup apart
+    timings = dict_nbs.get('timings', {})
+    if 'jvm_startup' in timings:
+        print(f"JVM startup            :: {timings['jvm_startup']:.3f} s")
+    if 'predictions' in timings:
+        print(f"Training & predictions :: {timings['predictions']:.3f} s")
+
+
+def new_spmf_predictor(pkg, name):
+    """Creates one of the SPMF sequence predictors of SPMF_PREDICTORS (not trained)."""
+    class_path, options = SPMF_PREDICTORS[name]
+    predictor_class = pkg.predictor
+    for part in class_path.split('.'):
+        predictor_class = getattr(predictor_class, part)
+    if options is None:
+        return predictor_class(jpype.JString(name))
+    return predictor_class(jpype.JString(name), jpype.JString(options))
+
+
+def train_and_predict(pkg, name, training_set, previous_numbers):
+    """Trains a SPMF predictor and makes a prediction with it, timing both.
+
+    Args:
+        pkg(jpype object): common root of the java package from which we load the classes we need.
+        name(str): name of the predictor, a key of SPMF_PREDICTORS.
+        training_set(jpype object): training set object, only read (it can be shared).
+        previous_numbers(list): number sequence for which we want a prediction.
+
+    Returns:
+        dict: {'prediction': sorted list, 'train_seconds': float, 'predict_seconds': float}.
+    """
+    prediction_model = new_spmf_predictor(pkg, name)
+    start = time.perf_counter()
+    prediction_model.Train(training_set.getSequences())
+    trained = time.perf_counter()
+    prediction = sorted(make_predictions(pkg, prediction_model, previous_numbers))
+    return {'prediction': prediction, 'train_seconds': trained - start,
+            'predict_seconds': time.perf_counter() - trained}
+
+
+def compare_predictors(pkg, dict_nbs, names=tuple(SPMF_PREDICTORS), threads=None):
+    """Trains several SPMF predictors concurrently in the JVM and predicts draw (-1) with each.
+
+    One training set is built per kind of numbers and shared by all the predictors. Every
+    (predictor, kind) pair runs in a thread of a pool: the threads are attached to the JVM and
+    JPype releases the GIL during the java calls, so the trainings run in parallel in the JVM.
+
+    Args:
+        pkg(jpype object): common root of the java package from which we load the classes we need.
+        dict_nbs(dict): data built by build_cptp_data.
+        names(tuple): names of the predictors, keys of SPMF_PREDICTORS.
+        threads(int): number of threads, by default one per (predictor, kind) pair.
+
+    Returns:
+        dict: {name: {'balls': results, 'stars': results}}, see train_and_predict.
+    """
+    training_sets = {k: build_training_set(pkg, dict_nbs['sequences'][k])
+                     for k in ('balls', 'stars')}
+    tasks = [(name, k) for name in names for k in ('balls', 'stars')]
+    with concurrent.futures.ThreadPoolExecutor(threads or len(tasks)) as executor:
+        futures = {(name, k): executor.submit(train_and_predict, pkg, name, training_sets[k],
+                                              dict_nbs[k + '_draw_m2'])
+                   for name, k in tasks}
+        results = {name: {} for name in names}
+        for (name, k), future in futures.items():
+            results[name][k] = future.result()
+    return results
+
+
+def print_comparison(results, dict_nbs):
+    """Prints the predictions of draw (-1) and the latencies of the predictors, side by side."""
+    print(f"{'Model':<6}{'Train (ms)':>12}{'Predict (ms)':>14}  {'Balls':<20}{'Stars':<8}"
+          f"{'Hits':>6}")
+    print('-' * 80)
+    for name, result in results.items():
+        train = sum(result[k]['train_seconds'] for k in result) * 1000
+        predict = sum(result[k]['predict_seconds'] for k in result) * 1000
+        hits = [len(set(result[k]['prediction']) & set(dict_nbs[k + '_draw_m1']))
+                for k in ('balls', 'stars')]
+        balls = ' '.join(map('{:02d}'.format, result['balls']['prediction']))
+        stars = ' '.join(map('{:02d}'.format, result['stars']['prediction']))
+        print(f"{name:<6}{train:>12.1f}{predict:>14.1f}  {balls:<20}{stars:<8}"
+              f"{hits[0]:>4}+{hits[1]}")
+    print('-' * 80)
+    balls = ' '.join(map('{:02d}'.format, dict_nbs['balls_draw_m1']))
+    stars = ' '.join(map('{:02d}'.format, dict_nbs['stars_draw_m1']))
+    print(f"{'Actual numbers for draw (-1)':<34}{balls:<20}{stars:<8}")
 
-def main():
+
+def backtest_chunk(args):
+    """Walk-forward backtest of consecutive draws, run in a worker process.
+
+    Each draw is predicted as x4 predicts draw (-1): from the draw before it, with a model trained
+    on all the earlier draws. The model is trained once, on the draws before the first one, then
+    the draws are added one at a time (inserted in the python model, retrained with SPMF).
+
+    Args:
+        args(tuple): (engine, {'balls': sequences, 'stars': sequences}, index of the first draw
+            to predict (>= 2), index of the draw after the last one to predict, CPT+ options).
+
+    Returns:
+        dict: {'balls': [number of hits per draw], 'stars': [number of hits per draw],
+            'train_seconds': time taken by the first trainings}.
+    """
+    engine, sequences, first, last, options = args
+    if engine == 'spmf':
+        # One JVM per worker process, started by its first task and kept for the next ones
+        if jpype.isJVMStarted():
+            pkg = jpype.JPackage('ca').pfv.spmf.algorithms.sequenceprediction.ipredict
+        else:
+            pkg = start_jvm()
+
+    hits = {'train_seconds': 0.}
+    for k, v in sequences.items():
+        hits[k] = []
+        start = time.perf_counter()
+        if engine == 'spmf':
+            prediction_model = new_spmf_model(pkg, options)
+            training_set = build_training_set(pkg, v[:first - 1])
+            prediction_model.Train(training_set.getSequences())
+        else:
+            prediction_model = cp.CPTPlus(options)
+            prediction_model.train(v[:first - 1])
+        hits['train_seconds'] += time.perf_counter() - start
+        for i in range(first, last):
+            if engine == 'spmf':
+                if i > first:
+                    append_sequence(pkg, training_set, sorted(v[i - 2]))
+                    prediction_model.Train(training_set.getSequences())
+                prediction = make_predictions(pkg, prediction_model, sorted(v[i - 1]))
+            else:
+                if i > first:
+                    prediction_model.update([sorted(v[i - 2])])
+                prediction = make_predictions_python(prediction_model, sorted(v[i - 1]), False)
+            hits[k].append(len(set(prediction) & set(v[i])))
+    return hits
+
+
+def run_backtest(engine, sequences, nb_draws, processes=None, options=cp.DEFAULT_OPTIONS):
+    """Walk-forward backtest of the last draws, sharded across worker processes.
+
+    The draws are split in as many runs of consecutive draws as there are processes (see
+    backtest_chunk). With a single process, everything runs in this process.
+
+    Args:
+        engine(str): 'python' or 'spmf' (one JVM per worker process).
+        sequences(dict): {'balls': sequences, 'stars': sequences}, the whole history.
+        nb_draws(int): number of draws to predict, the last ones.
+        processes(int): number of processes, defaults to the number of CPUs.
+        options(str): CPT+ options.
+
+    Returns:
+        tuple: (dict {'balls': numpy array of hits per draw, 'stars': ...}, seconds taken).
+    """
+    nb_total = len(sequences['balls'])
+    if not 0 < nb_draws <= nb_total - 2:
+        raise ValueError(f"Between 1 and {nb_total - 2} draws can be backtested, not {nb_draws}")
+    processes = min(processes or os.cpu_count(), nb_draws)
+    bounds = np.linspace(nb_total - nb_draws, nb_total, processes + 1).astype(int)
+    tasks = [(engine, sequences, first, last, options)
+             for first, last in zip(bounds[:-1], bounds[1:])]
+
+    start = time.perf_counter()
+    if processes == 1:
+        results = [backtest_chunk(task) for task in tasks]
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            results = pool.map(backtest_chunk, tasks)
+    seconds = time.perf_counter() - start
+    return {k: np.concatenate([r[k] for r in results]).astype(int) for k in sequences}, seconds
+
+
+def print_backtest(hits, seconds):
+    """Prints the distribution of the hits of a backtest, and how fast it ran."""
+    nb_draws = len(hits['balls'])
+    print(f"Draws backtested       :: {nb_draws}")
+    # What picking numbers at random would hit on average
+    chance = {'balls': 5 * 5 / co.NB_BALLS, 'stars': 2 * 2 / co.NB_STARS}
+    for k, size in (('balls', 5), ('stars', 2)):
+        distribution = np.bincount(hits[k], minlength=size + 1) / nb_draws
+        print(f"{k.capitalize() + ' hits':<23}:: "
+              + ' | '.join(f"{n}: {d:6.1%}" for n, d in enumerate(distribution)))
+        print(f"{'Mean ' + k + ' hits':<23}:: {hits[k].mean():.3f} (chance: {chance[k]:.3f})")
+    print(f"Throughput             :: {nb_draws / seconds:.1f} draws/s ({seconds:.2f} s)")
+
+
+def parse_grid(grid):
+    """Parses a grid of CPT+ options, e.g. 'CCFmax:3,5 noiseRatio:0.5,1'.
+
+    Args:
+        grid(str): space separated name:values pairs, the values separated by commas.
+
+    Returns:
+        dict: {name: [values as strings]}.
+    """
+    parsed = {}
+    for option in grid.split():
+        name, _, values = option.partition(':')
+        parsed[name] = values.split(',')
+        for value in parsed[name]:
+            cp.parse_options(f"{name}:{value}")  # Unknown option or wrong value: ValueError
+    return parsed
+
+
+def grid_configurations(grid, nb_random=None, seed=None):
+    """Returns the configurations (CPT+ options) of a grid.
+
+    Args:
+        grid(dict): {name: [values]}, see parse_grid.
+        nb_random(int): random search, only this many configurations picked at random.
+        seed(int): seed of the random search.
+
+    Returns:
+        list: options strings, in a canonical form (see cpt_plus.format_options).
+    """
+    names = list(grid)
+    configurations = list(dict.fromkeys(
+        cp.format_options(cp.parse_options(' '.join(f"{n}:{v}" for n, v in zip(names, values))))
+        for values in itertools.product(*grid.values())))
+    if nb_random is not None and nb_random < len(configurations):
+        configurations = random.Random(seed).sample(configurations, nb_random)
+    return configurations
+
+
+def connect_sweep_cache(store_path, store_name):
+    """Connects to the store DB, creating the sweep scores table if needed.
+
+    Returns:
+        sqlite3 connection: connection to the store DB.
+    """
+    hp.create_necessary_directories(store_path)  # First run
+    con = sqlite3.connect(store_path + store_name)
+    con.execute(
+        '''CREATE TABLE IF NOT EXISTS cpt_plus_sweep
+           (options text, history_hash text, nb_draws int, balls real, stars real,
+            train_seconds real, PRIMARY KEY (options, history_hash, nb_draws));''')
+    return con
+
+
+def evaluate_options(args):
+    """Scores a configuration with a walk-forward backtest, run in a worker process.
+
+    Args:
+        args(tuple): (CPT+ options, {'balls': sequences, 'stars': sequences}, number of draws
+            held out and predicted).
+
+    Returns:
+        dict: {'options', 'balls': mean hits, 'stars': mean hits, 'train_seconds'}.
+    """
+    options, sequences, nb_draws = args
+    nb_total = len(sequences['balls'])
+    hits = backtest_chunk(('python', sequences, nb_total - nb_draws, nb_total, options))
+    return {'options': options, 'balls': float(np.mean(hits['balls'])),
+            'stars': float(np.mean(hits['stars'])), 'train_seconds': hits['train_seconds']}
+
+
+def run_sweep(sequences, configurations, nb_draws, con, processes=None):
+    """Scores configurations of CPT+ in a pool of worker processes, with the python engine.
+
+    Each configuration is scored by a walk-forward backtest of the last draws (see
+    backtest_chunk). The scores are cached in the store DB for the current history: only the
+    configurations never scored are evaluated.
+
+    Args:
+        sequences(dict): {'balls': sequences, 'stars': sequences}, the whole history.
+        configurations(list): CPT+ options strings.
+        nb_draws(int): number of draws held out and predicted.
+        con(sqlite3 connection): connection to the store DB.
+        processes(int): number of processes, defaults to the number of CPUs.
+
+    Returns:
+        tuple: (list of scores, see evaluate_options, number of scores found in the cache).
+    """
+    nb_total = len(sequences['balls'])
+    if not 0 < nb_draws <= nb_total - 2:
+        raise ValueError(f"Between 1 and {nb_total - 2} draws can be held out, not {nb_draws}")
+    history_hash = co.hash_history(np.array(sequences['balls']), np.array(sequences['stars']))
+    c = con.cursor()
+    scores, missing = [], []
+    for options in configurations:
+        c.execute('''SELECT balls, stars, train_seconds FROM cpt_plus_sweep
+                     WHERE options = ? AND history_hash = ? AND nb_draws = ?''',
+                  (options, history_hash, nb_draws))
+        row = c.fetchone()
+        if row is None:
+            missing.append(options)
+        else:
+            scores.append({'options': options, 'balls': row[0], 'stars': row[1],
+                           'train_seconds': row[2]})
+    nb_cached = len(scores)
+
+    if missing:
+        tasks = [(options, sequences, nb_draws) for options in missing]
+        with multiprocessing.Pool(processes) as pool:
+            for score in tqdm(pool.imap_unordered(evaluate_options, tasks), total=len(tasks),
+                              ncols=80):
+                con.execute('''INSERT OR REPLACE INTO cpt_plus_sweep
+                               VALUES (?, ?, ?, ?, ?, ?);''',
+                            (score['options'], history_hash, nb_draws, score['balls'],
+                             score['stars'], score['train_seconds']))
+                con.commit()
+                scores.append(score)
+    return scores, nb_cached
+
+
+def pareto_front(scores):
+    """Returns the configurations no other one beats on both accuracy and training time.
+
+    The accuracy is the mean number of numbers hit per draw (balls and stars).
+
+    Returns:
+        list: scores, fastest training first.
+    """
+    front = []
+    for score in sorted(scores, key=lambda s: (s['train_seconds'], -(s['balls'] + s['stars']))):
+        if not front or score['balls'] + score['stars'] > front[-1]['balls'] + front[-1]['stars']:
+            front.append(score)
+    return front
+
+
+def print_sweep(scores, nb_cached):
+    """Prints the Pareto front of a sweep, accuracy against training time."""
+    print(f"Configurations scored  :: {len(scores)} ({nb_cached} from the cache)\n")
+    print(f"{'Hits/draw':>9}{'Balls':>7}{'Stars':>7}{'Train (ms)':>12}  Options")
+    print('-' * 100)
+    default = cp.parse_options('')
+    for score in pareto_front(scores):
+        # Only the options which don't have their default value
+        options = cp.parse_options(score['options'])
+        changed = ' '.join(option
+                           for option, name in zip(score['options'].split(), cp.OPTIONS_TYPES)
+                           if options[name] != default[name]) or 'default'
+        print(f"{score['balls'] + score['stars']:>9.3f}{score['balls']:>7.3f}"
+              f"{score['stars']:>7.3f}{score['train_seconds'] * 1000:>12.1f}  {changed}")
+    print('-' * 100)
+
+
+class PredictionService:
+    """CPT+ models (balls and stars) trained on the whole history and kept in memory.
+
+    The models are only trained when the draws history changes (its hash is checked before every
+    prediction). The python models are then trained incrementally (only the new draws are
+    inserted), the SPMF ones from scratch. With SPMF, the JVM is started once, here.
+
+    Args:
+        engine(str): 'python' or 'spmf'.
+        db_path(str): path to the directory where the DB is stored.
+        db_name(str): name of the DB.
+        cds(bool): use (or create) the class data sharing archive, see jvm_options.
+    """
+
+    def __init__(self, engine, db_path, db_name, cds=False):
+        self.engine = engine
+        self.db_path = db_path
+        self.db_name = db_name
+        self.pkg = start_jvm(cds) if engine == 'spmf' else None
+        self.models = {k: cp.CPTPlus(cp.DEFAULT_OPTIONS) for k in ('balls', 'stars')}
+        self.history_hash = None
+
+    def refresh(self):
+        """Retrains the models if the draws history changed.
+
+        Returns:
+            bool: True if the models were retrained.
+        """
+        sequences = hp.get_numbers_as_sequences(self.db_path, self.db_name)
+        history_hash = co.hash_history(np.array(sequences['balls']), np.array(sequences['stars']))
+        if history_hash == self.history_hash:
+            return False
+        for k in ('balls', 'stars'):
+            if self.engine == 'spmf':
+                self.models[k] = new_spmf_model(self.pkg)
+                self.models[k].Train(build_training_set(self.pkg, sequences[k]).getSequences())
+            else:
+                self.models[k].fit(sequences[k])
+        self.history_hash = history_hash
+        return True
+
+    def predict(self, kind, numbers):
+        """Predicts the numbers following a sequence of balls or stars.
+
+        Args:
+            kind(str): 'balls' or 'stars'.
+            numbers(list): the sequence of numbers to predict from.
+
+        Returns:
+            dict: {'prediction': sorted list of numbers, 'retrained': bool}, plus 'scores' with
+            the python engine: top-k of a single prediction, list of [number, score], best first.
+        """
+        response = self.predict_batch(kind, [numbers])
+        response['prediction'] = response.pop('predictions')[0]
+        if 'scores' in response:
+            response['scores'] = response['scores'][0]
+        return response
+
+    def predict_batch(self, kind, queries):
+        """Predicts the numbers following each of several sequences of balls or stars.
+
+        Args:
+            kind(str): 'balls' or 'stars'.
+            queries(list): the sequences of numbers to predict from.
+
+        Returns:
+            dict: {'predictions': sorted list of numbers per query, 'retrained': bool}, plus
+            'scores' with the python engine: top-k of a single prediction per query, list of
+            [number, score], best first.
+        """
+        if kind not in ('balls', 'stars'):
+            raise ValueError(f"Unknown kind of numbers :: {kind}")
+        retrained = self.refresh()
+        if self.engine == 'spmf':
+            predictions = [sorted(make_predictions(self.pkg, self.models[kind], numbers))
+                           for numbers in queries]
+            return {'predictions': predictions, 'retrained': retrained}
+        # The same numbers as x4, the top-k (ranked and scored) of a single prediction apart
+        predictions = [sorted(make_predictions_python(self.models[kind], numbers, verbose=False))
+                       for numbers in queries]
+        scores = make_predictions_batch(self.models[kind], queries, verbose=False)
+        return {'predictions': predictions,
+                'scores': [[list(pair) for pair in prediction] for prediction in scores],
+                'retrained': retrained}
+
+    def close(self):
+        """Shuts the JVM down, if there is one."""
+        if self.engine == 'spmf':
+            jpype.shutdownJVM()
+
+
+class PredictionHandler(socketserver.StreamRequestHandler):
+    """Answers the prediction requests of a connection, one JSON object per line.
+
+    Request: {"kind": "balls", "numbers": [2, 9, 16, 26, 36]}, response: {"prediction": [...],
+    "scores": [...], "retrained": false}, or {"error": "..."} if the request is wrong. Several
+    sequences can be sent at once: {"kind": "balls", "queries": [[...], [...]]}, response:
+    {"predictions": [...], "scores": [...], "retrained": false}.
+    """
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                service = self.server.service
+                if 'queries' in request:
+                    response = service.predict_batch(
+                        request['kind'], [[int(n) for n in numbers]
+                                          for numbers in request['queries']])
+                else:
+                    response = service.predict(request['kind'],
+                                               [int(n) for n in request['numbers']])
+            except (ValueError, KeyError, TypeError) as e:
+                response = {'error': f"{type(e).__name__}: {e}"}
+            self.wfile.write((json.dumps(response) + '\n').encode())
+
+
+def make_server(service, socket_path):
+    """Creates the Unix socket server answering prediction requests (not started).
+
+    Args:
+        service(PredictionService): models used to answer the requests.
+        socket_path(str): path to the Unix socket, replaced if it already exists.
+
+    Returns:
+        socketserver.UnixStreamServer: the server, its socket is bound.
+    """
+    hp.create_necessary_directories(os.path.dirname(socket_path))
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    server = socketserver.UnixStreamServer(socket_path, PredictionHandler)
+    server.service = service
+    return server
+
+
+def request_prediction(socket_path, kind, numbers, timeout=10, batch=False):
+    """Asks the x4 server for a prediction.
+
+    Args:
+        socket_path(str): path to the Unix socket of the server.
+        kind(str): 'balls' or 'stars'.
+        numbers(list): the sequence of numbers to predict from, or a list of sequences if batch.
+        timeout(float): timeout, in seconds.
+        batch(bool): ask for the predictions of several sequences at once.
+
+    Returns:
+        dict: the response of the server.
+    """
+    if batch:
+        request = {'kind': kind, 'queries': [list(sequence) for sequence in numbers]}
+    else:
+        request = {'kind': kind, 'numbers': list(numbers)}
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path)
+        sock.sendall((json.dumps(request) + '\n').encode())
+        with sock.makefile('r') as file:
+            return json.loads(file.readline())
+
+
+def serve(engine, cds=False):
+    """Trains the models, then answers prediction requests until interrupted (Ctrl+C)."""
+    socket_path = cf.STORE_PATH + cf.X4_SOCKET_NAME
+    service = PredictionService(engine, cf.DB_PATH, cf.DB_NAME, cds)
+    service.refresh()
+    server = make_server(service, socket_path)
+    print(f"Listening on           :: {socket_path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.remove(socket_path)
+        service.close()
+
+
+def main(engine='python', serve_predictions=False, cds=False, backtest=None, compare=False,
+         sweep=False, grid=None, random_search=None):
     """"""
-    # Creating the needed datasets from the database, starting/shutting down JVM, loading the
-    # prediction object from SPMF/CPT+ and iterating on training/predicting until we get our
-    # winning numbers.
+    # Creating the needed datasets from the database, then training/predicting with CPT+ (python
+    # or SPMF in a JVM) until we get our winning numbers.
 
     print(f"{Figlet(font='slant').renderText('X4 Compact Prediction Tree +')}")
 
-    # Creating the files we need for validation from DB, the set to predict and the set for
-    # checking the prediction
-    hp.create_necessary_directories(cf.FILES_DIR)  # First run
-    dict_nbs = build_cptp_data(cf.DB_PATH, cf.DB_NAME)
+    if sweep:
+        sequences = hp.get_numbers_as_sequences(cf.DB_PATH, cf.DB_NAME)
+        configurations = grid_configurations(parse_grid(grid) if grid else SWEEP_GRID,
+                                             random_search)
+        # 100 draws held out by default, fewer if the history is too short
+        nb_draws = backtest or min(100, len(sequences['balls']) - 2)
+        con = connect_sweep_cache(cf.STORE_PATH, cf.STORE_NAME)
+        try:
+            print_sweep(*run_sweep(sequences, configurations, nb_draws, con))
+        except ValueError as e:
+            print(f"Error sweeping CPT+ options :: {e}")
+            sys.exit(1)
+        finally:
+            con.close()
+        return
 
-    # Starting the Java Virtual Machine and passing it the java jar (lib) we want to load/use
-    jpype.startJVM(
-        jpype.getDefaultJVMPath(),
-        '-ea',
-        '-Djava.class.path=' + cf.ROOT_DIR + '/lib/spmf.jar'
-    )
+    if backtest:
+        sequences = hp.get_numbers_as_sequences(cf.DB_PATH, cf.DB_NAME)
+        try:
+            print_backtest(*run_backtest(engine, sequences, backtest))
+        except ValueError as e:
+            print(f"Error backtesting CPT+ :: {e}")
+            sys.exit(1)
+        return
 
-    # This is the part of the SPMF lib where the algorithm we want to use is located (CPT+)
-    pkg = jpype.JPackage('ca').pfv.spmf.algorithms.sequenceprediction.ipredict
+    if serve_predictions:
+        serve(engine, cds)
+        return
 
-    # This is the main class: the prediction model
-    optionalParameters = 'CCF:true CBS:true CCFmin:1 CCFmax:5 CCFsup:2 splitMethod:0 ' \
-                         'splitLength:5 minPredictionRatio:1.0 noiseRatio:1'
-    prediction_model_class = pkg.predictor.CPT.CPTPlus.CPTPlusPredictor
-    prediction_model = prediction_model_class(
-        jpype.JString('CPT+'),
-        jpype.JString(optionalParameters)
-    )
+    # Creating the sequences we need for validation from DB, the set to predict and the set for
+    # checking the prediction
+    dict_nbs = build_cptp_data(cf.DB_PATH, cf.DB_NAME)
+
+    if compare:
+        start = time.perf_counter()
+        pkg = start_jvm(cds)
+        print(f"JVM startup            :: {time.perf_counter() - start:.3f} s\n")
+        print_comparison(compare_predictors(pkg, dict_nbs), dict_nbs)
+        jpype.shutdownJVM()
+        return
 
     # PREDICTIONS
-    with tqdm(total=14, ncols=80) as pbar:
-        # Validation: we try to predict draw[-1] from [-2] for which we already know the actual
-        # draws
-        training_set = load_training_set(pkg, dict_nbs['paths']['balls'])
-        prediction_model.Train(training_set.getSequences())
-        dict_nbs['balls_predict_m1'] = make_predictions(
-            pkg,
-            prediction_model,
-            dict_nbs['balls_draw_m2']
-        )
-        dict_nbs['balls_predict_m1'].sort()
-        pbar.update(5)
-
-        training_set = load_training_set(pkg, dict_nbs['paths']['stars'])
-        prediction_model.Train(training_set.getSequences())
-        dict_nbs['stars_predict_m1'] = make_predictions(
-            pkg,
-            prediction_model,
-            dict_nbs['stars_draw_m2']
-        )
-        dict_nbs['stars_predict_m1'].sort()
-        pbar.update(2)
-
-        # Now we try to predict the future
-        training_set = load_training_set(
-            pkg,
-            dict_nbs['paths']['balls'],
-            dict_nbs['balls_draw_m2']
-        )
-        prediction_model.Train(training_set.getSequences())
-        dict_nbs['balls_predict_next'] = make_predictions(
-            pkg,
-            prediction_model,
-            dict_nbs['balls_draw_m1']
-        )
-        dict_nbs['balls_predict_next'].sort()
-        pbar.update(5)
-
-        training_set = load_training_set(
-            pkg,
-            dict_nbs['paths']['stars'],
-            dict_nbs['stars_draw_m2']
-        )
-        prediction_model.Train(training_set.getSequences())
-        dict_nbs['stars_predict_next'] = make_predictions(
-            pkg,
-            prediction_model,
-            dict_nbs['stars_draw_m1']
-        )
-        dict_nbs['stars_predict_next'].sort()
-        pbar.update(2)
+    if engine == 'spmf':
+        predict_spmf(dict_nbs, cds)
+    else:
+        predict_python(dict_nbs, cf.STORE_PATH)
 
     print_report(dict_nbs)
-    jpype.shutdownJVM()
 
 
 if __name__ == '__main__':
@@ -9,6 +9,14 @@ gambler's fallacy is real and on average a number between 1 and 50 is around 25
 to get there...of course I'm joking here: there must be parameters to play with to get more
 satisfying results. So next step: play with params, read the docs deeper.
 
+The seven fits (one per ball/star) are independent and single-threaded: they run in a pool of
+processes, the draws being loaded once beforehand. Only the dates we need are forecast (the (-1)
+draw, the next draw and optionally the draws after it), the plots are made on demand.
+
+Fitted models are kept in the store, one per field and draws history. They are reused as is while
+the draws don't change. When draws are added, the new fit starts from the parameters of the
+previous one (warm start), which takes fewer iterations than a fit from scratch.
+
 Should be run from the CLI (depending on how you installed it), e.g.::
 
     $ python loto/core.py x5
@@ -18,15 +26,20 @@ But can also be run as a script::
     $ python loto/x5_prophet.py
 """
 import datetime as dt
+import glob
+import hashlib
+import multiprocessing
 import os
 import sqlite3
 import sys
+import time
 
 import colorama
 import matplotlib.pyplot as plt
 import pandas as pd
 from pandas.tseries.offsets import CustomBusinessDay
 from fbprophet import Prophet
+from fbprophet.serialize import model_from_json, model_to_json
 from pyfiglet import Figlet
 from tqdm import tqdm
 
@@ -91,6 +104,23 @@ def load_prophet_dataframe(db_path, db_name, y_field):
         sys.exit(1)
 
 
+def load_prophet_dataframes(db_path, db_name, fields):
+    """Returns the time series of several number fields, read from the DB in a single query.
+
+    Args:
+        db_path(str): path to the directory where the DB is stored.
+        db_name(str): name of the DB.
+        fields(list): names of the number fields to extract (ball_1, star_2,...).
+
+    Returns:
+        dict: {field: dataframe}, time series of dates['ds'] + numbers['y'] (see
+        load_prophet_dataframe).
+    """
+    df = hp.get_numbers_as_dataframe(db_path, db_name)
+    return {field: df[['draw_date', field]].rename(columns={'draw_date': 'ds', field: 'y'})
+            for field in fields}
+
+
 def generate_plots(prophet, forecast, field):
     """Generate plots with matplotlib with prophet's forecast data.
 
@@ -108,6 +138,229 @@ def generate_plots(prophet, forecast, field):
         return f"No image generated :: {e}"
 
 
+def init_worker():
+    """Plotting processes don't need a display."""
+    plt.switch_backend('Agg')
+
+
+def hash_series(df):
+    """Returns the hash of the time series of a field (dates and numbers)."""
+    return hashlib.sha256(pd.util.hash_pandas_object(df, index=False).values.tobytes()).hexdigest()
+
+
+def load_model(path):
+    """Reads a fitted Prophet model, None if it can't be read."""
+    try:
+        with open(path, 'r') as file:
+            return model_from_json(file.read())
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def save_model(model, path):
+    """Writes a fitted Prophet model (to a temporary file first, no half written model)."""
+    with open(path + '.tmp', 'w') as file:
+        file.write(model_to_json(model))
+    os.replace(path + '.tmp', path)
+
+
+def stan_init(model):
+    """Returns the parameters of a fitted model, to start the fit of another one from them.
+
+    `Prophet's documentation <https://facebook.github.io/prophet/docs/additional_topics.html
+    #updating-fitted-models>`_.
+    """
+    params = {name: model.params[name][0][0] for name in ('k', 'm', 'sigma_obs')}
+    params.update({name: model.params[name][0] for name in ('delta', 'beta')})
+    return params
+
+
+def get_model(df, field, cache_path, force=False):
+    """Returns a Prophet model fitted on the time series of a field, fitting as little as possible.
+
+    A cached model fitted on the same time series is reused as is. Otherwise, the fit starts from
+    the parameters of the latest model cached for the field (if any), and the new model is cached.
+
+    Args:
+        df(dataframe): time series of the field.
+        field(str): name of the field (ball_1, star_2,...).
+        cache_path(str): path to the directory where the models are cached.
+        force(bool): fit from scratch, without looking at the cached models.
+
+    Returns:
+        tuple: (fitted model, 'cached', 'warm' or 'cold').
+    """
+    path = cache_path + f"{field}_{hash_series(df)}.json"
+    model = None if force else load_model(path)
+    if model is not None:
+        os.utime(path)  # Recently used, see evict_models
+        return model, 'cached'
+
+    previous = None
+    if not force:
+        cached = sorted(glob.glob(cache_path + f"{field}_*.json"), key=os.path.getmtime)
+        previous = load_model(cached[-1]) if cached else None
+
+    model = Prophet()
+    with suppress_stdout_stderr():
+        if previous is None:
+            model.fit(df)
+        else:
+            model.fit(df, init=stan_init(previous))
+    save_model(model, path)
+    return model, 'cold' if previous is None else 'warm'
+
+
+def evict_models(cache_path, max_bytes):
+    """Removes the least recently used models until the cache is no larger than max_bytes.
+
+    Returns:
+        int: number of models removed.
+    """
+    paths = sorted(glob.glob(cache_path + '*.json'), key=os.path.getmtime)
+    sizes = [os.path.getsize(path) for path in paths]
+    total, nb_removed = sum(sizes), 0
+    for path, size in zip(paths, sizes):
+        if total <= max_bytes:
+            break
+        os.remove(path)
+        total -= size
+        nb_removed += 1
+    return nb_removed
+
+
+def plot_forecast(prophet, field):
+    """Forecasts the whole history and the year to come, and plots it (see generate_plots).
+
+    Args:
+        prophet (obj): the prophet object instance, fitted.
+        field (str): name of the field (ball_1, star_2,...).
+    """
+    cbdays = CustomBusinessDay(weekmask=cf.LOTO_DAYS)
+    future = prophet.make_future_dataframe(periods=365, freq=cbdays)
+    return generate_plots(prophet, prophet.predict(future), field)
+
+
+def target_dates(validate_prediction_date, next_lottery_date, horizon=0):
+    """Returns the only dates Prophet has to forecast: the (-1) draw, the next draw and the
+    draws after it, if asked to.
+
+    Args:
+        validate_prediction_date(Timestamp): date of the (-1) draw.
+        next_lottery_date(Timestamp): date of the next draw.
+        horizon(int): number of draws to forecast after the next one.
+
+    Returns:
+        dataframe: the dates, in a 'ds' column, as Prophet expects them.
+    """
+    cbdays = CustomBusinessDay(weekmask=cf.LOTO_DAYS)
+    window = pd.date_range(start=next_lottery_date + cbdays, periods=horizon, freq=cbdays)
+    return pd.DataFrame({'ds': [validate_prediction_date, next_lottery_date] + list(window)})
+
+
+def forecast_field(args):
+    """Fits Prophet on the time series of a field and forecasts the draws we are interested in.
+
+    Runs in a worker process, Stan's output is silenced there. Only the target dates are
+    forecast (see target_dates). The whole history and the year to come are only forecast if the
+    plot is asked for. The model comes from the cache if there is one (see get_model).
+
+    Args:
+        args(tuple): (field, dataframe of the field, date of the (-1) draw, date of the next
+            draw, horizon, plots, path to the models cache or None, force), a tuple so it can be
+            mapped on a pool of processes.
+
+    Returns:
+        dict: {'field', 'predict_m1', 'predict_next', 'horizon', 'fit', 'seconds',
+        'plots_message'}. 'horizon' is the list of the (date, number) forecast after the next
+        draw, 'fit' tells how the model was fitted (see get_model), the plots message is None if
+        no plot was asked for.
+    """
+    (field, df, validate_prediction_date, next_lottery_date, horizon, plots, cache_path,
+     force) = args
+    start = time.perf_counter()
+
+    if cache_path is None:
+        m, fit = Prophet(), 'cold'
+        with suppress_stdout_stderr():
+            m.fit(df)
+    else:
+        m, fit = get_model(df, field, cache_path, force)
+
+    targets = m.predict(target_dates(validate_prediction_date, next_lottery_date, horizon))
+    targets = targets.set_index('ds')['yhat']
+
+    # Validate the word of prophet. Check what it forecasts for a draw for which we already
+    # have the result (-1), then the interesting bit: the prediction for the next draw(s)
+    numbers = [int(round(yhat)) for yhat in targets.values]
+    return {'field': field,
+            'predict_m1': numbers[0],
+            'predict_next': numbers[1],
+            'horizon': list(zip(targets.index[2:], numbers[2:])),
+            'fit': fit,
+            'seconds': time.perf_counter() - start,
+            'plots_message': plot_forecast(m, field) if plots else None}
+
+
+def run_forecasts(dataframes, validate_prediction_date, next_lottery_date, processes=None,
+                  horizon=0, plots=False, cache_path=None, force=False):
+    """Forecasts every field, in a pool of processes (see forecast_field).
+
+    Args:
+        dataframes(dict): {field: dataframe}, as returned by load_prophet_dataframes.
+        validate_prediction_date(Timestamp): date of the (-1) draw.
+        next_lottery_date(Timestamp): date of the next draw.
+        processes(int): number of processes, defaults to the number of CPUs (at most one per
+            field). With a single process, everything runs in this process.
+        horizon(int): number of draws to forecast after the next one.
+        plots(bool): plot the forecasts.
+        cache_path(str): path to the directory where the models are cached, no cache if None.
+        force(bool): fit the models from scratch, ignoring the cached ones.
+
+    Returns:
+        dict: {field: result of forecast_field}.
+    """
+    tasks = [(field, df, validate_prediction_date, next_lottery_date, horizon, plots,
+              cache_path, force) for field, df in dataframes.items()]
+    processes = min(processes or os.cpu_count() or 1, len(tasks))
+
+    def collect(results):
+        merged = {}
+        for result in tqdm(results, total=len(tasks), ncols=80):
+            field = result['field']
+            label = f"{field} ({result['fit']})"
+            time_elapsed = str(dt.timedelta(seconds=result['seconds']))
+            tqdm.write(label + time_elapsed.rjust(80 - len(label)))
+            if result['plots_message'] is not None:
+                tqdm.write(result['plots_message'])
+            merged[field] = result
+        return merged
+
+    if processes == 1:
+        return collect(map(forecast_field, tasks))
+    with multiprocessing.Pool(processes, initializer=init_worker) as pool:
+        return collect(pool.imap_unordered(forecast_field, tasks))
+
+
+def print_horizon(results, fields):
+    """Prints the numbers forecast for the draws after the next one, one line per draw.
+
+    Args:
+        results(dict): {field: result of forecast_field}.
+        fields(list): names of the balls fields, then of the stars fields.
+    """
+    first = results[fields[0]]['horizon']
+    for i, (date, _) in enumerate(first):
+        numbers = {'ball': [], 'star': []}
+        for field in fields:
+            numbers[field[:4]].append(results[field]['horizon'][i][1])
+        balls = ' | '.join(map('{:02d}'.format, numbers['ball']))
+        stars = ' | '.join(map('{:02d}'.format, numbers['star']))
+        print(f"Draw of {date:%Y-%m-%d}     :: {balls} |   | {stars}")
+    if first:
+        print()
+
+
 def print_report(dict_nbs):
     """Print DIY mini-table with predictions."""
     colorama.init()
@@ -148,11 +401,12 @@ def print_report(dict_nbs):
     print(f"{gb}{equal_line}{rs}\n")
 
 
-def main():
+def main(horizon=0, plots=False, force=False):
     """"""
     print(f"{Figlet(font='slant').renderText('X5 Prophet')}")
 
-    hp.create_necessary_directories(cf.IMAGES_DIR)  # First run
+    if plots:
+        hp.create_necessary_directories(cf.IMAGES_DIR)  # First run
 
     next_lottery_date = hp.get_next_lottery_date()
     fields = [f for f in cf.TABLE_INFO['fields']['balls']] + \
@@ -162,49 +416,26 @@ def main():
                 'balls_predict_m1': [], 'stars_predict_m1': [],
                 'balls_predict_next': [], 'stars_predict_next': []}
 
-    for field in tqdm(fields, ncols=80):
-        start_time = dt.datetime.now()
-        df = load_prophet_dataframe(cf.DB_PATH, cf.DB_NAME, field)
-        validate_prediction_date = pd.Timestamp(df['ds'][-1:].values[0])
-
-        # Get the (-2) draw numbers and (-1) draw numbers
-        if field.startswith('ball'):
-            dict_nbs['balls_draw_m1'].append(df['y'][-1:].values[0])
-            dict_nbs['balls_draw_m2'].append(df['y'][-2:].values[0])
-        else:
-            dict_nbs['stars_draw_m1'].append(df['y'][-1:].values[0])
-            dict_nbs['stars_draw_m2'].append(df['y'][-2:].values[0])
-
-        m = Prophet()
-        with suppress_stdout_stderr():
-            m.fit(df)
-
-        cbdays = CustomBusinessDay(weekmask=cf.LOTO_DAYS)
-        future = m.make_future_dataframe(periods=365, freq=cbdays)
-        forecast = m.predict(future)
-
-        # Validate the word of prophet. Check what it forecasts for a draw for which we already
-        # have the result (-2)
-        dfv = forecast.loc[forecast['ds'] == validate_prediction_date]
-        if field.startswith('ball'):
-            dict_nbs['balls_predict_m1'].append(int(round(dfv['yhat'])))
-        else:
-            dict_nbs['stars_predict_m1'].append(int(round(dfv['yhat'])))
-
-        # The interesting bit: the prediction for the next draw
-        dff = forecast.loc[forecast['ds'] == next_lottery_date]
-        if field.startswith('ball'):
-            dict_nbs['balls_predict_next'].append(int(round(dff['yhat'])))
-        else:
-            dict_nbs['stars_predict_next'].append(int(round(dff['yhat'])))
-
-        time_elapsed = str(dt.datetime.now() - start_time)
-        tqdm.write(field + time_elapsed.rjust(80 - len(field)))
-
-        plots_message = generate_plots(m, forecast, field)
-        tqdm.write(plots_message)
+    # All the time series are loaded at once, each process only gets the one it fits
+    dataframes = load_prophet_dataframes(cf.DB_PATH, cf.DB_NAME, fields)
+    validate_prediction_date = pd.Timestamp(dataframes[fields[0]]['ds'][-1:].values[0])
+    cache_path = cf.STORE_PATH + cf.PROPHET_MODELS_DIR
+    hp.create_necessary_directories(cache_path)  # First run
+    results = run_forecasts(dataframes, validate_prediction_date, next_lottery_date,
+                            horizon=horizon, plots=plots, cache_path=cache_path, force=force)
+    evict_models(cache_path, cf.PROPHET_CACHE_MAX_BYTES)
+
+    # Get the (-2) draw numbers and (-1) draw numbers, and the predictions, in the fields order
+    for field in fields:
+        kind = 'balls' if field.startswith('ball') else 'stars'
+        df = dataframes[field]
+        dict_nbs[kind + '_draw_m1'].append(df['y'][-1:].values[0])
+        dict_nbs[kind + '_draw_m2'].append(df['y'][-2:].values[0])
+        dict_nbs[kind + '_predict_m1'].append(results[field]['predict_m1'])
+        dict_nbs[kind + '_predict_next'].append(results[field]['predict_next'])
 
     print_report(dict_nbs)
+    print_horizon(results, fields)
 
 
 if __name__ == "__main__":
@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+import contextlib
 import os
+import shutil
 
 import pytest
 import jpype
@@ -10,31 +12,32 @@ from .context import *
 
 def buildup():
     """Everything we need to do BEFORE the tests are run"""
-    # Start a Java VM
-    jpype.startJVM(
-        jpype.getDefaultJVMPath(),
-        '-ea',
-        '-Djava.class.path=' + config.ROOT_DIR + '/lib/spmf.jar'
-    )
-    # Export the package and object which are needed in x4_cpt_plus.py
-    pytest.pkg = jpype.JPackage('ca').pfv.spmf.algorithms.sequenceprediction.ipredict
-    optionalParameters = 'CCF:true CBS:true CCFmin:1 CCFmax:5 CCFsup:2 splitMethod:0 ' \
-                         'splitLength:5 minPredictionRatio:1.0 noiseRatio:1'
-    prediction_model_class = pytest.pkg.predictor.CPT.CPTPlus.CPTPlusPredictor
-    pytest.prediction_model = prediction_model_class(
-        jpype.JString('CPT+'),
-        jpype.JString(optionalParameters)
-    )
+    # Start a Java VM (from the class data sharing archive of the test store, after the first run)
+    # and export the package and object which are needed in x4_cpt_plus.py
+    pytest.pkg = x4_cpt_plus.start_jvm(cds=True, store_path=config.TEST_STORE_PATH)
+    pytest.prediction_model = x4_cpt_plus.new_spmf_model(pytest.pkg)
 
 
 def teardown():
     """Everything we need to do AFTER the tests are run"""
-    try:
-        os.remove(config.TEST_DB_PATH + config.TEST_DB_NAME)  # Delete the test database file
-        os.remove(TEST_FILES_DIR + 'random_data.csv')         # Delete csv fake file
-        jpype.shutdownJVM()                                   # Shut down the JVM
-    except BaseException:
-        pass
+    # Each file is removed on its own: a test which didn't run (or failed) must not leave the
+    # files of the other tests behind
+    files = [
+        config.TEST_DB_PATH + config.TEST_DB_NAME,                # Test database file
+        config.TEST_DB_PATH + config.TEST_VALID_DB_NAME,          # Valid draws DB
+        config.TEST_STORE_PATH + config.TEST_STORE_NAME,          # Test store file
+        config.TEST_STORE_PATH + config.COOCCURRENCES_NAME,       # Co-occurrence matrices
+        config.TEST_STORE_PATH + config.JVM_CDS_ARCHIVE_NAME,     # JVM class data sharing archive
+        config.TEST_FILES_DIR + 'x2_plots_data.npy',              # Shared plots data file
+        config.TEST_FILES_DIR + 'x2_manifest.json',               # Images manifest file
+        config.TEST_FILES_DIR + 'random_data.csv'                 # Csv fake file
+    ] + [config.TEST_STORE_PATH + config.CPT_PLUS_MODEL_NAME.format(k)  # Test CPT+ models
+         for k in ('balls', 'stars')]
+    for file in files:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(file)
+    shutil.rmtree(config.TEST_STORE_PATH + config.OEIS_INDEX_NAME, ignore_errors=True)
+    jpype.shutdownJVM()                                           # Shut down the JVM
 
 
 @pytest.fixture(scope='session', autouse=True)
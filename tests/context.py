@@ -9,6 +9,12 @@ from loto import (
     core,
     helpers,
     config,
+    cooccurrence,
+    cpt_plus,
+    nist_battery,
+    null_model,
+    oeis_client,
+    oeis_index,
     x1_statistics,
     x2_plots,
     x3_oeis,
@@ -8,10 +8,15 @@ Run the tests like so to get more interesting info::
 
     pytest -v --durations=0 --hypothesis-show-statistics tests/
 """
+import asyncio
 import contextlib
 import csv
+import datetime
 import multiprocessing
-import tempfile
+import os
+import shutil
+import sqlite3
+import threading
 import time
 import zipfile
 from unittest import mock
@@ -19,6 +24,7 @@ from unittest import mock
 from hypothesis import given, settings, example
 from hypothesis.extra.pandas import column, data_frames, range_indexes
 import hypothesis.strategies as st
+import numpy as np
 import pandas as pd
 import pytest
 import responses
@@ -33,6 +39,31 @@ from .context import *
 numbers_fields = [f for f in config.TABLE_INFO['fields']['balls']] + \
                  [f for f in config.TABLE_INFO['fields']['stars']]
 
+
+def valid_draws_db(nb_draws=300):
+    """Creates (once) a test DB of random draws whose numbers are all in range.
+
+    Tests which need valid draws use it: test_load_db_clean loads numbers up to 99 in the test DB.
+
+    Returns:
+        str: name of the DB, in config.TEST_DB_PATH.
+    """
+    path = config.TEST_DB_PATH + config.TEST_VALID_DB_NAME
+    if not os.path.exists(path):
+        rng = np.random.default_rng(0)
+        start = datetime.datetime(2004, 2, 13)
+        draws = [(start + datetime.timedelta(days=7 * i),
+                  *map(int, rng.choice(50, 5, replace=False) + 1),
+                  *map(int, rng.choice(12, 2, replace=False) + 1)) for i in range(nb_draws)]
+        con = sqlite3.connect(path)
+        con.execute('''CREATE TABLE numbers
+                       (draw_date datetime, ball_1 int, ball_2 int, ball_3 int,
+                        ball_4 int, ball_5 int, star_1 int, star_2 int);''')
+        con.executemany('''INSERT INTO numbers VALUES (?, ?, ?, ?, ?, ?, ?, ?);''', draws)
+        con.commit()
+        con.close()
+    return config.TEST_VALID_DB_NAME
+
 http_status_codes = [x for x in range(400, 452)] + [x for x in range(500, 512)]
 
 
@@ -234,6 +265,12 @@ def test_get_numbers_as_columns():
         ])
 
 
+def test_get_numbers_as_dataframe():
+    df = helpers.get_numbers_as_dataframe(config.TEST_DB_PATH, config.TEST_DB_NAME)
+    assert list(df.columns) == ['draw_date'] + numbers_fields
+    assert df['draw_date'].is_monotonic_increasing
+
+
 def test_get_numbers_as_sequences():
     nbs_as_sequences = helpers.get_numbers_as_sequences(config.TEST_DB_PATH, config.TEST_DB_NAME)
     assert isinstance(nbs_as_sequences, dict)
@@ -269,13 +306,18 @@ def test_check_installed_tools(mock_which):
 
 @mock.patch('subprocess.run')
 def test_run_tools_known(mock_run):
+    mock_run.return_value.stdout = ''
     installed_tools = ['ent', 'dieharder']
     list_paths = x1_statistics.build_stats_tests_sets(config.TEST_DB_PATH, config.TEST_DB_NAME)
-    x1_statistics.run_tools(installed_tools, list_paths)
+    x1_statistics.run_tools(installed_tools, list_paths, config.TEST_STORE_PATH,
+                            config.TEST_STORE_NAME)
 
     calls = []
     for path in list_paths:
-        calls.extend([mock.call(['ent', '-c', path]), mock.call(['dieharder', '-a', '-f', path])])
+        calls.extend([
+            mock.call(['ent', '-c', path], capture_output=True, text=True),
+            mock.call(['dieharder', '-a', '-f', path], capture_output=True, text=True)
+        ])
     mock_run.assert_has_calls(calls, any_order=True)
 
 
@@ -283,10 +325,236 @@ def test_run_tools_known(mock_run):
 def test_run_tools_unknown(mock_run):
     installed_tools = ['hammer', 'screwdriver', 'wrench']
     list_paths = x1_statistics.build_stats_tests_sets(config.TEST_DB_PATH, config.TEST_DB_NAME)
-    x1_statistics.run_tools(installed_tools, list_paths)
+    x1_statistics.run_tools(installed_tools, list_paths, config.TEST_STORE_PATH,
+                            config.TEST_STORE_NAME)
     mock_run.assert_not_called()
 
 
+@mock.patch('subprocess.run')
+def test_run_tools_stored(mock_run):
+    mock_run.return_value.stdout = ent_output
+    list_paths = x1_statistics.build_stats_tests_sets(config.TEST_DB_PATH, config.TEST_DB_NAME)
+    x1_statistics.run_tools(['ent'], list_paths, config.TEST_STORE_PATH, config.TEST_STORE_NAME,
+                            force=True)
+    mock_run.reset_mock()
+    # Unchanged series are not tested again
+    x1_statistics.run_tools(['ent'], list_paths, config.TEST_STORE_PATH, config.TEST_STORE_NAME)
+    mock_run.assert_not_called()
+
+
+ent_output = '''Entropy = 5.544962 bits per byte.
+
+Optimum compression would reduce the size
+of this 14616 byte file by 30 percent.
+
+Chi square distribution for 14616 samples is 1054718.06, and randomly
+would exceed this value less than 0.01 percent of the times.
+
+Arithmetic mean value of data bytes is 36.3148 (127.5 = random).
+Monte Carlo value for Pi is 4.000000000 (error 27.32 percent).
+Serial correlation coefficient is 0.105262 (totally uncorrelated = 0.0).
+'''
+
+dieharder_output = '''\
+#=============================================================================#
+#            dieharder version 3.31.1 Copyright 2003 Robert G. Brown          #
+#=============================================================================#
+   rng_name    |           filename             |rands/second|
+     file_input|x1_tests_set_cl_ball_1.txt      |  2.31e+07  |
+#=============================================================================#
+        test_name   |ntup| tsamples |psamples|  p-value |Assessment
+#=============================================================================#
+   diehard_birthdays|   0|       100|     100|0.00000000|  FAILED
+      diehard_operm5|   0|   1000000|     100|0.99701235|   WEAK
+ sts_serial|  16|    100000|     100|0.46820175|  PASSED
+'''
+
+
+def test_parse_ent_output():
+    records = x1_statistics.parse_ent_output(ent_output)
+    assert len(records) == 6
+    chi_square = [r for r in records if r['test_name'] == 'chi_square'][0]
+    assert chi_square['value'] == 1054718.06
+    assert chi_square['assessment'] == 'FAILED'
+    assert not x1_statistics.parse_ent_output('')
+
+
+def test_parse_dieharder_output():
+    records = x1_statistics.parse_dieharder_output(dieharder_output)
+    assert [r['assessment'] for r in records] == ['FAILED', 'WEAK', 'PASSED']
+    assert records[2]['ntup'] == 16
+    assert not x1_statistics.parse_dieharder_output('')
+
+
+@given(exceed_percent=st.floats(min_value=0, max_value=100))
+def test_assess_ent_chi_square(exceed_percent):
+    assessment = x1_statistics.assess_ent_chi_square(exceed_percent)
+    assert assessment in ('PASSED', 'WEAK', 'FAILED')
+
+
+def test_query_results():
+    con = x1_statistics.connect_results_store(config.TEST_STORE_PATH, config.TEST_STORE_NAME)
+    records = x1_statistics.parse_dieharder_output(dieharder_output)
+    x1_statistics.store_results(con, 'abc', 'x1_tests_set_cl_ball_1.txt', 'dieharder', records)
+    assert x1_statistics.get_stored_results(con, 'abc', 'dieharder') == records
+    con.close()
+    results = x1_statistics.query_results(config.TEST_STORE_PATH, config.TEST_STORE_NAME,
+                                          nb_runs=1)
+    assert [r[-1] for r in results] == ['FAILED', 'WEAK']
+
+
+def test_build_nist_series():
+    series = x1_statistics.build_nist_series(config.TEST_DB_PATH, valid_draws_db())
+    assert isinstance(series, dict)
+    assert len(series) == 9
+    for k, v in series.items():
+        assert isinstance(v, np.ndarray)
+        assert set(np.unique(v)) <= {0, 1}
+
+
+@given(
+    values=st.lists(st.integers(min_value=1, max_value=12), min_size=2, max_size=100),
+    window=st.integers(min_value=1, max_value=10)
+)
+def test_window_counts(values, window):
+    values = np.array(values).reshape(-1, 1)
+    counts = x1_statistics.window_counts(values, 12, window)
+    expanding = x1_statistics.window_counts(values, 12)
+    assert expanding.shape == (len(values), 1, 12)
+    assert (expanding[-1, 0] == np.bincount(values[:, 0] - 1, minlength=12)).all()
+    if window <= len(values):
+        assert counts.shape == (len(values) - window + 1, 1, 12)
+        # Incremental counts are the same as counts from scratch
+        assert (counts[-1, 0] == np.bincount(values[-window:, 0] - 1, minlength=12)).all()
+
+
+def test_rolling_uniformity():
+    df = helpers.get_numbers_as_dataframe(config.TEST_DB_PATH, valid_draws_db())
+    df.set_index('draw_date', inplace=True)
+    table = x1_statistics.rolling_uniformity(df, 2)
+    assert isinstance(table, pd.DataFrame)
+    assert len(table) == len(df) - 1
+    assert table.columns.nlevels == 2
+    assert set(table.columns.get_level_values(0)) == set(numbers_fields)
+    assert ((table.xs('chi2_p', axis=1, level=1) >= 0)
+            & (table.xs('chi2_p', axis=1, level=1) <= 1)).all().all()
+    for window in (0, -3, len(df) + 1):
+        with pytest.raises(ValueError):
+            x1_statistics.rolling_uniformity(df, window)
+    with pytest.raises(ValueError):
+        x1_statistics.window_counts(np.array([[1], [13]]), 12)
+
+
+###################################################################################################
+# nist_battery
+###################################################################################################
+# Examples from NIST SP 800-22 (section 2), with their expected p-values
+nist_epsilon = np.array([int(b) for b in '11001001000011111101101010100010001000010110100011000010'
+                                         '00110100110001001100011001100010100010111000'])
+
+
+@given(
+    values=st.lists(st.integers(min_value=1, max_value=50), min_size=1),
+    nb_values=st.sampled_from([50, 12])
+)
+def test_extract_bits(values, nb_values):
+    values = [(v - 1) % nb_values + 1 for v in values]
+    bits = nist_battery.extract_bits(values, nb_values)
+    assert set(np.unique(bits)) <= {0, 1}
+    assert len(values) <= bits.size <= 5 * len(values)
+
+
+def test_extract_bits_out_of_range():
+    with pytest.raises(ValueError):
+        nist_battery.extract_bits([0, 1], 50)
+    with pytest.raises(ValueError):
+        nist_battery.extract_bits([1, 51], 50)
+
+
+def test_nist_examples():
+    assert nist_battery.frequency(nist_epsilon)[0] == pytest.approx(0.109599, abs=1e-6)
+    assert nist_battery.block_frequency(nist_epsilon, 10)[0] == pytest.approx(0.706438, abs=1e-6)
+    assert nist_battery.runs(nist_epsilon)[0] == pytest.approx(0.500798, abs=1e-6)
+    assert nist_battery.cumulative_sums(nist_epsilon)[0] == pytest.approx(0.219194, abs=1e-6)
+    assert nist_battery.cumulative_sums(nist_epsilon, True)[0] == pytest.approx(0.114866,
+                                                                                abs=1e-6)
+    assert nist_battery.approximate_entropy(nist_epsilon, 2)[0] == pytest.approx(0.235301,
+                                                                                 abs=1e-6)
+    p_value_1, p_value_2, _, _ = nist_battery.serial(np.array([0, 0, 1, 1, 0, 1, 1, 1, 0, 1]), 3)
+    assert p_value_1 == pytest.approx(0.808792, abs=1e-6)
+    assert p_value_2 == pytest.approx(0.670320, abs=1e-6)
+
+
+@given(bits=st.lists(st.integers(min_value=0, max_value=1), min_size=128, max_size=2000))
+def test_run_battery(bits):
+    records = nist_battery.run_battery(np.array(bits, dtype=np.uint8))
+    assert len(records) == 9
+    for record in records:
+        assert 0 <= record['p_value'] <= 1
+        assert record['assessment'] in ('PASSED', 'FAILED')
+    assert nist_battery.run_battery(np.array([], dtype=np.uint8)) == []
+    # Shorter than a block (20 bits at least): no block frequency test, nor a nan passed
+    records = nist_battery.run_battery(np.ones(10, dtype=np.uint8))
+    assert 'block_frequency' not in [record['test_name'] for record in records]
+    assert nist_battery.block_frequency(np.ones(10, dtype=np.uint8), 20) is None
+
+
+###################################################################################################
+# null_model
+###################################################################################################
+@given(seed=st.integers(min_value=0), nb_values=st.sampled_from([50, 12]))
+def test_draw_numbers(seed, nb_values):
+    nb_drawn = 5 if nb_values == 50 else 2
+    numbers = null_model.draw_numbers(np.random.default_rng(seed), (3, 20), nb_values, nb_drawn)
+    assert numbers.shape == (3, 20, nb_drawn)
+    assert numbers.min() >= 1 and numbers.max() <= nb_values
+    # No number drawn twice in a draw
+    assert (np.diff(np.sort(numbers, axis=-1), axis=-1) > 0).all()
+
+
+@given(values=st.lists(st.integers(min_value=1, max_value=12), min_size=1))
+def test_null_model_counts(values):
+    numbers = np.array([values, values[::-1]])
+    counts = null_model.counts(numbers, 12)
+    assert counts.shape == (2, 12)
+    assert (counts[0] == np.bincount(np.array(values) - 1, minlength=12)).all()
+    assert (counts[0] == counts[1]).all()
+
+
+@given(
+    observed=st.floats(allow_nan=False),
+    simulated=st.lists(st.floats(allow_nan=False), min_size=1)
+)
+def test_empirical_p_value(observed, simulated):
+    p_value = null_model.empirical_p_value(observed, np.array(simulated))
+    assert 0 < p_value <= 1
+
+
+def test_run_null_model():
+    rng = np.random.default_rng(0)
+    arrays = {'balls': null_model.draw_numbers(rng, (300,), cooccurrence.NB_BALLS, 5),
+              'stars': null_model.draw_numbers(rng, (300,), cooccurrence.NB_STARS, 2)}
+    results = null_model.run_null_model(arrays['balls'], arrays['stars'], 'chi2_balls', 250,
+                                        batch_size=100, processes=2, seed=42)
+    assert results['simulated'].shape == (250,)
+    assert 0 < results['p_value'] <= 1
+    assert results['histories_per_second'] > 0
+    # Same seed, same distribution
+    again = null_model.run_null_model(arrays['balls'], arrays['stars'], 'chi2_balls', 250,
+                                      batch_size=100, processes=2, seed=42)
+    assert np.array_equal(np.sort(results['simulated']), np.sort(again['simulated']))
+    with pytest.raises(ValueError):
+        null_model.run_null_model(arrays['balls'] + 1, arrays['stars'], 'max_pair_count', 10)
+    with pytest.raises(ValueError):
+        null_model.run_null_model(arrays['balls'], arrays['stars'], 'chi2_balls', 0)
+
+
+def test_null_model_counts_out_of_range():
+    # 13 would be counted as a 1 of the next history
+    with pytest.raises(ValueError):
+        null_model.counts(np.array([[[1, 13]], [[2, 3]]]), 12)
+
+
 ###################################################################################################
 # x2_plots
 ###################################################################################################
@@ -333,6 +601,68 @@ def test_gen_heatmap(data_frames):
     mock_plt_savefig.assert_has_calls(calls, any_order=True)
 
 
+@given(
+    values=st.lists(
+        st.lists(st.integers(min_value=1, max_value=50), min_size=7, max_size=7), min_size=1),
+    nb_bins=st.integers(min_value=1, max_value=50)
+)
+def test_aggregate_rows(values, nb_bins):
+    values = np.array(values)
+    aggregated = x2_plots.aggregate_rows(values, nb_bins)
+    assert aggregated.shape == (min(len(values), nb_bins), 7)
+    assert aggregated.min() >= values.min() and aggregated.max() <= values.max()
+    if len(values) <= nb_bins:
+        assert (aggregated == values).all()
+
+
+@given(
+    dates=st.lists(st.datetimes(min_value=datetime.datetime(1990, 1, 1),
+                                max_value=datetime.datetime(2040, 1, 1)), min_size=1),
+    level=st.sampled_from(list(x2_plots.TILES_LEVELS))
+)
+def test_tile_periods(dates, level):
+    dates = np.sort(np.array(dates, dtype='datetime64[ns]').astype(np.int64))
+    periods = x2_plots.tile_periods(dates, level)
+    # Every draw is covered by exactly one tile
+    covered = sum(((dates >= start) & (dates < end)).astype(int) for _, start, end in periods)
+    assert (covered == 1).all()
+    assert len({name for name, _, _ in periods}) == len(periods)
+
+
+@given(
+    values=st.lists(
+        st.lists(st.integers(min_value=1, max_value=50), min_size=7, max_size=7), min_size=1),
+    nb_bins=st.integers(min_value=1, max_value=512),
+    data=st.data()
+)
+def test_aggregate_period(values, nb_bins, data):
+    values = np.array(values)
+    dates = np.sort(np.array(data.draw(st.lists(st.integers(min_value=0, max_value=10 ** 9 - 1),
+                                                min_size=len(values), max_size=len(values)))))
+    aggregated = x2_plots.aggregate_period(dates, values, 0, 10 ** 9, nb_bins)
+    assert aggregated.shape == (nb_bins, 7)
+    filled = ~np.isnan(aggregated[:, 0])
+    assert 1 <= filled.sum() <= min(len(values), nb_bins)
+    assert aggregated[filled].min() >= values.min() and aggregated[filled].max() <= values.max()
+
+
+def test_render_tile():
+    df = x2_plots.load_plots_dataframe(config.TEST_DB_PATH, config.TEST_DB_NAME)
+    df.set_index('draw_date', inplace=True, drop=True)
+    path = config.TEST_FILES_DIR + 'x2_plots_data.npy'
+    x2_plots.share_dataframe(df, path)
+    data = np.load(path)
+    name, start, end = x2_plots.tile_periods(data[:, 0], 'years')[0]
+    tile = x2_plots.TILES_DIR + f"area/years/{name}.png"
+    with mock.patch('matplotlib.pyplot.savefig') as mock_plt_savefig:
+        msg = x2_plots.render_tile(('area', start, end, path, tile))
+    assert msg.startswith('Tile created')
+    mock_plt_savefig.assert_called_once_with(config.IMAGES_DIR + tile, dpi=128)
+    signature = x2_plots.tile_signature('area', data)
+    assert signature != x2_plots.tile_signature('area', data[:-1])
+    assert signature != x2_plots.tile_signature('line', data)
+
+
 @settings(deadline=300, max_examples=50)
 @given(
     data_frames(
@@ -423,6 +753,208 @@ def test_gen_pie_plot(data_frames):
     mock_plt_savefig.assert_has_calls(calls, any_order=True)
 
 
+@settings(deadline=500, max_examples=50)
+@given(
+    data_frames(
+        index=range_indexes(min_size=5),
+        columns=([
+            column('draw_date', elements=st.datetimes(
+                min_value=pd.Timestamp.min.to_pydatetime(),
+                max_value=pd.Timestamp.max.to_pydatetime())
+            ),
+            column('ball_1', elements=st.integers(min_value=0, max_value=99)),
+            column('ball_2', elements=st.integers(min_value=0, max_value=99)),
+            column('ball_3', elements=st.integers(min_value=0, max_value=99)),
+            column('ball_4', elements=st.integers(min_value=0, max_value=99)),
+            column('ball_5', elements=st.integers(min_value=0, max_value=99)),
+            column('star_1', elements=st.integers(min_value=0, max_value=99)),
+            column('star_2', elements=st.integers(min_value=0, max_value=99))
+        ])
+    )
+)
+def test_gen_bar_plot(data_frames):
+    with contextlib.ExitStack() as stack:
+        mock_plt_savefig = stack.enter_context(mock.patch('matplotlib.pyplot.savefig'))
+
+        data_frames.set_index('draw_date', inplace=True, drop=True)
+        x2_plots.gen_bar_plot(data_frames)
+
+    calls = [mock.call(config.IMAGES_DIR + 'x2_bar.png', dpi=150, bbox_inches='tight')]
+    mock_plt_savefig.assert_has_calls(calls, any_order=True)
+
+
+@settings(deadline=None, max_examples=20)
+@given(
+    data_frames(
+        index=range_indexes(min_size=5),
+        columns=([
+            column('draw_date', elements=st.datetimes(
+                min_value=pd.Timestamp.min.to_pydatetime(),
+                max_value=pd.Timestamp.max.to_pydatetime())
+            ),
+            column('ball_1', elements=st.integers(min_value=1, max_value=10)),
+            column('ball_2', elements=st.integers(min_value=11, max_value=20)),
+            column('ball_3', elements=st.integers(min_value=21, max_value=30)),
+            column('ball_4', elements=st.integers(min_value=31, max_value=40)),
+            column('ball_5', elements=st.integers(min_value=41, max_value=50)),
+            column('star_1', elements=st.integers(min_value=1, max_value=6)),
+            column('star_2', elements=st.integers(min_value=7, max_value=12))
+        ])
+    )
+)
+def test_gen_cooccurrence_plot(data_frames):
+    with contextlib.ExitStack() as stack:
+        mock_plt_savefig = stack.enter_context(mock.patch('matplotlib.pyplot.savefig'))
+        stack.enter_context(mock.patch('config.STORE_PATH', config.TEST_STORE_PATH))
+
+        data_frames.set_index('draw_date', inplace=True, drop=True)
+        x2_plots.gen_cooccurrence_plot(data_frames)
+
+    calls = [mock.call(config.IMAGES_DIR + 'x2_cooccurrences.png', dpi=150, bbox_inches='tight')]
+    mock_plt_savefig.assert_has_calls(calls, any_order=True)
+
+
+@settings(max_examples=50)
+@given(
+    data_frames(
+        index=range_indexes(min_size=5),
+        columns=([
+            column('draw_date', elements=st.datetimes(
+                min_value=pd.Timestamp.min.to_pydatetime(),
+                max_value=pd.Timestamp.max.to_pydatetime())
+            ),
+            column('ball_1', elements=st.integers(min_value=0, max_value=99)),
+            column('ball_2', elements=st.integers(min_value=0, max_value=99)),
+            column('ball_3', elements=st.integers(min_value=0, max_value=99)),
+            column('ball_4', elements=st.integers(min_value=0, max_value=99)),
+            column('ball_5', elements=st.integers(min_value=0, max_value=99)),
+            column('star_1', elements=st.integers(min_value=0, max_value=99)),
+            column('star_2', elements=st.integers(min_value=0, max_value=99))
+        ])
+    )
+)
+def test_share_dataframe(data_frames):
+    data_frames.set_index('draw_date', inplace=True, drop=True)
+    path = config.TEST_FILES_DIR + 'x2_plots_data.npy'
+    x2_plots.share_dataframe(data_frames, path)
+    df = x2_plots.load_shared_dataframe(path, list(data_frames.columns))
+    assert (df.index == data_frames.index).all()
+    assert (df.to_numpy() == data_frames.to_numpy()).all()
+
+
+def test_render_plot():
+    df = x2_plots.load_plots_dataframe(config.TEST_DB_PATH, config.TEST_DB_NAME)
+    df.set_index('draw_date', inplace=True, drop=True)
+    path = config.TEST_FILES_DIR + 'x2_plots_data.npy'
+    x2_plots.share_dataframe(df, path)
+    with mock.patch('matplotlib.pyplot.savefig') as mock_plt_savefig:
+        msg = x2_plots.render_plot((x2_plots.gen_line_plot, path, list(df.columns)))
+    assert msg.startswith('Line plot created')
+    mock_plt_savefig.assert_called_once()
+
+
+def test_image_signature():
+    df = x2_plots.load_plots_dataframe(config.TEST_DB_PATH, config.TEST_DB_NAME)
+    df.set_index('draw_date', inplace=True, drop=True)
+    data_hash = x2_plots.hash_dataframe(df)
+    assert data_hash == x2_plots.hash_dataframe(df.copy())
+    assert data_hash != x2_plots.hash_dataframe(df.iloc[:-1])
+    signature = x2_plots.image_signature('x2_line.png', data_hash)
+    assert signature['data_hash'] == data_hash
+    assert signature['params']['dpi'] == 150
+    assert signature != x2_plots.image_signature('x2_pie.png', data_hash)
+
+
+def test_manifest():
+    path = config.TEST_FILES_DIR + 'x2_manifest.json'
+    signature = x2_plots.image_signature('x2_line.png', 'abc')
+    x2_plots.save_manifest({'x2_line.png': signature}, path)
+    manifest = x2_plots.load_manifest(path)
+    assert manifest == {'x2_line.png': signature}
+    assert x2_plots.load_manifest(config.TEST_FILES_DIR + 'nothing.json') == {}
+    with mock.patch('os.path.isfile', return_value=True):
+        assert x2_plots.is_up_to_date(manifest, 'x2_line.png', signature)
+        assert not x2_plots.is_up_to_date(manifest, 'x2_line.png',
+                                          x2_plots.image_signature('x2_line.png', 'abd'))
+        assert not x2_plots.is_up_to_date(manifest, 'x2_pie.png', signature)
+    with mock.patch('os.path.isfile', return_value=False):
+        assert not x2_plots.is_up_to_date(manifest, 'x2_line.png', signature)
+
+
+###################################################################################################
+# cooccurrence
+###################################################################################################
+draws = st.lists(
+    st.tuples(
+        st.lists(st.integers(min_value=1, max_value=50), min_size=5, max_size=5, unique=True),
+        st.lists(st.integers(min_value=1, max_value=12), min_size=2, max_size=2, unique=True)
+    ),
+    min_size=2
+)
+
+
+@given(draws=draws)
+def test_build_cooccurrences(draws):
+    balls = np.array([d[0] for d in draws])
+    stars = np.array([d[1] for d in draws])
+    cooccurrences = cooccurrence.build_cooccurrences(balls, stars)
+    assert cooccurrences['pairs'].shape == (50, 50)
+    assert cooccurrences['ball_star'].shape == (50, 12)
+    assert (cooccurrences['pairs'] == cooccurrences['pairs'].T).all()
+    assert cooccurrences['pairs'].trace() == 5 * len(draws)
+    assert cooccurrences['triples_counts'].sum() == 10 * len(draws)
+    assert cooccurrences['ball_star'].sum() == 10 * len(draws)
+    triples = cooccurrence.decode_triples(cooccurrences['triples_keys'])
+    assert (np.diff(triples, axis=1) > 0).all()
+
+
+@given(draws=draws, data=st.data())
+def test_update_cooccurrences(draws, data):
+    balls = np.array([d[0] for d in draws])
+    stars = np.array([d[1] for d in draws])
+    start = data.draw(st.integers(min_value=1, max_value=len(draws) - 1))
+    updated = cooccurrence.update_cooccurrences(
+        cooccurrence.build_cooccurrences(balls[:start], stars[:start]), balls, stars)
+    # Incremental updates give the same result as building from scratch
+    built = cooccurrence.build_cooccurrences(balls, stars)
+    for k, v in built.items():
+        assert np.array_equal(updated[k], v)
+
+
+@given(draws=draws)
+def test_frequency_counts(draws):
+    numbers = np.array([d[0] + d[1] for d in draws])
+    counts = cooccurrence.frequency_counts(numbers)
+    assert counts.shape == (7, 51)
+    assert (counts.sum(axis=1) == len(draws)).all()
+    for position in range(7):
+        values, expected = np.unique(numbers[:, position], return_counts=True)
+        assert np.array_equal(counts[position, values], expected)
+    # Numbers out of the lottery range get their own columns
+    assert cooccurrence.frequency_counts(np.array([[99, 0]])).shape == (2, 100)
+
+
+def test_get_cooccurrences():
+    arrays = helpers.get_numbers_as_arrays(config.TEST_DB_PATH, valid_draws_db())
+    path = config.TEST_STORE_PATH + config.COOCCURRENCES_NAME
+    first = cooccurrence.get_cooccurrences(arrays['balls'][:-1], arrays['stars'][:-1], path)
+    with mock.patch.object(cooccurrence, 'build_cooccurrences',
+                           wraps=cooccurrence.build_cooccurrences) as mock_build:
+        cooccurrences = cooccurrence.get_cooccurrences(arrays['balls'], arrays['stars'], path)
+        # Only the new draw is counted
+        mock_build.assert_called_once()
+        assert mock_build.call_args[0][0].shape[0] == 1
+    assert cooccurrences['nb_draws'] == first['nb_draws'] + 1
+    assert cooccurrence.load_cooccurrences(path)['history_hash'] == cooccurrences['history_hash']
+
+
+def test_one_hot_out_of_range():
+    with pytest.raises(ValueError):
+        cooccurrence.one_hot(np.array([[0, 1]]), 50)    # A 0 would wrap to column 49
+    with pytest.raises(ValueError):
+        cooccurrence.one_hot(np.array([[1, 51]]), 50)
+
+
 ###################################################################################################
 # x3_oeis
 ###################################################################################################
@@ -454,10 +986,26 @@ def test_check_sequences_oeis_success():
     urls = x3_oeis.balls_by_draws(draws)
     for url in urls:
         responses.add(responses.GET, url, status=200, json={'results': 'All good Neo'})
-    with mock.patch('helpers.spinning_cursor') as mock_spinning_cursor:
-        x3_oeis.check_sequences_oeis(urls, 0)
-    calls = [mock.call(0) for x in range(len(urls))]
-    mock_spinning_cursor.assert_has_calls(calls, any_order=True)
+    x3_oeis.check_sequences_oeis(urls, 0)
+    # Draws sharing the same balls are only queried once
+    assert len(responses.calls) == len(dict.fromkeys(urls))
+
+
+@responses.activate
+def test_check_sequences_oeis_cache():
+    draws = x3_oeis.get_latest_draws(config.TEST_DB_PATH, config.TEST_DB_NAME, 10)
+    urls = x3_oeis.balls_by_draws(draws)
+    for url in urls:
+        responses.add(responses.GET, url, status=200, json={'results': None})
+    con = oeis_client.connect_cache(config.TEST_STORE_PATH, config.TEST_STORE_NAME)
+    con.execute('DELETE FROM oeis_cache')
+    x3_oeis.check_sequences_oeis(urls[:5], 0, con)
+    x3_oeis.check_sequences_oeis(urls, 0, con)
+    # The first five queries were answered from the cache the second time
+    assert len(responses.calls) == len(dict.fromkeys(urls))
+    assert oeis_client.get_cached(con, urls[0], 60) == '{"results": null}'
+    assert oeis_client.get_cached(con, urls[0], -1) is None
+    con.close()
 
 
 @given(status_code=st.sampled_from(http_status_codes))
@@ -478,32 +1026,290 @@ def test_check_sequences_oeis_error(status_code):
         x3_oeis.check_sequences_oeis(urls, 0)
 
 
+def test_check_sequences_index():
+    index_path = config.TEST_STORE_PATH + config.OEIS_INDEX_NAME
+    oeis_index.build_index(config.TEST_OEIS_DUMP, index_path)
+    index = oeis_index.load_index(index_path)
+    draws = x3_oeis.get_latest_draws(config.TEST_DB_PATH, config.TEST_DB_NAME, None)
+    assert len(draws) > 10
+    found = x3_oeis.check_sequences_index(index, draws)
+    assert all(draw in draws and anumbers for draw, anumbers in found)
+    draws = [(3, 5, 8, 13, 21, 34, 55), (1, 50, 2, 40, 3, 1, 2)]
+    assert x3_oeis.check_sequences_index(index, draws) == [((3, 5, 8, 13, 21, 34, 55), [45])]
+
+
+@given(numbers=st.lists(st.integers(min_value=1, max_value=50), min_size=1, max_size=40),
+       k=st.integers(min_value=1, max_value=10))
+def test_sliding_windows(numbers, k):
+    windows = x3_oeis.sliding_windows(np.array(numbers), k)
+    assert windows.shape == (max(len(numbers) - k + 1, 0), k)
+    for i, window in enumerate(windows):
+        assert list(window) == numbers[i:i + k]
+    # Windows don't span two rows
+    assert x3_oeis.sliding_windows(np.array([numbers, numbers]), k).shape[0] == 2 * len(windows)
+
+
+def test_collect_windows():
+    balls = np.array([[1, 2, 3, 4, 5], [1, 2, 3, 4, 5]])
+    stars = np.array([[1, 2], [6, 7]])
+    windows = x3_oeis.collect_windows(balls, stars, range(3, 5))
+    counts = {w['window']: (w['balls'], w['draws']) for w in windows}
+    assert len(counts) == len(windows)  # Distinct windows
+    assert counts[(1, 2, 3)] == (2, 2)
+    assert counts[(5, 1, 2)] == (1, 1)
+    assert counts[(4, 5, 6)] == (0, 1)
+    assert counts[(2, 3, 4, 5)] == (2, 2)
+    assert sum(w['balls'] for w in windows if w['k'] == 3) == 10 - 3 + 1  # None merged
+
+
+def test_check_windows_index():
+    index_path = config.TEST_STORE_PATH + config.OEIS_INDEX_NAME
+    oeis_index.build_index(config.TEST_OEIS_DUMP, index_path)
+    balls = np.array([[1, 2, 3, 5, 8], [13, 21, 34, 40, 44]])
+    stars = np.array([[1, 2], [3, 4]])
+    hits, nb_windows = x3_oeis.check_windows_index(index_path, balls, stars, range(3, 8),
+                                                   processes=2, chunk_size=5)
+    assert nb_windows == len(x3_oeis.collect_windows(balls, stars, range(3, 8)))
+    assert hits[0]['k'] == 7 and hits[0]['anumbers'] == [45]
+    assert {hit['window'] for hit in hits if hit['k'] == 7} == {(1, 2, 3, 5, 8, 13, 21),
+                                                                (2, 3, 5, 8, 13, 21, 34)}
+    assert [h['k'] for h in hits] == sorted((h['k'] for h in hits), reverse=True)
+    with mock.patch('builtins.print') as mock_print:
+        x3_oeis.print_hits(hits, nb_windows, nb_rows=2)
+    assert mock_print.call_count == 6
+
+
+###################################################################################################
+# oeis_client
+###################################################################################################
+def test_token_bucket():
+    bucket = oeis_client.TokenBucket(rate=50, capacity=2)
+
+    async def acquire(nb_tokens):
+        for _ in range(nb_tokens):
+            await bucket.acquire()
+
+    start = time.monotonic()
+    asyncio.run(acquire(2))
+    assert time.monotonic() - start < 0.02  # A burst of two
+    asyncio.run(acquire(5))
+    assert time.monotonic() - start >= 0.09  # Then 50 per second
+
+
+@responses.activate
+def test_get_responses():
+    urls = [config.OEIS_URL + str(i) for i in range(20)]
+    for url in urls[:-1]:
+        responses.add(responses.GET, url, status=200, body=url)
+    responses.add(responses.GET, urls[-1], status=404)
+    results, nb_cached = oeis_client.get_responses(urls, max_in_flight=4)
+    assert nb_cached == 0
+    assert [results[url] for url in urls[:-1]] == urls[:-1]
+    assert isinstance(results[urls[-1]], RequestException)
+    assert oeis_client.cache_key(urls[1]) == 'fmt=json&q=1'
+
+
+###################################################################################################
+# oeis_index
+###################################################################################################
+def test_read_stripped():
+    sequences = dict(oeis_index.read_stripped(config.TEST_OEIS_DUMP))
+    assert len(sequences) == 7
+    assert sequences[45][:8] == ['0', '1', '1', '2', '3', '5', '8', '13']
+
+
+def test_build_index():
+    index_path = config.TEST_STORE_PATH + config.OEIS_INDEX_NAME
+    assert oeis_index.build_index(config.TEST_OEIS_DUMP, index_path) == 7
+    index = oeis_index.load_index(index_path)
+    assert oeis_index.load_index(config.TEST_STORE_PATH + 'nothing/') is None
+    # Every term is kept as a byte, big terms and ends of sequences are separators
+    assert index['terms'].dtype == np.uint8
+    assert (np.diff(index['keys'].astype(np.int64)) > 0).all()
+    assert oeis_index.find_sequences(index, [1, 2, 3]) == [27, 45]
+    assert oeis_index.find_sequences(index, [2, 3, 5, 7]) == [40]
+    assert oeis_index.find_sequences(index, [6, 24, 120]) == [142]
+    assert oeis_index.find_sequences(index, [24, 120, 720]) == []
+    assert oeis_index.find_sequences(index, [76, 77, 78]) == []
+    assert oeis_index.find_sequences(index, [1, 1, 1, 1, 1, 1, 1]) == [12]
+    assert oeis_index.find_sequences(index, [-1, 2, 3]) == []
+    with pytest.raises(ValueError):
+        oeis_index.find_sequences(index, [1, 2])
+    assert oeis_index.format_anumber(45) == 'A000045'
+
+
+@pytest.fixture(scope='module')
+def oeis_test_index():
+    """Index of the test OEIS dump, built once for the tests which only search it."""
+    index_path = config.TEST_STORE_PATH + config.OEIS_INDEX_NAME
+    oeis_index.build_index(config.TEST_OEIS_DUMP, index_path)
+    return oeis_index.load_index(index_path)
+
+
+@given(start=st.integers(min_value=0, max_value=70), length=st.integers(min_value=3, max_value=7))
+def test_find_sequences(oeis_test_index, start, length):
+    index = oeis_test_index
+    numbers = list(range(start + 1, start + 1 + length))
+    # The natural numbers go up to 77 in the dump
+    assert (27 in oeis_index.find_sequences(index, numbers)) == (numbers[-1] <= 77)
+
+
+###################################################################################################
+# cpt_plus
+###################################################################################################
+# Training sequences where what follows each query is unambiguous
+CPT_PLUS_SEQUENCES = [(1, 2, 3)] * 10 + [(1, 2, 4)] * 3 + [(5, 6, 7, 8)] * 8 + [(9, 10, 11)] * 6 \
+    + [(5, 6, 9)] * 2
+CPT_PLUS_PREDICTIONS = [([1, 2], 3), ([5, 6, 7], 8), ([9, 10], 11), ([2], 3), ([6, 7], 8)]
+
+
+def test_parse_options():
+    options = cpt_plus.parse_options('CBS:false CCFmax:3 noiseRatio:0.5')
+    assert options['CCF'] is True and options['CBS'] is False
+    assert options['CCFmax'] == 3 and options['CCFmin'] == 1
+    assert options['noiseRatio'] == 0.5
+    with pytest.raises(ValueError):
+        cpt_plus.parse_options('CCF:true nope:1')
+
+
+def test_cpt_plus_predict():
+    model = cpt_plus.CPTPlus()
+    model.train(CPT_PLUS_SEQUENCES)
+    for target, expected in CPT_PLUS_PREDICTIONS:
+        assert model.predict(target) == [expected]
+    assert model.predict([5, 6], k=3) == [7, 8, 9]
+    assert model.predict([42]) == []
+    assert model.predict([]) == []
+
+
+def test_cpt_plus_predict_batch():
+    model = cpt_plus.CPTPlus()
+    model.train(CPT_PLUS_SEQUENCES)
+    ranked = model.predict_scores([5, 6], k=3)
+    assert [item for item, _ in ranked] == model.predict([5, 6], k=3)
+    assert [score for _, score in ranked] == sorted((score for _, score in ranked), reverse=True)
+    targets = [target for target, _ in CPT_PLUS_PREDICTIONS] + [[42], [5, 6]]
+    assert model.predict_batch(targets, k=3) == [model.predict_scores(target, k=3)
+                                                 for target in targets]
+
+
+@given(sequences=st.lists(st.lists(st.integers(min_value=1, max_value=12), min_size=1, max_size=6),
+                          min_size=1, max_size=40),
+       target=st.lists(st.integers(min_value=1, max_value=12), min_size=1, max_size=5))
+def test_cpt_plus_compression(sequences, target):
+    # Both compressions are lossless: same sequences in the tree, same predictions, fewer nodes
+    models = {}
+    for options in ('CCF:true CBS:true', 'CCF:true CBS:false', 'CCF:false CBS:true',
+                    'CCF:false CBS:false'):
+        models[options] = cpt_plus.CPTPlus(options)
+        models[options].train(sequences)
+        assert [models[options].branch(i) for i in range(len(sequences))] == sequences
+    predictions = [model.predict(target, k=3) for model in models.values()]
+    assert all(p == predictions[0] for p in predictions)
+    assert models['CCF:false CBS:true'].nb_nodes <= models['CCF:false CBS:false'].nb_nodes
+
+
+def test_cpt_plus_split():
+    model = cpt_plus.CPTPlus('splitMethod:1 splitLength:2')
+    model.train([(1, 2, 3)] * 3)
+    assert model.branch(0) == [2, 3]
+    assert model.predict([1]) == []
+    assert model.predict([2]) == [3]
+
+
+@given(sequences=st.lists(st.lists(st.integers(min_value=1, max_value=12), min_size=1, max_size=6),
+                          min_size=2, max_size=40),
+       target=st.lists(st.integers(min_value=1, max_value=12), min_size=1, max_size=5),
+       data=st.data())
+def test_cpt_plus_update(sequences, target, data):
+    # Inserting the last sequences in a trained model is the same as training on all of them
+    nb_first = data.draw(st.integers(min_value=1, max_value=len(sequences) - 1))
+    model = cpt_plus.CPTPlus()
+    model.train(sequences[:nb_first])
+    assert model.fit(sequences) is True
+    assert model.fit(sequences) is False
+    full = cpt_plus.CPTPlus()
+    full.train(sequences)
+    assert model.history_hash == full.history_hash
+    assert [model.branch(i) for i in range(len(sequences))] == sequences
+    assert model.predict(target, k=3) == full.predict(target, k=3)
+    # Not the same first sequences: trained from scratch
+    model.fit(sequences[::-1])
+    assert model.history_hash == cpt_plus.extend_hash('', sequences[::-1])
+
+
+def test_get_model():
+    path = config.TEST_STORE_PATH + 'cpt_plus_test.npz'
+    try:
+        model = cpt_plus.get_model(CPT_PLUS_SEQUENCES[:-3], path)
+        assert os.path.isfile(path)
+        # Stored, then loaded with the 3 last sequences inserted
+        model = cpt_plus.get_model(CPT_PLUS_SEQUENCES, path)
+        loaded = cpt_plus.load_model(path)
+        assert loaded.options == model.options
+        assert loaded.history_hash == cpt_plus.extend_hash('', CPT_PLUS_SEQUENCES)
+        assert loaded.nb_nodes == model.nb_nodes
+        assert [loaded.branch(i) for i in range(len(CPT_PLUS_SEQUENCES))] \
+            == [list(s) for s in CPT_PLUS_SEQUENCES]
+        for target, expected in CPT_PLUS_PREDICTIONS:
+            assert loaded.predict(target) == [expected]
+        # Other options: trained again
+        assert cpt_plus.get_model(CPT_PLUS_SEQUENCES, path, 'CBS:false').options['CBS'] is False
+    finally:
+        os.remove(path)
+    assert cpt_plus.load_model(path) is None
+
+
+def test_cpt_plus_spmf(loto_fixture):
+    # Same predictions as the SPMF implementation (with the same options)
+    training_set = x4_cpt_plus.build_training_set(pytest.pkg, CPT_PLUS_SEQUENCES)
+    pytest.prediction_model.Train(training_set.getSequences())
+    model = cpt_plus.CPTPlus()
+    model.train(CPT_PLUS_SEQUENCES)
+    for target, expected in CPT_PLUS_PREDICTIONS:
+        request = x4_cpt_plus.prepare_prediction_request(pytest.pkg, target)
+        prediction = pytest.prediction_model.Predict(request)
+        assert int(str(prediction.get(0))) == expected
+        assert model.predict(target) == [expected]
+
+
 ###################################################################################################
 # x4_cpt_plus
 ###################################################################################################
-@mock.patch('builtins.open')
-def test_build_cptp_data(mock_open):
+def test_build_cptp_data():
     dict_nbs = x4_cpt_plus.build_cptp_data(config.TEST_DB_PATH, config.TEST_DB_NAME)
     assert isinstance(dict_nbs, dict)
     assert any(dict_nbs.values()) is True
+    sequences = helpers.get_numbers_as_sequences(config.TEST_DB_PATH, config.TEST_DB_NAME)
+    for k in ('balls', 'stars'):
+        # The two last draws are kept out of the training sequences
+        assert dict_nbs['sequences'][k] == sequences[k][:-2]
+        assert dict_nbs[k + '_draw_m1'] == sorted(sequences[k][-1])
+        assert dict_nbs[k + '_draw_m2'] == sorted(sequences[k][-2])
 
 
 @given(numbers=st.lists(st.integers(min_value=1, max_value=99), min_size=1))
-def test_load_training_set_balls(loto_fixture, numbers):
-    filepath = config.FILES_DIR + 'x4_data_set_seq_balls.txt'
-    training_set = x4_cpt_plus.load_training_set(pytest.pkg, filepath, [])
-    training_set_appended = x4_cpt_plus.load_training_set(pytest.pkg, filepath, numbers)
-    assert len(str(training_set.getSequences())) < len(str(training_set_appended.getSequences()))
+def test_build_training_set_balls(loto_fixture, numbers):
+    sequences = x4_cpt_plus.build_cptp_data(config.TEST_DB_PATH, config.TEST_DB_NAME)['sequences']
+    training_set = x4_cpt_plus.build_training_set(pytest.pkg, sequences['balls'])
     assert isinstance(training_set, pytest.pkg.database.SequenceDatabase)
+    assert training_set.size() == len(sequences['balls'])
+    last = training_set.getSequences().get(training_set.size() - 1)
+    assert [int(str(item)) for item in last.getItems()] == list(sequences['balls'][-1])
+    x4_cpt_plus.append_sequence(pytest.pkg, training_set, numbers)
+    assert training_set.size() == len(sequences['balls']) + 1
+    assert training_set.getSequences().get(training_set.size() - 1).size() == len(numbers)
 
 
 @given(numbers=st.lists(st.integers(min_value=1, max_value=99), min_size=1))
-def test_load_training_set_stars(loto_fixture, numbers):
-    filepath = config.FILES_DIR + 'x4_data_set_seq_stars.txt'
-    training_set = x4_cpt_plus.load_training_set(pytest.pkg, filepath, [])
-    training_set_appended = x4_cpt_plus.load_training_set(pytest.pkg, filepath, numbers)
-    assert len(str(training_set.getSequences())) < len(str(training_set_appended.getSequences()))
+def test_build_training_set_stars(loto_fixture, numbers):
+    sequences = x4_cpt_plus.build_cptp_data(config.TEST_DB_PATH, config.TEST_DB_NAME)['sequences']
+    training_set = x4_cpt_plus.build_training_set(pytest.pkg, sequences['stars'])
     assert isinstance(training_set, pytest.pkg.database.SequenceDatabase)
+    assert training_set.size() == len(sequences['stars'])
+    x4_cpt_plus.append_sequence(pytest.pkg, training_set, numbers)
+    assert training_set.size() == len(sequences['stars']) + 1
+    assert training_set.getSequences().get(training_set.size() - 1).size() == len(numbers)
 
 
 @given(numbers=st.lists(st.integers(min_value=1, max_value=99), min_size=1))
@@ -527,23 +1333,203 @@ def test_prepare_prediction_request(loto_fixture, numbers):
     )
 )
 def test_make_predictions(loto_fixture, previous_numbers, random_values):
-    with tempfile.NamedTemporaryFile(mode='w+') as tmpf:
-        for draw in random_values:
-            line = ' -1 '.join(map(str, draw)) + ' -1 -2\n'  # SPMF format
-            tmpf.write(line)
-        tmpf.seek(0)
-        training_set = x4_cpt_plus.load_training_set(pytest.pkg, tmpf.name)
-        pytest.prediction_model.Train(training_set.getSequences())
-        numbers_list = x4_cpt_plus.make_predictions(
-            pytest.pkg,
-            pytest.prediction_model,
-            previous_numbers
-        )
+    training_set = x4_cpt_plus.build_training_set(pytest.pkg, random_values)
+    pytest.prediction_model.Train(training_set.getSequences())
+    numbers_list = x4_cpt_plus.make_predictions(
+        pytest.pkg,
+        pytest.prediction_model,
+        previous_numbers
+    )
+    if 0 not in numbers_list:
+        assert len(numbers_list) == len(previous_numbers)
+    assert isinstance(numbers_list, list)
+
+
+@given(
+    random_values=st.lists(
+        st.lists(
+            st.integers(min_value=1, max_value=99),
+            min_size=2, max_size=5, unique=True
+        ),
+        min_size=30
+    ),
+    previous_numbers=st.lists(
+        st.integers(min_value=1, max_value=99),
+        min_size=2, max_size=5
+    )
+)
+def test_make_predictions_python(previous_numbers, random_values):
+    prediction_model = cpt_plus.CPTPlus()
+    prediction_model.train(random_values)
+    numbers_list = x4_cpt_plus.make_predictions_python(prediction_model, previous_numbers)
     if 0 not in numbers_list:
         assert len(numbers_list) == len(previous_numbers)
     assert isinstance(numbers_list, list)
 
 
+def test_predict_python():
+    dict_nbs = x4_cpt_plus.build_cptp_data(config.TEST_DB_PATH, config.TEST_DB_NAME)
+    x4_cpt_plus.predict_python(dict_nbs, config.TEST_STORE_PATH)
+    for k, size in (('balls', 5), ('stars', 2)):
+        for prediction in (dict_nbs[k + '_predict_m1'], dict_nbs[k + '_predict_next']):
+            assert len(prediction) == size
+            assert prediction == sorted(prediction)
+        # Top-k of a single prediction: not always the numbers predicted the SPMF way
+        assert len(dict_nbs[k + '_scores_next']) == size
+        scores = [score for _, score in dict_nbs[k + '_scores_next']]
+        assert scores == sorted(scores, reverse=True)
+
+
+def test_compare_predictors(loto_fixture):
+    dict_nbs = x4_cpt_plus.build_cptp_data(config.TEST_DB_PATH, config.TEST_DB_NAME)
+    results = x4_cpt_plus.compare_predictors(pytest.pkg, dict_nbs)
+    assert list(results) == list(x4_cpt_plus.SPMF_PREDICTORS)
+    for result in results.values():
+        for k, size in (('balls', 5), ('stars', 2)):
+            assert len(result[k]['prediction']) <= size
+            assert result[k]['train_seconds'] >= 0 and result[k]['predict_seconds'] >= 0
+    x4_cpt_plus.print_comparison(results, dict_nbs)
+
+
+def test_print_comparison():
+    dict_nbs = {'balls_draw_m1': [1, 7, 10, 29, 45], 'stars_draw_m1': [3, 5]}
+    result = {'balls': {'prediction': [1, 2, 3, 4, 5], 'train_seconds': 0.1,
+                        'predict_seconds': 0.01},
+              'stars': {'prediction': [3, 5], 'train_seconds': 0.1, 'predict_seconds': 0.01}}
+    x4_cpt_plus.print_comparison({'CPT+': result, 'DG': result}, dict_nbs)
+    with pytest.raises(KeyError):
+        x4_cpt_plus.print_comparison({'CPT+': {}}, dict_nbs)
+
+
+def test_backtest_chunk():
+    sequences = helpers.get_numbers_as_sequences(config.TEST_DB_PATH, config.TEST_DB_NAME)
+    nb_total = len(sequences['balls'])
+    hits = x4_cpt_plus.backtest_chunk(
+        ('python', sequences, nb_total - 5, nb_total, cpt_plus.DEFAULT_OPTIONS))
+    assert len(hits['balls']) == len(hits['stars']) == 5
+    assert hits['train_seconds'] > 0
+    assert all(0 <= h <= 5 for h in hits['balls']) and all(0 <= h <= 2 for h in hits['stars'])
+    # Same as x4: draw (-1) predicted from draw (-2), trained on the draws before, the ones
+    # predicted earlier in the chunk being added sorted, like x4 adds the (-2) draw
+    dict_nbs = x4_cpt_plus.build_cptp_data(config.TEST_DB_PATH, config.TEST_DB_NAME)
+    prediction_model = cpt_plus.CPTPlus()
+    prediction_model.train(sequences['balls'][:nb_total - 6]
+                           + [sorted(draw) for draw in sequences['balls'][nb_total - 6:-2]])
+    prediction = x4_cpt_plus.make_predictions_python(prediction_model, dict_nbs['balls_draw_m2'])
+    assert hits['balls'][-1] == len(set(prediction) & set(dict_nbs['balls_draw_m1']))
+
+
+def test_run_backtest():
+    sequences = helpers.get_numbers_as_sequences(config.TEST_DB_PATH, config.TEST_DB_NAME)
+    hits, seconds = x4_cpt_plus.run_backtest('python', sequences, 12, processes=1)
+    assert hits['balls'].shape == hits['stars'].shape == (12,)
+    assert seconds > 0
+    # Sharding doesn't change the results
+    sharded, _ = x4_cpt_plus.run_backtest('python', sequences, 12, processes=3)
+    assert (sharded['balls'] == hits['balls']).all() and (sharded['stars'] == hits['stars']).all()
+    x4_cpt_plus.print_backtest(hits, seconds)
+    with pytest.raises(ValueError):
+        x4_cpt_plus.run_backtest('python', sequences, len(sequences['balls']) - 1)
+
+
+def test_parse_grid():
+    assert x4_cpt_plus.parse_grid('CCFmax:3,5 noiseRatio:0.5') == {'CCFmax': ['3', '5'],
+                                                                    'noiseRatio': ['0.5']}
+    with pytest.raises(ValueError):
+        x4_cpt_plus.parse_grid('CCFmax:3,five')
+    with pytest.raises(ValueError):
+        x4_cpt_plus.parse_grid('nope:1')
+
+
+def test_grid_configurations():
+    grid = {'CCFmax': ['3', '5'], 'noiseRatio': ['0.5', '1', '1.0']}
+    configurations = x4_cpt_plus.grid_configurations(grid)
+    assert len(configurations) == 4  # 1 and 1.0 are the same value
+    assert 'CCFmax:3' in configurations[0] and 'noiseRatio:0.5' in configurations[0]
+    assert cpt_plus.parse_options(configurations[-1])['noiseRatio'] == 1.
+    sample = x4_cpt_plus.grid_configurations(grid, 2, seed=0)
+    assert len(sample) == 2 and set(sample) <= set(configurations)
+    assert sample == x4_cpt_plus.grid_configurations(grid, 2, seed=0)
+
+
+def test_run_sweep():
+    sequences = helpers.get_numbers_as_sequences(config.TEST_DB_PATH, config.TEST_DB_NAME)
+    configurations = x4_cpt_plus.grid_configurations({'noiseRatio': ['0.5', '1.0']})
+    con = x4_cpt_plus.connect_sweep_cache(config.TEST_STORE_PATH, config.TEST_STORE_NAME)
+    scores, nb_cached = x4_cpt_plus.run_sweep(sequences, configurations, 5, con, processes=2)
+    assert nb_cached == 0
+    assert sorted(s['options'] for s in scores) == sorted(configurations)
+    assert all(0 <= s['balls'] <= 5 and 0 <= s['stars'] <= 2 for s in scores)
+    # Scored once only
+    cached, nb_cached = x4_cpt_plus.run_sweep(sequences, configurations, 5, con)
+    assert nb_cached == 2
+    assert sorted(map(str, cached)) == sorted(map(str, scores))
+    x4_cpt_plus.print_sweep(scores, nb_cached)
+    con.close()
+
+
+def test_sweep_short_history():
+    sequences = helpers.get_numbers_as_sequences(config.TEST_DB_PATH, config.TEST_DB_NAME)
+    short = {k: v[:10] for k, v in sequences.items()}
+    with contextlib.ExitStack() as stack:
+        stack.enter_context(mock.patch('config.STORE_PATH', config.TEST_STORE_PATH))
+        stack.enter_context(mock.patch('config.STORE_NAME', config.TEST_STORE_NAME))
+        stack.enter_context(mock.patch.object(x4_cpt_plus.hp, 'get_numbers_as_sequences',
+                                              return_value=short))
+        mock_sweep = stack.enter_context(mock.patch.object(x4_cpt_plus, 'run_sweep',
+                                                           return_value=([], 0)))
+        # The 100 draws held out by default are clamped to the history
+        x4_cpt_plus.main(sweep=True, grid='noiseRatio:1.0')
+        assert mock_sweep.call_args[0][2] == 8
+        # Too many draws held out: a message, not a traceback
+        mock_sweep.side_effect = ValueError('Too many draws')
+        with pytest.raises(SystemExit):
+            x4_cpt_plus.main(sweep=True, grid='noiseRatio:1.0', backtest=50)
+
+
+def test_pareto_front():
+    scores = [{'options': 'a', 'balls': 0.5, 'stars': 0.3, 'train_seconds': 0.2},
+              {'options': 'b', 'balls': 0.6, 'stars': 0.3, 'train_seconds': 0.1},
+              {'options': 'c', 'balls': 0.7, 'stars': 0.3, 'train_seconds': 0.3},
+              {'options': 'd', 'balls': 0.4, 'stars': 0.3, 'train_seconds': 0.05}]
+    assert [s['options'] for s in x4_cpt_plus.pareto_front(scores)] == ['d', 'b', 'c']
+    assert x4_cpt_plus.pareto_front([]) == []
+
+
+def test_prediction_server():
+    socket_path = config.TEST_STORE_PATH + 'x4_test.sock'
+    service = x4_cpt_plus.PredictionService('python', config.TEST_DB_PATH, config.TEST_DB_NAME)
+    server = x4_cpt_plus.make_server(service, socket_path)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        # Trained on the first request only, the history did not change since
+        response = x4_cpt_plus.request_prediction(socket_path, 'balls', [2, 9, 16, 26, 36])
+        assert response['retrained'] is True
+        assert len(response['prediction']) == 5
+        response = x4_cpt_plus.request_prediction(socket_path, 'stars', [6, 7])
+        assert response['retrained'] is False
+        assert len(response['prediction']) == len(response['scores']) == 2
+        response = x4_cpt_plus.request_prediction(socket_path, 'stars', [[6, 7], [1, 2]],
+                                                  batch=True)
+        assert len(response['predictions']) == len(response['scores']) == 2
+        assert response['scores'][0] == x4_cpt_plus.request_prediction(
+            socket_path, 'stars', [6, 7])['scores']
+        assert 'error' in x4_cpt_plus.request_prediction(socket_path, 'comets', [1])
+        # Same numbers as x4 (make_predictions_python) for the same history
+        sequences = helpers.get_numbers_as_sequences(config.TEST_DB_PATH, config.TEST_DB_NAME)
+        prediction_model = cpt_plus.CPTPlus(cpt_plus.DEFAULT_OPTIONS)
+        prediction_model.fit(sequences['balls'])
+        assert x4_cpt_plus.request_prediction(socket_path, 'balls', [2, 9, 16, 26, 36])[
+            'prediction'] == sorted(x4_cpt_plus.make_predictions_python(
+                prediction_model, [2, 9, 16, 26, 36], verbose=False))
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+        os.remove(socket_path)
+
+
 dict_nbs = st.fixed_dictionaries({
     'balls_draw_m1':
         st.lists(st.integers(min_value=0, max_value=99), min_size=1, max_size=5),
@@ -592,6 +1578,23 @@ def test_print_report_x4_wrong_type():
         x4_cpt_plus.print_report([])
 
 
+def test_jvm_options():
+    archive = config.TEST_STORE_PATH + 'jvm_options_test/' + config.JVM_CDS_ARCHIVE_NAME
+    options = x4_cpt_plus.jvm_options()
+    assert options[1].endswith('/lib/spmf.jar')
+    assert all(o in options for o in config.JVM_OPTIONS)
+    assert not any('Archive' in o for o in options)
+    # No archive yet: it is created when the JVM shuts down, then used
+    assert '-XX:ArchiveClassesAtExit=' + archive in x4_cpt_plus.jvm_options(
+        True, config.TEST_STORE_PATH + 'jvm_options_test/')
+    try:
+        open(archive, 'w').close()
+        assert '-XX:SharedArchiveFile=' + archive in x4_cpt_plus.jvm_options(
+            True, config.TEST_STORE_PATH + 'jvm_options_test/')
+    finally:
+        shutil.rmtree(config.TEST_STORE_PATH + 'jvm_options_test/')
+
+
 ###################################################################################################
 # x5_prophet
 ###################################################################################################
@@ -602,6 +1605,84 @@ def test_load_prophet_dataframe(field):
     assert not df.empty
 
 
+def test_load_prophet_dataframes():
+    dataframes = x5_prophet.load_prophet_dataframes(config.TEST_DB_PATH, config.TEST_DB_NAME,
+                                                    numbers_fields)
+    assert list(dataframes) == numbers_fields
+    for field, df in dataframes.items():
+        assert df.equals(x5_prophet.load_prophet_dataframe(config.TEST_DB_PATH,
+                                                           config.TEST_DB_NAME, field))
+
+
+def test_run_forecasts():
+    dataframes = x5_prophet.load_prophet_dataframes(config.TEST_DB_PATH, config.TEST_DB_NAME,
+                                                    numbers_fields)
+    last_date = dataframes['ball_1']['ds'].iloc[-1]
+    with contextlib.ExitStack() as stack:
+        false_prophet = stack.enter_context(mock.patch.object(x5_prophet, 'Prophet'))
+        stack.enter_context(mock.patch.object(x5_prophet, 'generate_plots', return_value=''))
+        false_prophet.return_value.predict.side_effect = lambda dates: dates.assign(yhat=24.6)
+        results = x5_prophet.run_forecasts(dataframes, last_date, last_date, processes=1,
+                                           horizon=3)
+    assert list(results) == numbers_fields
+    for result in results.values():
+        assert result['predict_m1'] == result['predict_next'] == 25
+        assert [number for _, number in result['horizon']] == [25, 25, 25]
+        assert result['plots_message'] is None
+    # Only the dates we need were forecast, no plot
+    false_prophet.return_value.make_future_dataframe.assert_not_called()
+    x5_prophet.print_horizon(results, numbers_fields)
+
+
+def test_x5_get_model():
+    cache_path = config.TEST_STORE_PATH + 'prophet_models_test/'
+    helpers.create_necessary_directories(cache_path)
+    df = x5_prophet.load_prophet_dataframe(config.TEST_DB_PATH, config.TEST_DB_NAME, 'ball_1')
+    try:
+        with contextlib.ExitStack() as stack:
+            false_prophet = stack.enter_context(mock.patch.object(x5_prophet, 'Prophet'))
+            stack.enter_context(mock.patch.object(x5_prophet, 'model_to_json',
+                                                  return_value='{}'))
+            stack.enter_context(mock.patch.object(x5_prophet, 'model_from_json'))
+            fit = false_prophet.return_value.fit
+            assert x5_prophet.get_model(df[:-2], 'ball_1', cache_path)[1] == 'cold'
+            assert 'init' not in fit.call_args[1]
+            # Same draws: no fit
+            assert x5_prophet.get_model(df[:-2], 'ball_1', cache_path)[1] == 'cached'
+            assert fit.call_count == 1
+            # New draws: the fit starts from the previous parameters
+            assert x5_prophet.get_model(df, 'ball_1', cache_path)[1] == 'warm'
+            assert 'init' in fit.call_args[1]
+            assert x5_prophet.get_model(df, 'ball_1', cache_path, force=True)[1] == 'cold'
+        assert len(os.listdir(cache_path)) == 2
+    finally:
+        shutil.rmtree(cache_path)
+
+
+def test_evict_models():
+    cache_path = config.TEST_STORE_PATH + 'prophet_models_test/'
+    helpers.create_necessary_directories(cache_path)
+    try:
+        for i in range(4):
+            with open(cache_path + f"ball_1_{i}.json", 'w') as file:
+                file.write(100 * 'x')
+            os.utime(cache_path + f"ball_1_{i}.json", (i, i))
+        assert x5_prophet.evict_models(cache_path, 1000) == 0
+        assert x5_prophet.evict_models(cache_path, 250) == 2
+        assert sorted(os.listdir(cache_path)) == ['ball_1_2.json', 'ball_1_3.json']
+    finally:
+        shutil.rmtree(cache_path)
+
+
+def test_target_dates():
+    dates = x5_prophet.target_dates(pd.Timestamp('2020-10-02'), pd.Timestamp('2020-10-06'), 3)
+    assert list(dates['ds']) == [pd.Timestamp(d) for d in ('2020-10-02', '2020-10-06',
+                                                           '2020-10-09', '2020-10-13',
+                                                           '2020-10-16')]
+    assert len(x5_prophet.target_dates(pd.Timestamp('2020-10-02'),
+                                       pd.Timestamp('2020-10-06'))) == 2
+
+
 @given(
     data_frames(
         index=range_indexes(min_size=5),